@@ -1,14 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-from astropy.table import MaskedColumn
+from astropy.table import MaskedColumn, Table, vstack
+from astropy.coordinates import SkyCoord
 from pyvo import dal
 from pyvo.dal import DALQueryError, DALFormatError
 
+import predicates
+
 # =============================================================================
 # Constants
 # =============================================================================
 TAP_SERVICE_URL = "https://archive.eso.org/tap_cat"
 TAP_QUERY_TYPES = ["sync", "async"]
 MAXREC = 1000
+RADEC_BATCH_SIZE = 100
+IDS_CHUNK_SIZE = 1000
+IDS_MAX_QUERY_LENGTH = 60000
+IDS_MAX_WORKERS = 4
+IDS_MAXREC = 100000
 
 # =============================================================================
 # Public API Functions
@@ -130,7 +140,7 @@ def list_catalogues_info(collections=None, tables=None, verbose=False):
 
 def query_catalogues(collections=None, tables=None, columns=None, type_of_query='sync',
                      all_versions=False, maxrec=None, verbose=False,
-                     conditions_dict=None, top=None, order_by=None, order='ascending'):
+                     conditions_dict=None, top=None, order_by=None, order='ascending', conditions=None):
     """
     Query specific ESO catalogues from the TAP service.
     
@@ -145,10 +155,14 @@ def query_catalogues(collections=None, tables=None, columns=None, type_of_query=
         all_versions (bool): If True, include obsolete catalogue versions.
         maxrec (int): Maximum number of rows to retrieve per query.
         verbose (bool): If True, print query details.
-        conditions_dict (dict): Additional query conditions.
+        conditions_dict (dict): Additional equality conditions, combined with AND (values are
+            formatted as ADQL literals: strings are quoted, None is IS NULL; strings already
+            quoted as before, e.g. "'HARPS'", are accepted).
         top (int): Return only the top N rows.
         order_by (str): Column name for ordering the result.
         order (str): Order direction ('ascending' or 'descending').
+        conditions (Predicate): Additional server-side filter built from `predicates`
+            (e.g. `Range("mag", 12, 18) & Like("name", "NGC%")`), combined with AND.
     
     Returns:
         astropy.table.Table or list of Tables: The queried catalogue(s).
@@ -160,7 +174,8 @@ def query_catalogues(collections=None, tables=None, columns=None, type_of_query=
     list_of_catalogues = []
     for table_name, totrec, maxrec_val in zip(clean_tables, totrec_list, maxrec_list):
         valid_columns = _is_column_list_in_catalogues(columns, tables=table_name)
-        query = _create_query_catalogues(table_name, valid_columns, conditions_dict, order_by, order, top)
+        query = _create_query_catalogues(table_name, valid_columns, conditions_dict, order_by, order, top,
+                                         conditions)
         
         if verbose:
             _print_query(query)
@@ -179,6 +194,260 @@ def query_catalogues(collections=None, tables=None, columns=None, type_of_query=
     else:
         return list_of_catalogues
 
+def query_catalogues_radec(positions=None, ra=None, dec=None, radius=5.0, collections=None, tables=None,
+                           columns=None, type_of_query='sync', all_versions=False, maxrec=None,
+                           verbose=False, conditions_dict=None, top=None, order_by=None, order='ascending',
+                           batch_size=RADEC_BATCH_SIZE, conditions=None):
+    """
+    Query specific ESO catalogues around a set of sky positions.
+    
+    Positions can be given either as a (scalar or array-valued) `SkyCoord`, or
+    as plain RA/Dec arrays in degrees (ICRS). The coordinates are transformed
+    once and the cone conditions for up to `batch_size` positions are combined
+    with OR into a single query, so thousands of targets need only a handful
+    of requests per table.
+    
+    A source falling in the cones of several batches is returned once (rows
+    are identified by the main ID column, or by RA/Dec if the table has
+    none), and `order_by` and `top` apply to the merged result: the batch
+    queries are sent without TOP, so `maxrec` bounds each batch. An
+    `input_index` column gives the index of the nearest input position of
+    each row; the RA/Dec columns are added to `columns` for this purpose.
+    An empty list of positions returns an empty table without querying.
+    
+    Args:
+        positions (astropy.coordinates.SkyCoord): Position(s) to query.
+        ra (float or array-like): RA in degrees (ICRS), if `positions` is None.
+        dec (float or array-like): Dec in degrees (ICRS), if `positions` is None.
+        radius (float or array-like): Search radius in arcseconds (one per position or shared).
+        collections (str or list): Collection name(s) to filter catalogues.
+        tables (str or list): Specific table name(s) to query.
+        columns (str or list): Column name(s) to retrieve.
+        type_of_query (str): 'sync' or 'async' query mode.
+        all_versions (bool): If True, include obsolete catalogue versions.
+        maxrec (int): Maximum number of rows to retrieve per query.
+        verbose (bool): If True, print query details.
+        conditions_dict (dict): Additional equality conditions, combined with AND (values are
+            formatted as ADQL literals: strings are quoted, None is IS NULL; strings already
+            quoted as before, e.g. "'HARPS'", are accepted).
+        top (int): Return only the top N rows (of the merged result).
+        order_by (str): Column name for ordering the result.
+        order (str): Order direction ('ascending' or 'descending').
+        batch_size (int): Maximum number of positions combined in one query.
+        conditions (Predicate): Additional server-side filter built from `predicates`.
+    
+    Returns:
+        astropy.table.Table or list of Tables: The queried catalogue(s).
+    """
+    ra_deg, dec_deg = _positions_to_radec(positions, ra, dec)
+    radius_deg = np.broadcast_to(np.asarray(radius, dtype=float), ra_deg.shape) / 3600.
+    clean_tables = _is_collection_and_table_list_at_eso(collections, tables, all_versions=all_versions)
+    maxrec_val = maxrec if maxrec is not None else MAXREC
+    
+    list_of_catalogues = []
+    for table_name in clean_tables:
+        valid_columns = _is_column_list_in_catalogues(columns, tables=table_name)
+        ra_name, dec_name = _get_ra_dec_column_names(table_name)
+        if ra_name is None or dec_name is None:
+            print(f"Warning: No RA/Dec columns found for {table_name}. Skipping.")
+            continue
+        id_name = _get_id_column_name(table_name)
+        if valid_columns:
+            valid_columns += [name for name in (id_name, ra_name, dec_name) if name and name not in valid_columns]
+        cone_conditions = _condition_cones_like(ra_deg, dec_deg, radius_deg, ra_name, dec_name)
+        
+        batches = []
+        for start in range(0, len(cone_conditions), batch_size):
+            spatial = " OR ".join(cone_conditions[start:start + batch_size])
+            # No TOP in the batches: the rows of one batch could push out rows of the merged top
+            query = _create_query_catalogues_radec(table_name, valid_columns, spatial, conditions_dict,
+                                                   order_by, order, None, conditions)
+            if verbose:
+                _print_query(query)
+            qobj = _ESOCatalogues(query=query, type_of_query=type_of_query, maxrec=maxrec_val)
+            qobj.run_query(to_string=True)
+            batches.append(qobj.get_result())
+        
+        if batches:
+            catalogue = _merge_cone_batches(batches, id_name, ra_name, dec_name, order_by, order, top)
+        else:
+            catalogue = Table(names=valid_columns or _get_column_names(table_name))
+        _add_input_index(catalogue, ra_deg, dec_deg, ra_name, dec_name)
+        list_of_catalogues.append(catalogue)
+        print(f"The query to {table_name} around {len(ra_deg)} position(s) returned {len(catalogue)} entries "
+              f"in {len(batches)} batch(es) (with a limit set to maxrec={maxrec_val} per batch)")
+    
+    if len(list_of_catalogues) == 0:
+        return None
+    elif len(list_of_catalogues) == 1:
+        return list_of_catalogues[0]
+    else:
+        return list_of_catalogues
+
+def fetch_by_ids(table, ids, columns=None, type_of_query='sync', chunk_size=IDS_CHUNK_SIZE,
+                 max_workers=IDS_MAX_WORKERS, maxrec=IDS_MAXREC, verbose=False):
+    """
+    Retrieve the rows of a catalogue matching a list of source IDs.
+    
+    The IDs are matched against the main identifier column of the table (UCD
+    `meta.id;meta.main`). They are split into IN-lists bounded both in number
+    of IDs and in query length, the chunks are queried concurrently, and the
+    result is returned in the same order as `ids`. IDs without a match are
+    dropped from the output; an ID matching several rows returns all of them.
+    A chunk whose result reaches `maxrec` (or overflows on the server) may be
+    truncated: a warning is printed.
+    
+    Args:
+        table (str): Table name to query.
+        ids (list or array-like): Source IDs to retrieve.
+        columns (str or list): Column name(s) to retrieve. The ID column is always included.
+        type_of_query (str): 'sync' or 'async' query mode.
+        chunk_size (int): Maximum number of IDs per query.
+        max_workers (int): Maximum number of queries run concurrently.
+        maxrec (int): Maximum number of rows retrieved per chunk.
+        verbose (bool): If True, print query details.
+    
+    Returns:
+        astropy.table.Table: Rows matching `ids`, in input order.
+    """
+    id_name = _get_id_column_name(table)
+    if id_name is None:
+        raise ValueError(f"No source ID column (meta.id;meta.main) found for {table}.")
+    valid_columns = _is_column_list_in_catalogues(columns, tables=table)
+    if valid_columns and id_name not in valid_columns:
+        valid_columns = [id_name] + valid_columns
+    
+    ids = np.ravel(np.asarray(ids))
+    queries = [_create_query_catalogues_ids(table, valid_columns, id_name, chunk)
+               for chunk in _chunk_ids_like(ids, chunk_size, IDS_MAX_QUERY_LENGTH)]
+    if verbose:
+        for query in queries:
+            _print_query(query)
+    
+    def run_chunk(query):
+        qobj = _ESOCatalogues(query=query, type_of_query=type_of_query, maxrec=maxrec)
+        qobj.run_query(to_string=True)
+        return qobj.get_result()
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run_chunk, queries))
+    if not results:
+        return None
+    n_truncated = sum(bool(result.meta.get("truncated")) for result in results)
+    if n_truncated:
+        print(f"Warning: {n_truncated} of {len(results)} chunk(s) reached the row limit and may be truncated "
+              f"(increase `maxrec` or decrease `chunk_size`)")
+    
+    catalogue = vstack(results) if len(results) > 1 else results[0]
+    order = _order_rows_by_ids(np.asarray(catalogue[id_name]), ids)
+    print(f"The query to {table} returned {len(order)} entries for {len(ids)} IDs "
+          f"in {len(queries)} chunk(s)")
+    return catalogue[order]
+
+
+def lazy_catalogue(table, type_of_query='sync', maxrec=None):
+    """
+    Return a lazy query on an ESO catalogue table.
+    
+    Nothing is sent to the TAP service until `collect()` is called; the
+    `select`, `where`, `order_by` and `top` calls are recorded and compiled
+    into a single ADQL query, so all the filtering happens on the server.
+    
+    Example:
+        >>> from predicates import Range
+        >>> cat = lazy_catalogue(table_name)
+        >>> result = (cat.select("RA", "DEC", "MAG")
+        ...              .where(Range("MAG", 10, 15))
+        ...              .order_by("MAG")
+        ...              .top(100)
+        ...              .collect())
+    
+    Args:
+        table (str): Table name to query.
+        type_of_query (str): 'sync' or 'async' query mode.
+        maxrec (int): Maximum number of rows to retrieve.
+    
+    Returns:
+        LazyCatalogue: Lazy query object.
+    """
+    return LazyCatalogue(table, type_of_query=type_of_query, maxrec=maxrec)
+
+
+class LazyCatalogue:
+    """
+    Lazy query on an ESO catalogue table (see `lazy_catalogue`).
+    
+    Every method returns a new `LazyCatalogue`, so partial queries can be
+    reused as templates.
+    """
+    def __init__(self, table, columns=None, conditions=(), order_by=None, order='ascending', top=None,
+                 type_of_query='sync', maxrec=None):
+        self.table = table
+        self.columns = columns
+        self.conditions = tuple(conditions)
+        self._order_by = order_by
+        self._order = order
+        self._top = top
+        self.type_of_query = type_of_query
+        self.maxrec = maxrec
+
+    def _replace(self, **kwargs):
+        """Return a copy with some attributes replaced."""
+        state = dict(table=self.table, columns=self.columns, conditions=self.conditions,
+                     order_by=self._order_by, order=self._order, top=self._top,
+                     type_of_query=self.type_of_query, maxrec=self.maxrec)
+        state.update(kwargs)
+        return LazyCatalogue(**state)
+
+    def select(self, *columns):
+        """Restrict the query to the given column(s)."""
+        return self._replace(columns=[c for col in columns for c in _from_element_to_list(col, str)])
+
+    def where(self, condition):
+        """Add a condition (Predicate, conditions dict or ADQL string), combined with AND."""
+        if isinstance(condition, dict):
+            condition = _conditions_dict_like(condition)
+        elif not isinstance(condition, (predicates.Predicate, str)):
+            raise TypeError(f"Invalid type for condition: {type(condition)}")
+        return self._replace(conditions=self.conditions + (condition,))
+
+    def order_by(self, column, order='ascending'):
+        """Order the result by `column`."""
+        return self._replace(order_by=column, order=order)
+
+    def top(self, n):
+        """Return only the first `n` rows."""
+        return self._replace(top=int(n))
+
+    def to_adql(self):
+        """Compile the recorded operations into an ADQL query."""
+        return _create_query_catalogues(self.table, self.columns, None, self._order_by, self._order,
+                                        self._top, list(self.conditions))
+
+    def collect(self, verbose=False):
+        """
+        Validate the columns, run the query and return the result.
+
+        Raises:
+            ValueError: If some selected columns are not columns of the table.
+        """
+        if self.columns:
+            known = set(_get_column_names(self.table))
+            unknown = [column for column in self.columns if column not in known]
+            if unknown:
+                raise ValueError(f"Unknown column(s) of {self.table}: {', '.join(unknown)}")
+        query = _create_query_catalogues(self.table, self.columns, None, self._order_by, self._order,
+                                         self._top, list(self.conditions))
+        if verbose:
+            _print_query(query)
+        maxrec = self.maxrec if self.maxrec is not None else (self._top or MAXREC)
+        qobj = _ESOCatalogues(query=query, type_of_query=self.type_of_query, maxrec=maxrec)
+        qobj.run_query(to_string=True)
+        return qobj.get_result()
+
+    def __repr__(self):
+        return f"<LazyCatalogue {self.table}: {self.to_adql().strip()}>"
+
 # =============================================================================
 # Internal Implementation (hidden from the user)
 # =============================================================================
@@ -257,11 +526,14 @@ def _run_query(tap_service, query, type_of_query, maxrec=MAXREC):
 
 def _run_query_sync(tap_service, query, maxrec=MAXREC):
     """Execute a synchronous TAP query."""
+    maxrec = int(maxrec) if maxrec is not None else None
     try:
-        return tap_service.search(query=query, maxrec=int(maxrec) if maxrec is not None else None).to_table()
+        results = tap_service.search(query=query, maxrec=maxrec)
     except (ValueError, DALQueryError, DALFormatError):
         print("Query timeout. Retrying with maxrec=100 (consider using async instead).")
-        return tap_service.search(query=query, maxrec=100).to_table()
+        maxrec = 100
+        results = tap_service.search(query=query, maxrec=maxrec)
+    return _results_to_table(results, maxrec)
 
 def _run_query_async(tap_service, query, maxrec=MAXREC):
     """Execute an asynchronous TAP query."""
@@ -271,7 +543,14 @@ def _run_query_async(tap_service, query, maxrec=MAXREC):
         tap_job.wait(phases=[status], timeout=10.0)
         print(f"Query status: {tap_job.phase}")
     tap_job.raise_if_error()
-    return tap_job.fetch_result().to_table()
+    return _results_to_table(tap_job.fetch_result(), maxrec)
+
+def _results_to_table(results, maxrec):
+    """Convert TAP results to a table, with `meta["truncated"]` set if they overflowed or reached `maxrec`."""
+    table = results.to_table()
+    table.meta["truncated"] = bool(getattr(results, "query_status", None) == "OVERFLOW"
+                                   or (maxrec is not None and len(table) >= maxrec))
+    return table
 
 def _from_bytes_to_string(input_in_bytes):
     """Convert byte strings to unicode strings."""
@@ -333,13 +612,39 @@ def _condition_tables_like(tables):
 
 def _condition_order_by_like(order_by, order="ascending"):
     """Generate an ORDER BY clause if needed."""
-    return f" ORDER BY {order_by} {order.upper()}" if order_by else ""
+    direction = "DESC" if order.lower() in ("descending", "desc") else "ASC"
+    return f" ORDER BY {order_by} {direction}" if order_by else ""
 
 def _conditions_dict_like(conditions_dict):
-    """Generate a WHERE clause from a dictionary of conditions."""
-    if conditions_dict:
-        return " ".join(f"WHERE {key}={value}" for key, value in conditions_dict.items())
-    return ""
+    """
+    Generate a predicate from a dictionary of equality conditions, combined with AND (or None).
+
+    Values are formatted as ADQL literals (strings are quoted, None is IS NULL).
+    For backward compatibility, a string already quoted by the caller
+    (`"'HARPS'"`, as required before) is unquoted first, so it is not quoted twice.
+    """
+    if not conditions_dict:
+        return None
+    return predicates.from_conditions_dict({key: _unquote_adql_string(value)
+                                            for key, value in conditions_dict.items()})
+
+def _unquote_adql_string(value):
+    """Return the content of a string written as an ADQL literal ('...'), other values unchanged."""
+    if isinstance(value, str) and len(value) >= 2 and value[0] == value[-1] == "'":
+        return value[1:-1].replace("''", "'")
+    return value
+
+def _create_where_clause(*conditions):
+    """Combine ADQL conditions (strings, predicates or lists of them) with AND into a WHERE clause."""
+    parts = []
+    for condition in conditions:
+        if isinstance(condition, (list, tuple)):
+            condition = _create_where_clause(*condition)[len("WHERE "):]
+        if isinstance(condition, predicates.Predicate):
+            condition = condition.to_adql()
+        if condition:
+            parts.append(f"({condition})")
+    return f"WHERE {' AND '.join(parts)}" if parts else ""
 
 def _create_query_all_catalogues(all_versions, collections, tables):
     """Build the TAP query for retrieving catalogue metadata."""
@@ -380,13 +685,87 @@ def _create_query_all_columns(collections, tables):
         AND ({_condition_tables_like(tables)})
     """
 
-def _create_query_catalogues(table_name, columns, conditions_dict, order_by, order, top):
+def _create_query_catalogues(table_name, columns, conditions_dict, order_by, order, top, conditions=None):
     """Build the TAP query for a specific catalogue table."""
     base = _create_query_table_base(table_name, columns, top)
-    cond = _conditions_dict_like(conditions_dict)
+    cond = _create_where_clause(_conditions_dict_like(conditions_dict), conditions)
     order_clause = _condition_order_by_like(order_by, order)
     return f"{base} {cond} {order_clause}"
 
+def _create_query_catalogues_radec(table_name, columns, spatial, conditions_dict, order_by, order, top,
+                                   conditions=None):
+    """Build the TAP query for a catalogue table restricted to a set of cones."""
+    base = _create_query_table_base(table_name, columns, top)
+    where = _create_where_clause(spatial, _conditions_dict_like(conditions_dict), conditions)
+    order_clause = _condition_order_by_like(order_by, order)
+    return f"{base} {where} {order_clause}"
+
+def _condition_cones_like(ra, dec, radius, ra_name, dec_name):
+    """Generate one CONTAINS condition per position (all inputs in degrees)."""
+    return [f"CONTAINS(POINT('ICRS', {ra_name}, {dec_name}), CIRCLE('ICRS', {r!r}, {d!r}, {rad!r}))=1"
+            for r, d, rad in zip(ra.tolist(), dec.tolist(), radius.tolist())]
+
+def _merge_cone_batches(batches, id_name, ra_name, dec_name, order_by, order, top):
+    """Stack the results of several cone batches, dropping duplicated rows, then apply ORDER BY and TOP."""
+    catalogue = vstack(batches) if len(batches) > 1 else batches[0]
+    if len(catalogue) == 0:
+        return catalogue
+    key_names = [id_name] if id_name in catalogue.colnames else [ra_name, dec_name]
+    keys = np.rec.fromarrays([np.asarray(catalogue[name]) for name in key_names])
+    _, first = np.unique(keys, return_index=True)
+    catalogue = catalogue[np.sort(first)]
+    if order_by:
+        order_index = np.argsort(np.asarray(catalogue[order_by]), kind="stable")
+        if order.lower() in ("descending", "desc"):
+            order_index = order_index[::-1]
+        catalogue = catalogue[order_index]
+    return catalogue[:top] if top else catalogue
+
+def _add_input_index(catalogue, ra, dec, ra_name, dec_name):
+    """Add an `input_index` column with the index of the nearest input position of each row."""
+    if len(catalogue) == 0 or len(ra) == 0:
+        catalogue["input_index"] = np.zeros(len(catalogue), dtype=np.int64)
+        return
+    rows = SkyCoord(np.asarray(catalogue[ra_name], dtype=float), np.asarray(catalogue[dec_name], dtype=float),
+                    unit="deg", frame="icrs")
+    positions = SkyCoord(ra, dec, unit="deg", frame="icrs")
+    index, _, _ = rows.match_to_catalog_sky(positions)
+    catalogue["input_index"] = np.asarray(index, dtype=np.int64)
+
+def _create_query_catalogues_ids(table_name, columns, id_name, ids):
+    """Build the TAP query for a catalogue table restricted to a list of IDs."""
+    base = _create_query_table_base(table_name, columns, None)
+    return f"{base} {_create_where_clause(predicates.In(id_name, ids))}"
+
+def _chunk_ids_like(ids, chunk_size, max_query_length):
+    """Split IDs into chunks bounded in number of elements and in formatted length."""
+    chunk, length = [], 0
+    for value in ids:
+        literal_length = len(predicates.adql_literal(value)) + 2
+        if chunk and (len(chunk) >= chunk_size or length + literal_length > max_query_length):
+            yield chunk
+            chunk, length = [], 0
+        chunk.append(value)
+        length += literal_length
+    if chunk:
+        yield chunk
+
+def _order_rows_by_ids(row_ids, ids):
+    """Return the row indices of `row_ids` in the order of `ids` (all the rows of an ID, missing IDs skipped)."""
+    if len(row_ids) == 0:
+        return np.array([], dtype=int)
+    row_ids = np.asarray(_from_bytes_to_string(row_ids))
+    ids = np.asarray(_from_bytes_to_string(np.asarray(ids)))
+    if row_ids.dtype.kind in "US":
+        row_ids, ids = row_ids.astype(str), ids.astype(str)
+    else:
+        ids = ids.astype(row_ids.dtype)
+    sorter = np.argsort(row_ids, kind="stable")
+    first = np.searchsorted(row_ids, ids, side="left", sorter=sorter)
+    counts = np.searchsorted(row_ids, ids, side="right", sorter=sorter) - first
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return sorter[np.repeat(first, counts) + offsets]
+
 def _create_query_table_base(table_name, columns, top):
     """Build the basic SELECT ... FROM ... part of a query."""
     select_clause = f"SELECT {'TOP ' + str(top) + ' ' if top else ''}{_create_comma_separated_list(columns)}"
@@ -477,6 +856,40 @@ def _is_column_list_in_catalogues(columns, collections=None, tables=None):
     columns_list = _from_element_to_list(columns, str)
     return [col for col in columns_list if _is_column_in_catalogues(col, collections, tables)]
 
+def _positions_to_radec(positions=None, ra=None, dec=None):
+    """Return flat ICRS RA and Dec arrays (in degrees) from a SkyCoord or from RA/Dec inputs."""
+    if positions is not None:
+        if not isinstance(positions, SkyCoord):
+            raise TypeError(f"Invalid type for positions: {type(positions)} (expected SkyCoord)")
+        icrs = positions.icrs
+        return np.ravel(icrs.ra.deg), np.ravel(icrs.dec.deg)
+    if ra is None or dec is None:
+        raise ValueError("Either `positions` or both `ra` and `dec` must be given.")
+    ra_deg = np.ravel(np.asarray(ra, dtype=float))
+    dec_deg = np.ravel(np.asarray(dec, dtype=float))
+    if ra_deg.shape != dec_deg.shape:
+        raise ValueError("`ra` and `dec` must have the same length.")
+    return ra_deg, dec_deg
+
+def _get_ra_dec_column_names(table_name):
+    """Return the RA and Dec column names of a table based on UCD tokens."""
+    columns_table = list_catalogues_info(tables=table_name, verbose=False)
+    ra_names = columns_table[columns_table["ucd"].data == "pos.eq.ra;meta.main"]["column_name"].tolist()
+    dec_names = columns_table[columns_table["ucd"].data == "pos.eq.dec;meta.main"]["column_name"].tolist()
+    return (ra_names[0] if len(ra_names) == 1 else None,
+            dec_names[0] if len(dec_names) == 1 else None)
+
+def _get_column_names(table_name):
+    """Return the column names of a table."""
+    columns_table = list_catalogues_info(tables=table_name, verbose=False)
+    return columns_table["column_name"].tolist() if columns_table is not None else []
+
+def _get_id_column_name(table_name):
+    """Return the source ID column name of a table based on UCD tokens."""
+    columns_table = list_catalogues_info(tables=table_name, verbose=False)
+    id_names = columns_table[columns_table["ucd"].data == "meta.id;meta.main"]["column_name"].tolist()
+    return id_names[0] if len(id_names) == 1 else None
+
 def _get_id_ra_dec_from_columns(collections=None):
     """
     Extract the column names for Source ID, RA, and Dec based on UCD tokens.
@@ -0,0 +1,180 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+# =============================================================================
+# Constants
+# =============================================================================
+RA_UCD = "pos.eq.ra;meta.main"
+DEC_UCD = "pos.eq.dec;meta.main"
+CHUNK_SIZE = 1_000_000
+
+# =============================================================================
+# Public API Functions
+# =============================================================================
+
+def build_sky_index(catalogue, ra_column=None, dec_column=None):
+    """
+    Build a spatial index over the positions of a downloaded catalogue.
+
+    The positions are converted to unit vectors and stored in a KD-tree, so
+    that angular distances become Euclidean (chord) distances. The index can
+    be reused for any number of crossmatches against the same catalogue.
+    Rows with masked or NaN coordinates are left out of the tree (they never
+    match); the matches still refer to the rows of `catalogue`.
+
+    Args:
+        catalogue (astropy.table.Table): Catalogue returned by `query_catalogues`.
+        ra_column (str): Name of the RA column (e.g. the `table_RA` entry of
+            `list_catalogues`). If None, it is looked up from the column UCDs.
+        dec_column (str): Name of the Dec column (e.g. the `table_Dec` entry of
+            `list_catalogues`). If None, it is looked up from the column UCDs.
+
+    Returns:
+        _SkyIndex: Spatial index over the catalogue positions.
+    """
+    ra, dec = _get_ra_dec_from_table(catalogue, ra_column, dec_column)
+    return _SkyIndex(ra, dec)
+
+
+def crossmatch_nearest(catalogue, ra, dec, max_sep=None, ra_column=None, dec_column=None,
+                       chunk_size=CHUNK_SIZE, workers=-1):
+    """
+    Find the nearest catalogue entry for each input position.
+
+    Args:
+        catalogue (astropy.table.Table or _SkyIndex): Catalogue (or an index
+            created with `build_sky_index`) to match against.
+        ra (array-like): RA of the input positions in degrees.
+        dec (array-like): Dec of the input positions in degrees.
+        max_sep (float): Maximum separation in arcseconds. Positions without a
+            counterpart within this distance get an index of -1.
+        ra_column (str): Name of the RA column in `catalogue`.
+        dec_column (str): Name of the Dec column in `catalogue`.
+        chunk_size (int): Number of input positions processed at once.
+        workers (int): Number of CPU cores used by the KD-tree (-1 for all).
+
+    Returns:
+        tuple: (index, separation) arrays with one entry per input position.
+            `index` refers to the rows of `catalogue`, `separation` is in arcseconds.
+    """
+    index = _as_sky_index(catalogue, ra_column, dec_column)
+    xyz = _radec_to_xyz(ra, dec)
+    upper_bound = _arcsec_to_chord(max_sep) if max_sep is not None else np.inf
+
+    match_idx = np.full(len(xyz), -1, dtype=np.int64)
+    match_sep = np.full(len(xyz), np.nan)
+    for start in range(0, len(xyz), chunk_size):
+        stop = start + chunk_size
+        chord, idx = index.tree.query(xyz[start:stop], k=1, distance_upper_bound=upper_bound,
+                                      workers=workers)
+        found = np.isfinite(chord)
+        match_idx[start:stop][found] = index.rows[idx[found]]
+        match_sep[start:stop][found] = _chord_to_arcsec(chord[found])
+    return match_idx, match_sep
+
+
+def crossmatch_radius(catalogue, ra, dec, radius, ra_column=None, dec_column=None,
+                      chunk_size=CHUNK_SIZE, workers=-1):
+    """
+    Find all catalogue entries within `radius` of each input position.
+
+    Args:
+        catalogue (astropy.table.Table or _SkyIndex): Catalogue (or an index
+            created with `build_sky_index`) to match against.
+        ra (array-like): RA of the input positions in degrees.
+        dec (array-like): Dec of the input positions in degrees.
+        radius (float): Search radius in arcseconds.
+        ra_column (str): Name of the RA column in `catalogue`.
+        dec_column (str): Name of the Dec column in `catalogue`.
+        chunk_size (int): Number of input positions processed at once.
+        workers (int): Number of CPU cores used by the KD-tree (-1 for all).
+
+    Returns:
+        tuple: (input_index, catalogue_index, separation) arrays with one entry
+            per matched pair, ordered by input position. `separation` is in arcseconds.
+    """
+    index = _as_sky_index(catalogue, ra_column, dec_column)
+    xyz = _radec_to_xyz(ra, dec)
+    chord_radius = _arcsec_to_chord(radius)
+
+    input_idx, catalogue_idx = [], []
+    for start in range(0, len(xyz), chunk_size):
+        stop = start + chunk_size
+        matches = index.tree.query_ball_point(xyz[start:stop], r=chord_radius, workers=workers,
+                                              return_sorted=False)
+        lengths = np.fromiter((len(m) for m in matches), dtype=np.int64, count=len(matches))
+        if lengths.sum() == 0:
+            continue
+        input_idx.append(np.repeat(np.arange(start, start + len(matches)), lengths))
+        catalogue_idx.append(np.concatenate([m for m in matches if m]).astype(np.int64))
+
+    if not input_idx:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty.copy(), np.array([], dtype=float)
+    input_idx = np.concatenate(input_idx)
+    catalogue_idx = np.concatenate(catalogue_idx)
+    chord = np.linalg.norm(xyz[input_idx] - index.xyz[catalogue_idx], axis=1)
+    return input_idx, index.rows[catalogue_idx], _chord_to_arcsec(chord)
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+class _SkyIndex:
+    """
+    Internal class holding the KD-tree over unit vectors of a catalogue.
+
+    Only the rows with finite coordinates are in the tree; `rows` maps the
+    points of the tree back to the rows of the catalogue.
+    """
+    def __init__(self, ra, dec):
+        ra = np.atleast_1d(np.asarray(ra, dtype=float))
+        dec = np.atleast_1d(np.asarray(dec, dtype=float))
+        valid = np.isfinite(ra) & np.isfinite(dec)
+        self.n_rows = len(ra)
+        self.rows = np.flatnonzero(valid)
+        self.xyz = _radec_to_xyz(ra[valid], dec[valid])
+        self.tree = cKDTree(self.xyz, balanced_tree=False, compact_nodes=False)
+
+    def __len__(self):
+        return self.n_rows
+
+# -----------------------------------------------------------------------------
+# Internal helper functions
+# -----------------------------------------------------------------------------
+
+def _as_sky_index(catalogue, ra_column, dec_column):
+    """Return `catalogue` as a `_SkyIndex`, building it if needed."""
+    if isinstance(catalogue, _SkyIndex):
+        return catalogue
+    return build_sky_index(catalogue, ra_column=ra_column, dec_column=dec_column)
+
+def _get_ra_dec_from_table(catalogue, ra_column, dec_column):
+    """Extract RA and Dec (in degrees) from a catalogue table, with NaN where they are masked."""
+    ra_column = ra_column or _get_column_from_ucd(catalogue, RA_UCD)
+    dec_column = dec_column or _get_column_from_ucd(catalogue, DEC_UCD)
+    return (np.ma.filled(np.ma.asarray(catalogue[ra_column], dtype=float), np.nan),
+            np.ma.filled(np.ma.asarray(catalogue[dec_column], dtype=float), np.nan))
+
+def _get_column_from_ucd(catalogue, ucd):
+    """Find the column of a table with the given UCD."""
+    for col in catalogue.colnames:
+        if getattr(catalogue[col], "meta", {}).get("ucd") == ucd:
+            return col
+    raise ValueError(f"No column with UCD '{ucd}' found. Set the column name explicitly "
+                     f"(see the `table_RA` and `table_Dec` columns of `list_catalogues`).")
+
+def _radec_to_xyz(ra, dec):
+    """Convert RA/Dec in degrees to an (N, 3) array of unit vectors."""
+    ra = np.radians(np.atleast_1d(np.asarray(ra, dtype=float)))
+    dec = np.radians(np.atleast_1d(np.asarray(dec, dtype=float)))
+    cos_dec = np.cos(dec)
+    return np.column_stack((cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)))
+
+def _arcsec_to_chord(sep):
+    """Convert an angular separation in arcseconds to a chord length."""
+    return 2. * np.sin(np.radians(np.asarray(sep, dtype=float) / 3600.) / 2.)
+
+def _chord_to_arcsec(chord):
+    """Convert a chord length to an angular separation in arcseconds."""
+    return np.degrees(2. * np.arcsin(np.clip(np.asarray(chord) / 2., 0., 1.))) * 3600.
@@ -0,0 +1,222 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+import numpy as np
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class Predicate(ABC):
+    """
+    Base class for a server-side filter on a catalogue query.
+
+    Predicates can be combined with `&` (AND), `|` (OR) and `~` (NOT), and
+    are compiled to an ADQL boolean expression with `to_adql()`. The ADQL
+    template only depends on the structure of the predicate (columns and
+    operators), so it is compiled once and cached; repeated calls with new
+    values only format the literals.
+    """
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def to_adql(self):
+        """Return the ADQL expression for this predicate."""
+        return compile_predicate(self)
+
+    def __str__(self):
+        return self.to_adql()
+
+    @abstractmethod
+    def _signature(self):
+        """Hashable description of the structure of the predicate (no values)."""
+
+    @abstractmethod
+    def _parameters(self):
+        """List of formatted ADQL literals, in template order."""
+
+
+class Eq(Predicate):
+    """`column = value` (`column IS NULL` if `value` is None)"""
+    def __init__(self, column, value):
+        self.column = column
+        self.value = value
+
+    def _signature(self):
+        return ("eq", self.column, _is_null(self.value))
+
+    def _parameters(self):
+        return [] if _is_null(self.value) else [adql_literal(self.value)]
+
+
+class Range(Predicate):
+    """`low <= column <= high`; either bound can be None to leave it open."""
+    def __init__(self, column, low=None, high=None):
+        if low is None and high is None:
+            raise ValueError(f"At least one bound must be set for the range on {column}.")
+        self.column = column
+        self.low = low
+        self.high = high
+
+    def _signature(self):
+        return ("range", self.column, self.low is not None, self.high is not None)
+
+    def _parameters(self):
+        return [adql_literal(v) for v in (self.low, self.high) if v is not None]
+
+
+class In(Predicate):
+    """`column IN (values)`"""
+    def __init__(self, column, values):
+        self.column = column
+        self.values = np.ravel(np.asarray(values)) if not isinstance(values, (list, tuple)) else values
+        if len(self.values) == 0:
+            raise ValueError(f"The list of values for {column} is empty.")
+
+    def _signature(self):
+        return ("in", self.column)
+
+    def _parameters(self):
+        return [", ".join(adql_literal(v) for v in self.values)]
+
+
+class Like(Predicate):
+    """`column LIKE pattern`"""
+    def __init__(self, column, pattern):
+        self.column = column
+        self.pattern = pattern
+
+    def _signature(self):
+        return ("like", self.column)
+
+    def _parameters(self):
+        return [adql_literal(self.pattern)]
+
+
+class Cone(Predicate):
+    """Rows whose (`ra_column`, `dec_column`) lie within `radius` arcseconds of (`ra`, `dec`) in degrees."""
+    def __init__(self, ra_column, dec_column, ra, dec, radius):
+        self.ra_column = ra_column
+        self.dec_column = dec_column
+        self.ra = float(ra)
+        self.dec = float(dec)
+        self.radius = float(radius)
+
+    def _signature(self):
+        return ("cone", self.ra_column, self.dec_column)
+
+    def _parameters(self):
+        return [repr(self.ra), repr(self.dec), repr(self.radius / 3600.)]
+
+
+class And(Predicate):
+    """All the given predicates must hold."""
+    _operator = "AND"
+
+    def __init__(self, *predicates):
+        if not predicates:
+            raise ValueError(f"{type(self).__name__} needs at least one predicate.")
+        self.predicates = predicates
+
+    def _signature(self):
+        return (self._operator.lower(),) + tuple(p._signature() for p in self.predicates)
+
+    def _parameters(self):
+        return [value for p in self.predicates for value in p._parameters()]
+
+
+class Or(And):
+    """At least one of the given predicates must hold."""
+    _operator = "OR"
+
+
+class Not(Predicate):
+    """The given predicate must not hold."""
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def _signature(self):
+        return ("not", self.predicate._signature())
+
+    def _parameters(self):
+        return self.predicate._parameters()
+
+
+def from_conditions_dict(conditions_dict):
+    """Return an `And` of `Eq` predicates from a {column: value} dictionary (or None if empty)."""
+    if not conditions_dict:
+        return None
+    return And(*(Eq(key, value) for key, value in conditions_dict.items()))
+
+
+def compile_predicate(predicate):
+    """Compile a predicate to an ADQL boolean expression using the cached template."""
+    return _compile_template(predicate._signature()).format(*predicate._parameters())
+
+
+def adql_literal(value):
+    """Format a Python value as an ADQL literal (None is NULL)."""
+    if _is_null(value):
+        return "NULL"
+    if isinstance(value, (bytes, np.bytes_)):
+        value = value.decode("utf-8")
+    if isinstance(value, (str, np.str_)):
+        return "'" + str(value).replace("'", "''") + "'"
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(value)
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+def _is_null(value):
+    """Return True for the values written as NULL (None and masked values)."""
+    return value is None or value is np.ma.masked
+
+@lru_cache(maxsize=1024)
+def _compile_template(signature):
+    """Compile a predicate signature to an ADQL template with positional placeholders."""
+    template, _ = _build_template(signature, 0)
+    return template
+
+def _build_template(signature, index):
+    """Recursively build the template; return it with the next free placeholder index."""
+    kind = signature[0]
+    if kind == "eq":
+        _, column, is_null = signature
+        if is_null:
+            return f"{column} IS NULL", index
+        return f"{column} = {{{index}}}", index + 1
+    if kind == "range":
+        _, column, has_low, has_high = signature
+        if has_low and has_high:
+            return f"{column} BETWEEN {{{index}}} AND {{{index + 1}}}", index + 2
+        operator = ">=" if has_low else "<="
+        return f"{column} {operator} {{{index}}}", index + 1
+    if kind == "in":
+        return f"{signature[1]} IN ({{{index}}})", index + 1
+    if kind == "like":
+        return f"{signature[1]} LIKE {{{index}}}", index + 1
+    if kind == "cone":
+        _, ra_column, dec_column = signature
+        return (f"CONTAINS(POINT('ICRS', {ra_column}, {dec_column}), "
+                f"CIRCLE('ICRS', {{{index}}}, {{{index + 1}}}, {{{index + 2}}}))=1"), index + 3
+    if kind == "not":
+        inner, index = _build_template(signature[1], index)
+        return f"NOT ({inner})", index
+    if kind in ("and", "or"):
+        parts = []
+        for sub in signature[1:]:
+            part, index = _build_template(sub, index)
+            parts.append(f"({part})" if sub[0] in ("and", "or") else part)
+        return f" {kind.upper()} ".join(parts), index
+    raise ValueError(f"Unknown predicate type: {kind}")
@@ -0,0 +1,134 @@
+import re
+
+import numpy as np
+import pytest
+from astropy.coordinates import SkyCoord
+from astropy.table import Table
+
+import catalogues
+
+SOURCES = Table({"ID": np.arange(1, 9),
+                 "RA": [10., 10.0005, 20., 20.0005, 30., 30., 40., 40.],
+                 "DEC": [0.] * 8,
+                 "MAG": [15., 11., 14., 12., 13., 10., 16., 9.]})
+SOURCES["ID"][7] = 7  # two rows share the ID 7
+
+
+class FakeTAP:
+    """Evaluate the few ADQL forms built by `catalogues` on `SOURCES` and record the queries."""
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, query=None, type_of_query="sync", maxrec=None):
+        fake = self
+
+        class Query:
+            def run_query(self, to_string=True):
+                fake.queries.append((query, maxrec))
+                self.result = fake.evaluate(query, maxrec or catalogues.MAXREC)
+
+            def get_result(self):
+                return self.result.copy()
+
+        return Query()
+
+    @staticmethod
+    def evaluate(query, maxrec):
+        rows = SOURCES.copy()
+        circles = re.findall(r"CIRCLE\('ICRS', ([-\d.e]+), ([-\d.e]+), ([-\d.e]+)\)", query)
+        if circles:
+            positions = SkyCoord(rows["RA"], rows["DEC"], unit="deg")
+            keep = np.zeros(len(rows), dtype=bool)
+            for ra, dec, radius in circles:
+                keep |= positions.separation(SkyCoord(float(ra), float(dec), unit="deg")).deg <= float(radius)
+            rows = rows[keep]
+        in_list = re.search(r"ID IN \(([^)]*)\)", query)
+        if in_list:
+            rows = rows[np.isin(rows["ID"], [int(v) for v in in_list.group(1).split(",")])]
+        order = re.search(r"ORDER BY (\w+) (ASC|DESC)", query)
+        if order:
+            rows.sort(order.group(1), reverse=order.group(2) == "DESC")
+        top = re.search(r"SELECT TOP (\d+)", query)
+        if top:
+            rows = rows[:int(top.group(1))]
+        truncated = len(rows) >= maxrec
+        rows = rows[:maxrec]
+        rows.meta["truncated"] = truncated
+        columns = re.search(r"SELECT (?:TOP \d+ )?(.*?) FROM", query).group(1)
+        return rows if columns == "*" else rows[[c.strip() for c in columns.split(",")]]
+
+
+@pytest.fixture
+def tap(monkeypatch):
+    fake = FakeTAP()
+    monkeypatch.setattr(catalogues, "_ESOCatalogues", fake)
+    monkeypatch.setattr(catalogues, "_is_collection_and_table_list_at_eso", lambda *args, **kwargs: ["cat"])
+    monkeypatch.setattr(catalogues, "_is_column_list_in_catalogues",
+                        lambda columns, **kwargs: None if columns is None else list(columns))
+    monkeypatch.setattr(catalogues, "_get_column_names", lambda table: list(SOURCES.colnames))
+    monkeypatch.setattr(catalogues, "_get_ra_dec_column_names", lambda table: ("RA", "DEC"))
+    monkeypatch.setattr(catalogues, "_get_id_column_name", lambda table: "ID")
+    return fake
+
+
+def test_cone_batches_are_merged_without_duplicates(tap):
+    # The first two positions share sources 1 and 2
+    result = catalogues.query_catalogues_radec(ra=[10., 10.0004, 20.], dec=[0., 0., 0.], radius=5.,
+                                               tables="cat", batch_size=1)
+    assert len(tap.queries) == 3
+    assert list(result["ID"]) == [1, 2, 3, 4]
+    assert list(result["input_index"]) == [0, 1, 2, 2]
+
+
+def test_top_applies_to_the_merged_result(tap):
+    result = catalogues.query_catalogues_radec(ra=[10., 20., 30.], dec=[0., 0., 0.], radius=5., tables="cat",
+                                               batch_size=2, top=3, order_by="MAG")
+    assert all("TOP" not in query for query, _ in tap.queries)
+    assert list(result["MAG"]) == [10., 11., 12.]
+
+
+def test_no_positions_returns_an_empty_table(tap):
+    result = catalogues.query_catalogues_radec(ra=[], dec=[], tables="cat", columns=["MAG"])
+    assert len(result) == 0 and not tap.queries
+    assert {"MAG", "ID", "RA", "DEC", "input_index"} <= set(result.colnames)
+
+
+def test_fetch_by_ids_keeps_input_order_across_chunks(tap):
+    result = catalogues.fetch_by_ids("cat", [6, 3, 99, 1, 7, 2], chunk_size=2, max_workers=3)
+    assert [query.count(",") + 1 for query, _ in tap.queries] == [2, 2, 2]
+    assert all(maxrec == catalogues.IDS_MAXREC for _, maxrec in tap.queries)
+    # The ID 7 matches two rows; 99 matches none
+    assert list(result["ID"]) == [6, 3, 1, 7, 7, 2]
+
+
+def test_fetch_by_ids_warns_about_truncated_chunks(tap, capsys):
+    result = catalogues.fetch_by_ids("cat", [7, 1], chunk_size=2, maxrec=2)
+    assert len(result) == 2
+    assert "may be truncated" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("status, n_rows, truncated", [("OK", 5, False), ("OK", 10, True), ("OVERFLOW", 5, True)])
+def test_results_to_table_flags_truncation(status, n_rows, truncated):
+    class Results:
+        query_status = status
+
+        def to_table(self):
+            return Table({"ID": np.arange(n_rows)})
+
+    assert catalogues._results_to_table(Results(), maxrec=10).meta["truncated"] is truncated
+
+
+def test_lazy_catalogue_compiles_one_query(tap):
+    lazy = catalogues.lazy_catalogue("cat").select("ID", "MAG").where({"DEC": 0.}).order_by("MAG").top(2)
+    assert not tap.queries
+    result = lazy.collect()
+    assert len(tap.queries) == 1
+    assert tap.queries[0][0] == lazy.to_adql()
+    assert result.colnames == ["ID", "MAG"]
+    assert list(result["MAG"]) == [9., 10.]
+
+
+def test_lazy_catalogue_rejects_unknown_columns(tap):
+    with pytest.raises(ValueError, match="NOT_A_COLUMN"):
+        catalogues.lazy_catalogue("cat").select("ID", "NOT_A_COLUMN").collect()
+    assert not tap.queries
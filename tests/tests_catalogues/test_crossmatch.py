@@ -0,0 +1,35 @@
+import numpy as np
+from astropy.table import MaskedColumn, Table
+
+from crossmatch import build_sky_index, crossmatch_nearest, crossmatch_radius
+
+
+def _catalogue():
+    ra = MaskedColumn([10., 0., 10.001, 200., 0.], mask=[False, True, False, False, False])
+    dec = MaskedColumn([-5., 0., -5., 30., np.nan])
+    return Table({"RA": ra, "DEC": dec})
+
+
+def test_masked_and_nan_positions_are_not_indexed():
+    index = build_sky_index(_catalogue(), ra_column="RA", dec_column="DEC")
+    assert len(index) == 5
+    assert list(index.rows) == [0, 2, 3]
+    assert len(index.xyz) == 3
+
+
+def test_nearest_refers_to_catalogue_rows():
+    index = build_sky_index(_catalogue(), ra_column="RA", dec_column="DEC")
+    idx, sep = crossmatch_nearest(index, [10.001, 200., 0.], [-5., 30., 0.], max_sep=1.)
+    assert list(idx) == [2, 3, -1]
+    assert np.allclose(sep[:2], 0., atol=1e-6)
+    assert np.isnan(sep[2])
+
+
+def test_radius_refers_to_catalogue_rows():
+    input_idx, catalogue_idx, sep = crossmatch_radius(_catalogue(), [10., 0.], [-5., 0.], radius=5.,
+                                                      ra_column="RA", dec_column="DEC")
+    order = np.argsort(catalogue_idx)
+    assert list(input_idx[order]) == [0, 0]
+    assert list(catalogue_idx[order]) == [0, 2]
+    expected = 0.001 * 3600. * np.cos(np.radians(5.))
+    assert np.isclose(sep[order][1], expected, rtol=1e-3)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+import catalogues
+import predicates
+from predicates import And, Cone, Eq, In, Like, Not, Or, Range, adql_literal, from_conditions_dict
+
+
+@pytest.mark.parametrize("value, literal", [
+    ("HARPS", "'HARPS'"), ("O'Brien", "'O''Brien'"), (b"UVES", "'UVES'"), (np.str_("X"), "'X'"),
+    (3, "3"), (np.int64(4), "4"), (2.5, "2.5"), (True, "1"), (None, "NULL"), (np.ma.masked, "NULL")])
+def test_adql_literal(value, literal):
+    assert adql_literal(value) == literal
+
+
+def test_compile_predicates():
+    assert Eq("instrument", "HARPS").to_adql() == "instrument = 'HARPS'"
+    assert Eq("flag", None).to_adql() == "flag IS NULL"
+    assert (~Eq("flag", None)).to_adql() == "NOT (flag IS NULL)"
+    assert Range("mag", 12, 18).to_adql() == "mag BETWEEN 12 AND 18"
+    assert Range("mag", high=18).to_adql() == "mag <= 18"
+    assert In("id", [1, 2, 3]).to_adql() == "id IN (1, 2, 3)"
+    assert Like("name", "NGC%").to_adql() == "name LIKE 'NGC%'"
+    assert Cone("ra", "dec", 10, -5, 36).to_adql() == \
+        "CONTAINS(POINT('ICRS', ra, dec), CIRCLE('ICRS', 10.0, -5.0, 0.01))=1"
+    predicate = (Eq("a", 1) | Eq("b", None)) & Not(Range("c", low=0))
+    assert predicate.to_adql() == "(a = 1 OR b IS NULL) AND NOT (c >= 0)"
+
+
+def test_templates_are_cached_by_structure():
+    predicates._compile_template.cache_clear()
+    assert (Range("mag", 1, 2) & Eq("x", "a")).to_adql() == "mag BETWEEN 1 AND 2 AND x = 'a'"
+    assert (Range("mag", 3, 4) & Eq("x", "b")).to_adql() == "mag BETWEEN 3 AND 4 AND x = 'b'"
+    info = predicates._compile_template.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_invalid_predicates():
+    with pytest.raises(ValueError):
+        Range("mag")
+    with pytest.raises(ValueError):
+        In("id", [])
+    with pytest.raises(TypeError):
+        predicates.Predicate()
+    assert from_conditions_dict({}) is None
+
+
+def test_conditions_dict_accepts_values_already_quoted():
+    assert catalogues._conditions_dict_like({"instrument": "'HARPS'", "obs": "O'Brien", "n": 2}).to_adql() == \
+        "instrument = 'HARPS' AND obs = 'O''Brien' AND n = 2"
+    assert catalogues._conditions_dict_like({"name": "'O''Brien'"}).to_adql() == "name = 'O''Brien'"
+    assert catalogues._conditions_dict_like(None) is None
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+
+# =============================================================================
+# Constants
+# =============================================================================
+BLOCK_SIZE = 2880
+CARD_SIZE = 80
+SQLITE_TIMEOUT = 60.
+FITS_SUFFIXES = (".fits.Z", ".fits.gz", ".fits.fz", ".fits")
+
+# =============================================================================
+# Public API
+# =============================================================================
+# Helpers shared by the download modules and by the spectra modules of ../tests_spectra
+# (which import them with this directory on sys.path, as for `pipeline`).
+
+def default_path(variable, filename):
+    """Return the path set in the environment `variable`, or `filename` in the home directory."""
+    return os.environ.get(variable, os.path.join(os.path.expanduser("~"), filename))
+
+
+@contextmanager
+def sqlite_connection(path, timeout=SQLITE_TIMEOUT):
+    """Context manager yielding a connection to an SQLite database, committed on success and closed on exit."""
+    conn = sqlite3.connect(path, timeout=timeout)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def dp_id_from_filename(name):
+    """Return the product identifier of a file or PROV entry (its name without path and FITS suffix)."""
+    name = os.path.basename(str(name).strip())
+    for suffix in FITS_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def parse_card_value(value):
+    """
+    Convert the value field of a FITS header card (with its comment) to a Python value.
+
+    Strings are unquoted ('' is a quote, trailing spaces are dropped), T/F
+    are booleans, and numbers are int or float (Fortran `D` exponents are
+    accepted); anything else is returned as a string.
+    """
+    value = value.strip()
+    if value.startswith("'"):
+        end = value.find("'", 1)
+        while end != -1 and value[end + 1:end + 2] == "'":
+            end = value.find("'", end + 2)
+        return value[1:end if end != -1 else None].replace("''", "'").rstrip()
+    value = value.split("/", 1)[0].strip()
+    if value == "T":
+        return True
+    if value == "F":
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value.replace("D", "E"))
+    except ValueError:
+        return value
+
+
+def promote_type(kind, other):
+    """Return a type able to hold values of both types (bool < int < float < str)."""
+    if kind is other:
+        return kind
+    order = [bool, int, float]
+    if kind in order and other in order:
+        return max(kind, other, key=order.index)
+    return str
+
+
+def hdu_data_size(cards):
+    """
+    Return the size in bytes of the data of an HDU from its header keywords (FITS standard, 4.4.1).
+
+    Args:
+        cards (dict or astropy.io.fits.Header): Keywords of the header (values as parsed by
+            `parse_card_value`, or as read by astropy).
+    """
+    naxis = int(cards.get("NAXIS", 0))
+    if naxis == 0:
+        return 0
+    axes = [int(cards.get(f"NAXIS{i}", 0)) for i in range(1, naxis + 1)]
+    if cards.get("GROUPS") in (True, "T") and axes[0] == 0:
+        axes = axes[1:]
+    bitpix = abs(int(cards.get("BITPIX", 8)))
+    return bitpix // 8 * int(cards.get("GCOUNT", 1)) * (int(cards.get("PCOUNT", 0)) + int(np.prod(axes)))
+
+
+def padded_size(size):
+    """Round a size up to a whole number of FITS blocks."""
+    return -(-size // BLOCK_SIZE) * BLOCK_SIZE
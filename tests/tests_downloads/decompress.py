@@ -0,0 +1,454 @@
+import gzip
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+from astropy.table import Table
+
+# =============================================================================
+# Constants
+# =============================================================================
+LZW_MAGIC = b"\x1f\x9d"
+CHUNK_SIZE = 1024 * 1024
+PIPE_COMMAND = ("gzip", "-dc")  # gzip also reads the .Z (LZW) format
+FILE_COMMANDS = {".Z": ("uncompress", "-f"), ".gz": ("gzip", "-df")}  # decompression of files on disk
+
+# =============================================================================
+# Public API Functions
+# =============================================================================
+
+class DecompressionError(OSError):
+    """The data are not a valid (or complete) compressed stream."""
+
+
+def get_decompressor(filename):
+    """
+    Return an incremental decompressor for a compressed file name.
+
+    Unix `compress` (`.Z`, LZW) and gzip (`.gz`) files get a decompressor
+    with `decompress(data)`, `flush()` and `close()` methods, so data can be
+    decompressed chunk by chunk while they are downloaded. Tile-compressed
+    FITS (`.fz`) and uncompressed files are passed through (None is
+    returned), as astropy reads them directly.
+
+    gzip data are decoded by zlib. LZW data are piped through a `gzip -dc`
+    subprocess, so they are decoded in C and outside of the GIL while the
+    download threads keep running; a (much slower) pure-Python decoder is
+    used only if `gzip` is not installed. All of them raise a
+    `DecompressionError` on corrupt or truncated data.
+
+    Args:
+        filename (str): Name of the file.
+
+    Returns:
+        object or None: The decompressor, or None if the file is passed through.
+    """
+    if filename.endswith(".Z"):
+        return _PipeDecompressor() if shutil.which(PIPE_COMMAND[0]) else _LZWDecompressor()
+    if filename.endswith(".gz"):
+        return _GzipDecompressor()
+    return None
+
+
+def decompressed_filename(filename):
+    """Return the name of `filename` once decompressed (unchanged if it is passed through)."""
+    if filename.endswith(".Z"):
+        return filename[:-2]
+    if filename.endswith(".gz"):
+        return filename[:-3]
+    return filename
+
+
+def decompress_file(file_path, output_path=None, remove=True, chunk_size=CHUNK_SIZE):
+    """
+    Decompress a `.Z` or `.gz` file already on disk, in fixed-size chunks.
+
+    This replaces the `subprocess.run(['uncompress', file_path])` call of the
+    notebooks for files that were not decompressed while downloading.
+
+    Args:
+        file_path (str): Path of the compressed file.
+        output_path (str): Path of the decompressed file (default: `file_path` without suffix).
+        remove (bool): If True, remove the compressed file on success.
+        chunk_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: Path of the decompressed file (`file_path` itself if it is passed through).
+
+    Raises:
+        DecompressionError: If the file is corrupt (the compressed file is kept).
+    """
+    decompressor = get_decompressor(file_path)
+    if decompressor is None:
+        return file_path
+    output_path = output_path or decompressed_filename(file_path)
+    tmp_path = f"{output_path}.tmp"
+    try:
+        with open(file_path, "rb") as f_in, open(tmp_path, "wb") as f_out:
+            for chunk in iter(lambda: f_in.read(chunk_size), b""):
+                f_out.write(decompressor.decompress(chunk))
+            f_out.write(decompressor.flush())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        decompressor.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if remove:
+        os.remove(file_path)
+    return output_path
+
+
+def benchmark_decompression(size_mb=16, chunk_size=CHUNK_SIZE, seed=0):
+    """
+    Compare the streaming decompression with the decompression of files on disk.
+
+    A synthetic FITS-like payload (a noisy 16-bit image with empty regions)
+    is compressed in memory with gzip and LZW, then decompressed:
+
+    - 'stream': chunk by chunk with `get_decompressor`, as during a download;
+    - 'python': chunk by chunk with the pure-Python LZW decoder (the fallback
+      used when `gzip` is not installed);
+    - 'file': by running `uncompress`/`gzip -d` on a file written to disk, as
+      the notebooks did after the download (the reference of `speedup`).
+
+    Args:
+        size_mb (float): Size of the uncompressed payload in MB.
+        chunk_size (int): Size of the compressed chunks fed to the decompressor.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        astropy.table.Table: Format, method, compressed/uncompressed sizes, time, throughput
+            and speedup over the 'file' method (NaN if its command is not installed).
+    """
+    payload = _synthetic_payload(int(size_mb * 1024 ** 2), seed)
+    archives = {"gzip": (".gz", gzip.compress(payload, compresslevel=6)),
+                "lzw": (".Z", _lzw_compress(payload))}
+    rows = []
+    for name, (suffix, compressed) in archives.items():
+        decompressors = {"stream": get_decompressor(f"file.fits{suffix}")}
+        if suffix == ".Z":
+            decompressors["python"] = _LZWDecompressor()
+        timings = {method: _time_stream(decompressor, compressed, chunk_size, len(payload))
+                   for method, decompressor in decompressors.items()}
+        timings["file"] = _time_file_command(suffix, compressed, len(payload))
+        reference = timings["file"]
+        for method, seconds in timings.items():
+            if seconds is None:
+                continue
+            rows.append([name, method, len(compressed), len(payload), seconds, len(payload) / seconds / 1024 ** 2,
+                         reference / seconds if reference else np.nan])
+    return Table(rows=rows, names=["format", "method", "compressed_size", "size", "seconds", "MB_per_s", "speedup"])
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+class _GzipDecompressor:
+    """
+    Internal incremental gzip decompressor (handles multi-member files).
+    """
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._in_member = False
+
+    def decompress(self, data):
+        out = []
+        try:
+            while data:
+                self._in_member = True
+                out.append(self._decompressor.decompress(data))
+                if not self._decompressor.eof:
+                    break
+                data = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                self._in_member = False
+        except zlib.error as err:
+            raise DecompressionError(f"Corrupt gzip stream: {err}") from err
+        return b"".join(out)
+
+    def flush(self):
+        try:
+            out = self._decompressor.flush()
+        except zlib.error as err:
+            raise DecompressionError(f"Corrupt gzip stream: {err}") from err
+        if self._in_member and not self._decompressor.eof:
+            raise DecompressionError("Truncated gzip stream")
+        return out
+
+    def close(self):
+        pass
+
+
+class _PipeDecompressor:
+    """
+    Internal incremental decompressor running `gzip -dc` in a subprocess.
+
+    The compressed data are written to the standard input of the process
+    and a reader thread collects the decompressed output, so the decoding
+    runs in C without holding the GIL. The process is started by the first
+    call of `decompress`.
+    """
+    def __init__(self, command=PIPE_COMMAND):
+        self.command = command
+        self._process = None
+        self._reader = None
+        self._output = []
+        self._lock = threading.Lock()
+
+    def decompress(self, data):
+        if self._process is None:
+            self._start()
+        try:
+            self._process.stdin.write(data)
+        except BrokenPipeError:
+            self._raise_error()
+        return self._drain()
+
+    def flush(self):
+        if self._process is None:
+            return b""
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._reader.join()
+        if self._process.wait() != 0:
+            self._raise_error()
+        self._process.stderr.close()
+        return self._drain()
+
+    def close(self):
+        """Stop the process (after an interrupted transfer)."""
+        if self._process is not None:
+            self._stop()
+            self._close_pipes()
+
+    def _start(self):
+        self._process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE)
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        with self._process.stdout:
+            for chunk in iter(lambda: os.read(self._process.stdout.fileno(), CHUNK_SIZE), b""):
+                with self._lock:
+                    self._output.append(chunk)
+
+    def _drain(self):
+        with self._lock:
+            out, self._output = b"".join(self._output), []
+        return out
+
+    def _stop(self):
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        self._reader.join()
+
+    def _close_pipes(self):
+        for stream in (self._process.stdin, self._process.stderr):
+            try:
+                stream.close()
+            except BrokenPipeError:
+                pass
+
+    def _raise_error(self):
+        self._stop()
+        message = self._process.stderr.read().decode(errors="replace").strip()
+        self._close_pipes()
+        raise DecompressionError(f"Corrupt compressed stream ({' '.join(self.command)}: {message})")
+
+
+class _LZWDecompressor:
+    """
+    Internal incremental decompressor for the Unix `compress` (.Z) format.
+
+    Codes are read in groups of `n_bits` bytes (8 codes); as in `compress`,
+    the remainder of a group is skipped when the code width changes or the
+    table is cleared.
+    """
+    def __init__(self):
+        self._buffer = b""
+        self._header = False
+        self._max_bits = 16
+        self._block_mode = True
+        self._n_bits = 9
+        self._max_code = (1 << 9) - 1
+        self._max_max_code = 1 << 16
+        self._table = [bytes([i]) for i in range(256)]
+        self._old = None
+
+    def decompress(self, data):
+        self._buffer += data
+        if not self._header:
+            if len(self._buffer) < 3:
+                return b""
+            self._read_header()
+        return self._decode(final=False)
+
+    def flush(self):
+        if not self._header:
+            if self._buffer:
+                raise DecompressionError("Truncated .Z header")
+            return b""
+        return self._decode(final=True)
+
+    def close(self):
+        pass
+
+    def _read_header(self):
+        if self._buffer[:2] != LZW_MAGIC:
+            raise DecompressionError("Not a .Z (LZW) compressed stream")
+        flags = self._buffer[2]
+        self._max_bits = flags & 0x1f
+        self._block_mode = bool(flags & 0x80)
+        if not 9 <= self._max_bits <= 16:
+            raise DecompressionError(f"Unsupported number of bits in .Z stream: {self._max_bits}")
+        self._max_max_code = 1 << self._max_bits
+        if self._block_mode:
+            self._table.append(b"")  # code 256 is CLEAR
+        self._buffer = self._buffer[3:]
+        self._header = True
+
+    def _decode(self, final):
+        out = []
+        table = self._table
+        buffer = self._buffer
+        pos = 0
+        while True:
+            n_bits = self._n_bits
+            available = len(buffer) - pos
+            if available < n_bits and not (final and available * 8 >= n_bits):
+                break
+            group = buffer[pos:pos + n_bits]
+            pos += len(group)
+            bits = int.from_bytes(group, "little")
+            mask = (1 << n_bits) - 1
+            for _ in range(len(group) * 8 // n_bits):
+                code = bits & mask
+                bits >>= n_bits
+                old = self._old
+                if old is None:
+                    if code >= 256:
+                        raise DecompressionError("Corrupt .Z stream")
+                    entry = table[code]
+                    out.append(entry)
+                    self._old = code
+                    continue
+                if code == 256 and self._block_mode:
+                    del table[257:]
+                    table[256] = b""
+                    self._n_bits = 9
+                    self._max_code = (1 << 9) - 1
+                    self._old = None
+                    break
+                free = len(table)
+                if code < free:
+                    entry = table[code]
+                elif code == free:
+                    previous = table[old]
+                    entry = previous + previous[:1]
+                else:
+                    raise DecompressionError("Corrupt .Z stream")
+                out.append(entry)
+                if free < self._max_max_code:
+                    table.append(table[old] + entry[:1])
+                self._old = code
+                if len(table) > self._max_code and self._n_bits < self._max_bits:
+                    self._n_bits += 1
+                    self._max_code = (self._max_max_code if self._n_bits == self._max_bits
+                                      else (1 << self._n_bits) - 1)
+                    break
+        self._buffer = buffer[pos:]
+        return b"".join(out)
+
+# -----------------------------------------------------------------------------
+# Internal helper functions
+# -----------------------------------------------------------------------------
+
+def _synthetic_payload(size, seed=0):
+    """Return `size` bytes looking like a 16-bit FITS image with empty regions."""
+    rng = np.random.default_rng(seed)
+    n = size // 2
+    image = (1000 + rng.normal(0., 20., n)).astype(">i2")
+    image[: n // 10] = 0
+    return image.tobytes() + b"\0" * (size - 2 * n)
+
+def _time_stream(decompressor, compressed, chunk_size, size):
+    """Return the time taken to decompress `compressed` chunk by chunk."""
+    start = time.perf_counter()
+    n_out = 0
+    for i in range(0, len(compressed), chunk_size):
+        n_out += len(decompressor.decompress(compressed[i:i + chunk_size]))
+    n_out += len(decompressor.flush())
+    seconds = time.perf_counter() - start
+    if n_out != size:
+        raise RuntimeError(f"Decompressed {n_out} bytes instead of {size}")
+    return seconds
+
+def _time_file_command(suffix, compressed, size):
+    """Return the time taken by the command-line tool to decompress a file on disk (None if not installed)."""
+    command = FILE_COMMANDS[suffix]
+    if not shutil.which(command[0]):
+        return None
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, f"file.fits{suffix}")
+        with open(file_path, "wb") as f:
+            f.write(compressed)
+        start = time.perf_counter()
+        subprocess.run([*command, file_path], check=True)
+        seconds = time.perf_counter() - start
+        if os.path.getsize(decompressed_filename(file_path)) != size:
+            raise RuntimeError(f"{command[0]} decompressed a file of the wrong size")
+    return seconds
+
+def _lzw_compress(data, max_bits=16):
+    """Compress `data` in the Unix `compress` (.Z) format, for benchmarks."""
+    out = bytearray(LZW_MAGIC + bytes([0x80 | max_bits]))
+    max_max_code = 1 << max_bits
+    table = {bytes([i]): i for i in range(256)}
+    free = 257
+    n_bits, max_code = 9, 1 << 9
+    group, group_bits = 0, 0
+
+    def emit(code):
+        nonlocal group, group_bits, n_bits, max_code
+        group |= code << group_bits
+        group_bits += n_bits
+        if group_bits == n_bits * 8:
+            out.extend(group.to_bytes(n_bits, "little"))
+            group, group_bits = 0, 0
+
+    def flush_group():
+        nonlocal group, group_bits
+        if group_bits:
+            out.extend(group.to_bytes(n_bits, "little"))
+            group, group_bits = 0, 0
+
+    current = b""
+    for byte in data:
+        candidate = current + bytes([byte])
+        if candidate in table:
+            current = candidate
+            continue
+        emit(table[current])
+        if free < max_max_code:
+            table[candidate] = free
+            free += 1
+            if free > max_code and n_bits < max_bits:
+                flush_group()
+                n_bits += 1
+                max_code = max_max_code if n_bits == max_bits else 1 << n_bits
+        current = bytes([byte])
+    if current:
+        emit(table[current])
+    if group_bits:
+        out.extend(group.to_bytes((group_bits + 7) // 8, "little"))
+    return bytes(out)
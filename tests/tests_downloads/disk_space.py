@@ -0,0 +1,107 @@
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+# =============================================================================
+# Constants
+# =============================================================================
+MIN_FREE_SPACE = 0  # `min_disk_space` of old/default.txt was 6 GB (6 * 1024 ** 3)
+POLL_INTERVAL = 5.
+ESTSIZE_UNIT = 1024  # ObsCore `access_estsize` is in kbyte
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class DiskSpaceScheduler:
+    """
+    Reserve disk space for downloads before they start.
+
+    Each transfer reserves its estimated size on the filesystem of its
+    destination directory (not on `./`, as `old/checks.check_disk_space`
+    does). A reservation is granted only if the free space, minus the space
+    already reserved by running transfers on the same filesystem, stays
+    above `min_free_space`; otherwise the transfer waits until another one
+    releases its reservation. A transfer that could not fit even on an idle
+    filesystem fails at once instead of waiting forever. A transfer of
+    unknown size reserves nothing and is never held back.
+
+    The same scheduler can be shared by several concurrent calls of
+    `download_products`, so they never fill the disk together.
+
+    Args:
+        min_free_space (int): Number of bytes that must be left free on each filesystem (default: 0;
+            `6 * 1024 ** 3` keeps the margin of `old/default.txt`).
+        poll_interval (float): Seconds between two checks of the free space while waiting
+            (other processes may free or use space in the meantime).
+    """
+    def __init__(self, min_free_space=MIN_FREE_SPACE, poll_interval=POLL_INTERVAL):
+        self.min_free_space = min_free_space
+        self.poll_interval = poll_interval
+        self._reserved = {}
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, destination, size):
+        """
+        Context manager holding a reservation of `size` bytes on the filesystem of `destination`.
+
+        Blocks until the space is available. The reservation is released on
+        exit, when the downloaded file itself occupies the space.
+
+        Args:
+            destination (str): Directory where the file will be written.
+            size (int): Estimated size in bytes (None or 0 if unknown: nothing is reserved).
+
+        Raises:
+            OSError: If the filesystem cannot hold the file even without other transfers.
+        """
+        size = int(size or 0)
+        if size <= 0:
+            yield
+            return
+        device = os.stat(destination).st_dev
+        with self._condition:
+            while not self._fits(destination, device, size):
+                self._condition.wait(self.poll_interval)
+            self._reserved[device] = self._reserved.get(device, 0) + size
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._reserved[device] -= size
+                self._condition.notify_all()
+
+    def reserved(self, destination):
+        """Return the number of bytes currently reserved on the filesystem of `destination`."""
+        with self._condition:
+            return self._reserved.get(os.stat(destination).st_dev, 0)
+
+    def _fits(self, destination, device, size):
+        """Return True if `size` bytes can be reserved now (raise OSError if they never can)."""
+        free = shutil.disk_usage(destination).free
+        reserved = self._reserved.get(device, 0)
+        if size > free - self.min_free_space and reserved == 0:
+            raise OSError(f"Not enough disk space in {destination}: {size / 1024 ** 2:.1f} MB needed, "
+                          f"{max(free - self.min_free_space, 0) / 1024 ** 2:.1f} MB available "
+                          f"above the minimum of {self.min_free_space / 1024 ** 3:.2f} GB")
+        return size <= free - self.min_free_space - reserved
+
+
+def estimated_sizes(table, column="access_estsize", unit=ESTSIZE_UNIT):
+    """
+    Return the estimated product sizes in bytes from a query result.
+
+    Args:
+        table (astropy.table.Table): Result of an ObsCore query.
+        column (str): Column with the estimated sizes.
+        unit (int): Number of bytes per unit of `column` (ObsCore `access_estsize` is in kbyte).
+
+    Returns:
+        list: Size in bytes of each row (None where unknown).
+    """
+    values = np.ma.masked_invalid(np.ma.asarray(table[column], dtype=float))
+    return [None if np.ma.is_masked(v) else int(v * unit) for v in values]
@@ -0,0 +1,268 @@
+import inspect
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from astropy.table import Table
+
+from downloads import ESO_DOWNLOAD_URL, MAX_WORKERS, download_products
+
+# =============================================================================
+# Constants
+# =============================================================================
+LEASE_SECONDS = 600.
+MAX_ATTEMPTS = 5
+SQLITE_TIMEOUT = 60.
+STATUSES = ("pending", "in_progress", "done", "failed")
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class DownloadQueue:
+    """
+    Durable queue of `dp_id` transfers stored in a SQLite database.
+
+    Each transfer is `pending`, `in_progress`, `done` or `failed`. A worker
+    claims pending transfers with a lease: they become `in_progress` under
+    its name until the lease expires. Running workers renew their leases, so
+    a transfer whose worker crashed or was killed becomes claimable again
+    once its lease runs out. Its partial file is then resumed by the next
+    worker (see `downloads.resumable_download`). Adding and completing
+    transfers are idempotent, so the same queue can be filled and worked on
+    again after a restart without downloading anything twice.
+
+    Claims run in `BEGIN IMMEDIATE` transactions, so several processes (or
+    nodes sharing the database file) never claim the same transfer. The
+    database uses the default rollback journal rather than WAL, because WAL
+    does not work across hosts on network filesystems.
+
+    Args:
+        path (str): Path of the SQLite database (created if needed).
+        max_attempts (int): Number of failed claims after which a transfer is marked `failed`.
+    """
+    def __init__(self, path, max_attempts=MAX_ATTEMPTS):
+        self.path = os.path.abspath(path)
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transfers (
+                    dp_id TEXT PRIMARY KEY,
+                    destination TEXT NOT NULL,
+                    size INTEGER,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_expires REAL,
+                    path TEXT,
+                    error TEXT,
+                    updated REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS transfers_status ON transfers (status, lease_expires)")
+
+    def add(self, dp_ids, destination="./data/", sizes=None):
+        """
+        Add transfers to the queue (`dp_ids` already in the queue are left untouched).
+
+        Args:
+            dp_ids (list): Data product identifiers.
+            destination (str): Directory where the files are saved.
+            sizes (list): Estimated size in bytes of each product (see `disk_space.estimated_sizes`).
+
+        Returns:
+            int: Number of transfers actually added.
+        """
+        dp_ids = [str(dp_id) for dp_id in dp_ids]
+        sizes = sizes if sizes is not None else [None] * len(dp_ids)
+        destination = os.path.abspath(destination)
+        now = time.time()
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO transfers (dp_id, destination, size, updated) "
+                             "VALUES (?, ?, ?, ?)",
+                             [(dp_id, destination, size, now) for dp_id, size in zip(dp_ids, sizes)])
+            return conn.total_changes - before
+
+    def claim(self, worker, n=1, lease=LEASE_SECONDS):
+        """
+        Atomically claim up to `n` transfers for `worker`.
+
+        Pending transfers come first, then transfers whose lease expired
+        (their worker is presumed dead). An expired transfer already claimed
+        `max_attempts` times is marked `failed` instead of being claimed again.
+
+        Returns:
+            list: One dictionary per claimed transfer (`dp_id`, `destination`, `size`, `attempts`).
+        """
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            conn.execute("UPDATE transfers SET status = 'failed', lease_expires = NULL, updated = ?, "
+                         "error = COALESCE(error, 'Lease expired after ' || attempts || ' attempt(s)') "
+                         "WHERE status = 'in_progress' AND lease_expires < ? AND attempts >= ?",
+                         (now, now, self.max_attempts))
+            rows = conn.execute("SELECT dp_id, destination, size, attempts FROM transfers "
+                                "WHERE status = 'pending' OR (status = 'in_progress' AND lease_expires < ?) "
+                                "ORDER BY status = 'in_progress', updated LIMIT ?", (now, n)).fetchall()
+            conn.executemany("UPDATE transfers SET status = 'in_progress', worker = ?, lease_expires = ?, "
+                             "attempts = attempts + 1, updated = ? WHERE dp_id = ?",
+                             [(worker, now + lease, now, row[0]) for row in rows])
+        return [dict(zip(["dp_id", "destination", "size", "attempts"], row)) for row in rows]
+
+    def renew(self, worker, lease=LEASE_SECONDS):
+        """Extend the leases of all the transfers `worker` is working on."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE transfers SET lease_expires = ? WHERE status = 'in_progress' AND worker = ?",
+                         (now + lease, worker))
+
+    def complete(self, dp_id, worker, path):
+        """Mark a transfer `done` (ignored if it was claimed again by another worker meanwhile)."""
+        with self._connect() as conn:
+            conn.execute("UPDATE transfers SET status = 'done', path = ?, error = NULL, lease_expires = NULL, "
+                         "updated = ? WHERE dp_id = ? AND worker = ? AND status = 'in_progress'",
+                         (path, time.time(), dp_id, worker))
+
+    def fail(self, dp_id, worker, error):
+        """Return a transfer to `pending`, or mark it `failed` after `max_attempts` claims."""
+        with self._connect() as conn:
+            conn.execute("UPDATE transfers SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                         "error = ?, lease_expires = NULL, updated = ? "
+                         "WHERE dp_id = ? AND worker = ? AND status = 'in_progress'",
+                         (self.max_attempts, error, time.time(), dp_id, worker))
+
+    def retry_failed(self):
+        """Put all `failed` transfers back to `pending` with a fresh attempt count."""
+        with self._connect() as conn:
+            return conn.execute("UPDATE transfers SET status = 'pending', attempts = 0, updated = ? "
+                                "WHERE status = 'failed'", (time.time(),)).rowcount
+
+    def counts(self):
+        """Return the number of transfers in each status."""
+        with self._connect() as conn:
+            rows = dict(conn.execute("SELECT status, COUNT(*) FROM transfers GROUP BY status").fetchall())
+        return {status: rows.get(status, 0) for status in STATUSES}
+
+    def to_table(self):
+        """Return the content of the queue as a table."""
+        names = ["dp_id", "destination", "size", "status", "attempts", "worker", "path", "error", "updated"]
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {', '.join(names)} FROM transfers ORDER BY dp_id").fetchall()
+        dtype = [str, str, int, str, int, str, str, str, float]
+        if not rows:
+            return Table(names=names, dtype=dtype)
+        missing = {str: "", int: -1, float: 0.}
+        return Table(rows=[[missing[t] if v is None else v for t, v in zip(dtype, row)] for row in rows],
+                     names=names, dtype=dtype)
+
+    @contextmanager
+    def _connect(self, immediate=False):
+        conn = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+
+def run_worker(queue, worker=None, batch_size=MAX_WORKERS, lease=LEASE_SECONDS, base_url=ESO_DOWNLOAD_URL,
+               **kwargs):
+    """
+    Work on a download queue until no transfer is left to claim.
+
+    Transfers are claimed in batches of `batch_size` and downloaded in
+    parallel with `downloads.download_products`. Each transfer is then marked
+    `done` or returned to the queue. A background thread renews the leases
+    while the batch runs. Several workers can run the same queue at once, in
+    other processes or on other nodes sharing the filesystem. A killed
+    worker's transfers are picked up again when its leases expire.
+
+    Args:
+        queue (DownloadQueue or str): The queue, or the path of its database.
+        worker (str): Name of the worker (default: `<hostname>:<pid>`).
+        batch_size (int): Number of transfers claimed and downloaded at a time.
+        lease (float): Lease duration in seconds.
+        base_url (str): URL prefix to which each `dp_id` is appended.
+        **kwargs: Other arguments of `downloads.download_products` (e.g. `store`, `decompress`).
+
+    Returns:
+        dict: Number of transfers in each status once the worker stops.
+
+    Raises:
+        TypeError: If `kwargs` are not arguments of `download_products`, or are set by the queue
+            (`dp_ids`, `destination`, `sizes`), before any transfer is claimed.
+    """
+    _check_download_kwargs(kwargs)
+    queue = queue if isinstance(queue, DownloadQueue) else DownloadQueue(queue)
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+    renewer = threading.Thread(target=_renew_leases, args=(queue, worker, lease, stop), daemon=True)
+    renewer.start()
+    try:
+        while True:
+            batch = queue.claim(worker, n=batch_size, lease=lease)
+            if not batch:
+                break
+            for destination, transfers in _group_by_destination(batch).items():
+                _run_batch(queue, worker, destination, transfers, base_url, kwargs)
+    finally:
+        stop.set()
+        renewer.join()
+    return queue.counts()
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+def _run_batch(queue, worker, destination, transfers, base_url, kwargs):
+    """Download one batch of claimed transfers and record the outcome of each."""
+    dp_ids = [t["dp_id"] for t in transfers]
+    try:
+        results = download_products(dp_ids, destination=destination, base_url=base_url,
+                                    sizes=[t["size"] for t in transfers], **kwargs)
+    except Exception as err:  # any failure of the batch must release the claimed transfers
+        for dp_id in dp_ids:
+            queue.fail(dp_id, worker, f"{type(err).__name__}: {err}")
+        return
+    for row in results:
+        if row["status"] == "failed":
+            queue.fail(row["dp_id"], worker, row["error"])
+        else:
+            queue.complete(row["dp_id"], worker, row["path"])
+
+# -----------------------------------------------------------------------------
+# Internal helper functions
+# -----------------------------------------------------------------------------
+
+def _renew_leases(queue, worker, lease, stop):
+    """Renew the leases of `worker` every third of the lease duration until `stop` is set."""
+    while not stop.wait(lease / 3.):
+        try:
+            queue.renew(worker, lease=lease)
+        except sqlite3.Error as err:
+            print(f"Could not renew the leases of {worker}: {err}")
+
+def _check_download_kwargs(kwargs):
+    """Raise a TypeError if `kwargs` cannot be passed on to `download_products` by `_run_batch`."""
+    parameters = inspect.signature(download_products).parameters
+    for name in kwargs:
+        if name in ("dp_ids", "destination", "sizes"):
+            raise TypeError(f"run_worker() sets the `{name}` argument of download_products itself")
+        if name not in parameters:
+            raise TypeError(f"download_products() got an unexpected keyword argument '{name}'")
+
+def _group_by_destination(transfers):
+    """Group claimed transfers by destination directory."""
+    groups = {}
+    for transfer in transfers:
+        groups.setdefault(transfer["destination"], []).append(transfer)
+    return groups
@@ -0,0 +1,734 @@
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.message import Message
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+from astropy.table import Table
+from requests.adapters import HTTPAdapter
+
+from checksums import ChecksumError, StreamingVerifier
+from disk_space import ESTSIZE_UNIT, DiskSpaceScheduler
+from decompress import DecompressionError, decompress_file, decompressed_filename, get_decompressor
+
+# =============================================================================
+# Constants
+# =============================================================================
+ESO_DOWNLOAD_URL = "https://dataportal.eso.org/dataPortal/file/"
+MAX_WORKERS = 8
+MAX_CONNECTIONS_PER_HOST = 4
+TIMEOUT = 60.
+CHUNK_SIZE = 1024 * 1024
+JOURNAL_INTERVAL = 16 * 1024 * 1024
+RETRIES = 3
+RETRY_BACKOFF = 1.  # seconds before the first retry, doubled for each of the next ones
+MAX_RETRY_BACKOFF = 60.
+TRANSIENT_STATUS_CODES = (408, 429)  # retried like the 5xx errors
+DECOMPRESSION_FACTOR = 3.  # decompressed / compressed size assumed when reserving space for decompress=True
+SIZE_COLUMNS = (("access_estsize", ESTSIZE_UNIT), ("filesize", 1))  # ObsCore (kbyte), raw tables (bytes)
+
+# =============================================================================
+# Public API Functions
+# =============================================================================
+
+def download_products(dp_ids, destination="./data/", base_url=ESO_DOWNLOAD_URL, max_workers=MAX_WORKERS,
+                      max_connections_per_host=MAX_CONNECTIONS_PER_HOST, overwrite=False, resume=True,
+                      retries=RETRIES, decompress=False, store=None, sizes=None, disk_scheduler=None,
+                      verify=True, verbose=False):
+    """
+    Download ESO data products in parallel.
+
+    The files are fetched through a bounded thread pool sharing a single HTTP
+    session, with at most `max_connections_per_host` transfers open to any
+    host at the same time. Products already present in `destination` are
+    not downloaded again unless `overwrite` is True. With `resume`, an
+    interrupted transfer (in this call or a previous one) continues from the
+    bytes already on disk instead of starting from zero. With `decompress`,
+    `.Z` and `.gz` products are decompressed while they stream in, so they
+    land on disk uncompressed in a single pass (`.fz` files are kept as is).
+    With a `store`, products already downloaded anywhere on the same
+    filesystem are linked from the store instead of being fetched, and new
+    downloads are added to it.
+
+    Before a transfer starts, its estimated size (from `sizes`, or from the
+    `access_estsize`/`filesize` column when `dp_ids` is a query result) is
+    reserved on the filesystem of `destination` through `disk_scheduler`
+    (with `decompress`, `DECOMPRESSION_FACTOR` times the size, as the file
+    lands on disk decompressed). Transfers wait while the reservations of
+    the running ones would leave less than `disk_scheduler.min_free_space`
+    free, and fail if the file can never fit. Transfers of unknown size
+    are not held back.
+
+    With `verify`, the FITS DATASUM/CHECKSUM keywords of each HDU and a
+    SHA-256 of the file are computed while the bytes are written (see
+    `checksums.StreamingVerifier`). A corrupted transfer is detected without
+    reading the file again, and it is retried from zero.
+
+    Args:
+        dp_ids (str, list or astropy.table.Table): Data product identifier(s), or a query result
+            with a `dp_id` column (and the sizes of the products, if present).
+        destination (str): Directory where the files are saved.
+        base_url (str): URL prefix to which each `dp_id` is appended.
+        max_workers (int): Maximum number of concurrent downloads.
+        max_connections_per_host (int): Maximum number of concurrent downloads from one host.
+        overwrite (bool): If True, download files even if they are already present.
+        resume (bool): If True, keep partial files and continue them with HTTP Range requests.
+        retries (int): Number of additional attempts for a transfer that failed on a connection
+            error, a server (5xx) error or a corrupted transfer, with an exponential backoff between
+            attempts (other errors, e.g. 404, are not retried).
+        decompress (bool): If True, decompress `.Z` and `.gz` products while downloading.
+        store (store.ProductStore): Local product store to look up and fill.
+        sizes (list): Estimated size in bytes of each product, aligned with `dp_ids` (None where unknown;
+            overrides the sizes of a query result).
+        disk_scheduler (disk_space.DiskSpaceScheduler): Scheduler to reserve disk space with
+            (default: one shared by all calls). Share one to coordinate several destinations or calls.
+        verify (bool): If True, verify the FITS checksums of the downloaded files.
+        verbose (bool): If True, print one line per file.
+
+    Returns:
+        astropy.table.Table: One row per `dp_id`, in input order, with the
+            local `path`, `status` ('downloaded', 'store', 'local' or 'failed'),
+            `size` in bytes, download time in `seconds` and `checksum` status
+            ('valid', 'absent', 'not FITS', or empty if not verified).
+    """
+    dp_ids, sizes = _ids_and_sizes(dp_ids, sizes)
+    start = time.perf_counter()
+    results_by_id = {result["dp_id"]: result for result in iter_downloads(
+        dp_ids, destination=destination, base_url=base_url, max_workers=max_workers,
+        max_connections_per_host=max_connections_per_host, overwrite=overwrite, resume=resume, retries=retries,
+        decompress=decompress, store=store, sizes=sizes, disk_scheduler=disk_scheduler, verify=verify,
+        verbose=verbose)}
+    results = [results_by_id[dp_id] for dp_id in dp_ids]
+    _THROUGHPUT.record(sum(r["size"] for r in results_by_id.values() if r["status"] == "downloaded"),
+                       time.perf_counter() - start)
+
+    table = _results_to_table(results)
+    n_failed = int(np.sum(table["status"] == "failed")) if len(table) else 0
+    print(f"Retrieved {len(table) - n_failed} of {len(table)} products "
+          f"({np.sum(table['size']) / 1024 ** 2 if len(table) else 0.:.1f} MB) into {destination}")
+    return table
+
+
+def iter_downloads(dp_ids, destination="./data/", base_url=ESO_DOWNLOAD_URL, max_workers=MAX_WORKERS,
+                   max_connections_per_host=MAX_CONNECTIONS_PER_HOST, overwrite=False, resume=True,
+                   retries=RETRIES, decompress=False, store=None, sizes=None, disk_scheduler=None,
+                   verify=True, verbose=False):
+    """
+    Download ESO data products in parallel, yielding each result as soon as its transfer ends.
+
+    This is the generator behind `download_products` (same arguments), for
+    consumers that start working on a file while the others are still
+    downloading. Results come in completion order, one per distinct `dp_id`.
+    Closing the generator early cancels the transfers not yet started.
+
+    Yields:
+        dict: `dp_id`, `path`, `status`, `size`, `seconds`, `error` and `checksum` of a product.
+    """
+    dp_ids, sizes = _ids_and_sizes(dp_ids, sizes)
+    sizes = dict(zip(dp_ids, sizes)) if sizes is not None else {}
+    disk_scheduler = disk_scheduler or _DISK_SCHEDULER
+    os.makedirs(destination, exist_ok=True)
+    downloader = _ESODownloader(base_url=base_url, max_connections_per_host=max_connections_per_host,
+                                pool_size=max_workers)
+
+    def run(dp_id):
+        result = downloader.download(dp_id, destination, overwrite=overwrite, resume=resume, retries=retries,
+                                     decompress=decompress, store=store, size=sizes.get(dp_id),
+                                     disk_scheduler=disk_scheduler, verify=verify)
+        if verbose:
+            _print_result(result)
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run, dp_id) for dp_id in dict.fromkeys(dp_ids)]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+    finally:
+        downloader.close()
+
+
+def plan_downloads(products, destination="./data/", store=None, sizes=None, size_column=None, size_unit=1,
+                   probe=False, base_url=ESO_DOWNLOAD_URL, throughput=None, max_workers=MAX_WORKERS,
+                   disk_scheduler=None, verbose=True):
+    """
+    Report what `download_products` would transfer, without downloading anything.
+
+    For each product the plan says whether it is already in `destination`
+    ('local'), in the `store` ('store'), partially downloaded ('partial'),
+    or still to download ('download'). The sizes come from the metadata of
+    the result table: `access_estsize` (ObsCore, kbyte) or `filesize` (raw
+    products, bytes), or a `size_column` given explicitly. With `probe`,
+    unknown sizes are read from the Content-Length of HTTP HEAD requests
+    (no data is transferred). The totals are compared with the free space of
+    the destination filesystem, and the transfer time is estimated from the
+    `throughput` (default: the throughput measured by the previous
+    `download_products` calls in this session).
+
+    Args:
+        products (Table, str or list): Query result with a `dp_id` column, or data product identifiers.
+        destination (str): Directory where the files would be saved.
+        store (store.ProductStore): Local product store to look up.
+        sizes (list): Size in bytes of each product (overrides the table metadata).
+        size_column (str): Column of `products` holding the sizes.
+        size_unit (int): Number of bytes per unit of `size_column`.
+        probe (bool): If True, get the unknown sizes with HTTP HEAD requests.
+        base_url (str): URL prefix to which each `dp_id` is appended.
+        throughput (float): Expected download throughput in bytes per second.
+        max_workers (int): Maximum number of concurrent HEAD requests.
+        disk_scheduler (disk_space.DiskSpaceScheduler): Scheduler whose `min_free_space` must be kept free.
+        verbose (bool): If True, print a summary of the plan.
+
+    Returns:
+        astropy.table.Table: One row per distinct `dp_id` with `size` (-1 if unknown),
+            `action` and the `path` of the local copy. The totals are in `meta`:
+            `n_files`, `n_to_download`, `bytes_to_download`, `n_unknown_size`,
+            `free_space`, `fits_on_disk` and `estimated_seconds` (None if unknown).
+    """
+    dp_ids, sizes = _ids_and_sizes(products, sizes, size_column, size_unit)
+    sizes = dict(zip(dp_ids, sizes)) if sizes is not None else {}
+    dp_ids = list(dict.fromkeys(dp_ids))
+
+    rows = []
+    for dp_id in dp_ids:
+        size = sizes.get(dp_id)
+        size = int(size) if size is not None and size >= 0 else None
+        entry = store.lookup(dp_id) if store is not None else None
+        local_path = _find_local_product(dp_id, destination) if os.path.isdir(destination) else None
+        part_path = os.path.join(destination, f".{dp_id}.part")
+        if local_path:
+            action, path, size = "local", local_path, os.path.getsize(local_path)
+        elif entry:
+            action, path, size = "store", entry["path"], entry["size"]
+        elif os.path.exists(part_path):
+            action, path = "partial", part_path
+        else:
+            action, path = "download", ""
+        rows.append([dp_id, size, action, path])
+
+    if probe:
+        unknown = [row for row in rows if row[1] is None and row[2] in ("download", "partial")]
+        probed = _probe_sizes([row[0] for row in unknown], base_url, max_workers)
+        for row in unknown:
+            row[1] = probed.get(row[0])
+
+    to_download = [row for row in rows if row[2] in ("download", "partial")]
+    n_unknown = sum(row[1] is None for row in to_download)
+    bytes_to_download = sum(_remaining_size(row[0], destination, row[1]) or 0 for row in to_download)
+    free_space = shutil.disk_usage(_existing_parent(destination)).free
+    min_free_space = (disk_scheduler or _DISK_SCHEDULER).min_free_space
+    throughput = throughput or _THROUGHPUT.value
+    table = Table(rows=[[r[0], -1 if r[1] is None else r[1], r[2], r[3]] for r in rows] or None,
+                  names=["dp_id", "size", "action", "path"], dtype=[str, np.int64, str, str])
+    table.meta.update(n_files=len(rows), n_to_download=len(to_download), bytes_to_download=bytes_to_download,
+                      n_unknown_size=n_unknown, free_space=free_space,
+                      fits_on_disk=bytes_to_download <= free_space - min_free_space,
+                      estimated_seconds=bytes_to_download / throughput if throughput else None)
+    if verbose:
+        _print_plan(table.meta, destination, min_free_space)
+    return table
+
+
+def stream_to_file(response, file_path, chunk_size=CHUNK_SIZE, decompressor=None, verifier=None):
+    """
+    Write the body of a streamed HTTP response to disk in fixed-size chunks.
+
+    The data go to a temporary file in the same directory, which is renamed
+    to `file_path` only once the transfer is complete. Memory use is bounded
+    by `chunk_size` whatever the file size, and an interrupted transfer never
+    leaves a truncated file under the final name.
+
+    Args:
+        response (requests.Response): Response opened with `stream=True`.
+        file_path (str): Final path of the file.
+        chunk_size (int): Number of bytes read at a time.
+        decompressor (object): If set (see `decompress.get_decompressor`), the
+            data are decompressed on the fly before being written.
+        verifier (checksums.StreamingVerifier): If set, fed with the bytes written;
+            the file is only renamed if its checksums match.
+
+    Returns:
+        int: Number of bytes received.
+    """
+    directory, filename = os.path.split(os.path.abspath(file_path))
+    fd, tmp_path = _create_temporary_file(directory, filename)
+    n_bytes = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                data = decompressor.decompress(chunk) if decompressor else chunk
+                f.write(data)
+                if verifier:
+                    verifier.update(data)
+                n_bytes += len(chunk)
+            if decompressor:
+                data = decompressor.flush()
+                f.write(data)
+                if verifier:
+                    verifier.update(data)
+        if verifier:
+            verifier.finish()
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if decompressor:
+            decompressor.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return n_bytes
+
+
+def resumable_download(url, destination, name, session=None, timeout=TIMEOUT, chunk_size=CHUNK_SIZE,
+                       decompress=False, verifier=None):
+    """
+    Download `url` into `destination`, continuing a previous partial transfer if possible.
+
+    The data are written to a hidden `.<name>.part` file next to a small JSON
+    journal (`.<name>.part.json`) recording the URL, final filename, expected
+    size, bytes written and the ETag/Last-Modified validators. If a part file
+    exists, the transfer continues with an HTTP Range request (guarded by
+    If-Range, so a changed file on the server restarts from zero). On
+    success the part file is renamed to its final name and the journal removed;
+    on failure both are kept for the next attempt.
+
+    With `decompress`, `.Z` and `.gz` files are decompressed while they are
+    written. Since the decompressor state cannot be restored, an interrupted
+    decompressing transfer restarts from zero on the next attempt.
+
+    With a `verifier`, the bytes are checked as they are written (the part
+    file of a previous attempt is read once to catch up). On a checksum
+    mismatch or a corrupt compressed stream (`decompress.DecompressionError`)
+    the part file and journal are deleted, so the next attempt starts from zero.
+
+    Args:
+        url (str): URL of the file.
+        destination (str): Directory where the file is saved.
+        name (str): Stable name of the transfer (e.g. the `dp_id`), used for the part and journal files.
+        session (requests.Session): Session to use (a new one is created if None).
+        timeout (float): Timeout in seconds for the connection and for each read.
+        chunk_size (int): Number of bytes read at a time.
+        decompress (bool): If True, decompress `.Z` and `.gz` files on the fly.
+        verifier (checksums.StreamingVerifier): If set, fed with the bytes of the file.
+
+    Returns:
+        tuple: (file_path, size) of the completed file (size is the number of bytes transferred).
+    """
+    part_path = os.path.join(destination, f".{name}.part")
+    journal_path = part_path + ".json"
+    journal = _read_journal(journal_path) if os.path.exists(part_path) else None
+    if journal is None or journal.get("url") != url or journal.get("decompressed"):
+        journal, offset = {"url": url}, 0
+    else:
+        offset = os.path.getsize(part_path)
+
+    headers = {"Accept-Encoding": "identity"}
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+        validator = journal.get("etag") or journal.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+
+    session = session or requests.Session()
+    decompressor = None
+    try:
+        with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            already_complete = (response.status_code == 416 and offset > 0
+                                and journal.get("expected_size") == offset)
+            if verifier:
+                verifier.reset()
+            if already_complete:
+                if verifier:
+                    _feed_file(verifier, part_path)
+            else:
+                response.raise_for_status()
+                if response.status_code == 206:
+                    if _get_range_start(response) != offset:
+                        raise IOError(f"Unexpected Content-Range for {url}: {response.headers.get('Content-Range')}")
+                    mode = "ab"
+                    if verifier:
+                        _feed_file(verifier, part_path)
+                else:
+                    offset, mode = 0, "wb"
+                journal.update(filename=journal.get("filename") if mode == "ab" and journal.get("filename")
+                               else _get_filename(response, name),
+                               expected_size=_get_expected_size(response, offset),
+                               etag=response.headers.get("ETag"),
+                               last_modified=response.headers.get("Last-Modified"),
+                               bytes_written=offset)
+                if decompress and mode == "wb":
+                    decompressor = get_decompressor(journal["filename"])
+                journal["decompressed"] = decompressor is not None
+                _write_journal(journal_path, journal)
+
+                since_journal = 0
+                try:
+                    with open(part_path, mode) as f:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            data = decompressor.decompress(chunk) if decompressor else chunk
+                            f.write(data)
+                            if verifier:
+                                verifier.update(data)
+                            offset += len(chunk)
+                            since_journal += len(chunk)
+                            if since_journal >= JOURNAL_INTERVAL:
+                                f.flush()
+                                journal["bytes_written"] = offset
+                                _write_journal(journal_path, journal)
+                                since_journal = 0
+                        if decompressor:
+                            data = decompressor.flush()
+                            f.write(data)
+                            if verifier:
+                                verifier.update(data)
+                except BaseException:
+                    if decompressor:
+                        decompressor.close()
+                    raise
+                finally:
+                    journal["bytes_written"] = offset
+                    _write_journal(journal_path, journal)
+
+        expected_size = journal.get("expected_size")
+        if expected_size is not None and offset != expected_size:
+            raise IOError(f"Incomplete download of {url}: {offset} of {expected_size} bytes")
+        if verifier:
+            verifier.finish()
+    except (ChecksumError, DecompressionError):
+        _remove_partial_download(name, destination)
+        raise
+
+    filename = decompressed_filename(journal["filename"]) if decompressor else journal["filename"]
+    file_path = os.path.join(destination, filename)
+    os.replace(part_path, file_path)
+    os.remove(journal_path)
+    if decompress and not decompressor and get_decompressor(file_path):
+        # Resumed from raw bytes of a compressed file: decompress it now (and verify the result)
+        try:
+            file_path = decompress_file(file_path)
+        except DecompressionError:
+            os.remove(file_path)
+            raise
+        if verifier:
+            verifier.reset()
+            try:
+                _feed_file(verifier, file_path)
+                verifier.finish()
+            except ChecksumError:
+                os.remove(file_path)
+                raise
+    return file_path, offset
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+_DISK_SCHEDULER = DiskSpaceScheduler()
+
+
+class _Throughput:
+    """
+    Internal running estimate of the download throughput (bytes per second, exponentially weighted).
+    """
+    def __init__(self, weight=0.5):
+        self.weight = weight
+        self.value = None
+        self._lock = threading.Lock()
+
+    def record(self, n_bytes, seconds):
+        if n_bytes <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            rate = n_bytes / seconds
+            self.value = rate if self.value is None else self.weight * rate + (1. - self.weight) * self.value
+
+
+_THROUGHPUT = _Throughput()
+
+
+class _ESODownloader:
+    """
+    Internal class holding the shared HTTP session and per-host connection limits.
+    """
+    def __init__(self, base_url=ESO_DOWNLOAD_URL, max_connections_per_host=MAX_CONNECTIONS_PER_HOST,
+                 pool_size=MAX_WORKERS, timeout=TIMEOUT):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections_per_host = max_connections_per_host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Close the shared session."""
+        self.session.close()
+
+    def host_limit(self, url):
+        """Return the semaphore bounding the concurrent connections to the host of `url`."""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+            return self._host_limits[host]
+
+    def download(self, dp_id, destination, overwrite=False, resume=True, retries=RETRIES, decompress=False,
+                 store=None, size=None, disk_scheduler=None, verify=True):
+        """Download a single product (retrying on failure) and return a result dictionary."""
+        result = {"dp_id": dp_id, "path": "", "status": "failed", "size": 0, "seconds": 0., "error": "",
+                  "checksum": ""}
+        stored_path = store.link(dp_id, destination) if store is not None and not overwrite else None
+        if stored_path:
+            result.update(path=stored_path, status="store", size=os.path.getsize(stored_path))
+            return result
+        local_path = _find_local_product(dp_id, destination)
+        if local_path and not overwrite:
+            if decompress:
+                try:
+                    local_path = decompress_file(local_path)
+                except OSError as err:
+                    result["error"] = f"Could not decompress {local_path}: {err}"
+                    return result
+            result.update(path=local_path, status="local", size=os.path.getsize(local_path))
+            return result
+        if overwrite or not resume:
+            _remove_partial_download(dp_id, destination)
+
+        url = f"{self.base_url}{dp_id}"
+        start = time.perf_counter()
+        disk_scheduler = disk_scheduler or _DISK_SCHEDULER
+        try:
+            with disk_scheduler.reserve(destination, _reserved_size(dp_id, destination, size, decompress)):
+                verifier = StreamingVerifier() if verify else None
+                for attempt in range(retries + 1):
+                    if attempt:
+                        time.sleep(min(RETRY_BACKOFF * 2 ** (attempt - 1), MAX_RETRY_BACKOFF))
+                    try:
+                        with self.host_limit(url):
+                            file_path, n_bytes = self._fetch(url, dp_id, destination, resume, decompress,
+                                                             verifier)
+                    except (requests.RequestException, OSError) as err:
+                        result["error"] = f"{err} (after {attempt + 1} attempt(s))"
+                        if not _is_transient_error(err):
+                            break
+                        continue
+                    result.update(path=file_path, status="downloaded", size=n_bytes, error="",
+                                  checksum=verifier.finish() if verifier else "")
+                    if store is not None:
+                        try:
+                            store.add(dp_id, file_path, sha256=verifier.sha256 if verifier else None)
+                        except (OSError, sqlite3.Error) as err:
+                            result["error"] = f"Not added to the store: {err}"
+                    break
+        except OSError as err:
+            result["error"] = str(err)
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    def _fetch(self, url, dp_id, destination, resume, decompress, verifier=None):
+        """Run a single transfer attempt and return (file_path, size)."""
+        if resume:
+            return resumable_download(url, destination, dp_id, session=self.session, timeout=self.timeout,
+                                      decompress=decompress, verifier=verifier)
+        if verifier:
+            verifier.reset()
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            filename = _get_filename(response, dp_id)
+            decompressor = get_decompressor(filename) if decompress else None
+            if decompressor:
+                filename = decompressed_filename(filename)
+            file_path = os.path.join(destination, filename)
+            return file_path, stream_to_file(response, file_path, decompressor=decompressor, verifier=verifier)
+
+# -----------------------------------------------------------------------------
+# Internal helper functions
+# -----------------------------------------------------------------------------
+
+def _is_transient_error(err):
+    """Return True if a failed transfer may succeed when retried (connection, 5xx or incomplete transfer).
+
+    A corrupt compressed file is not retried: the archive would send the same bytes again.
+    """
+    if isinstance(err, requests.HTTPError):
+        status = err.response.status_code if err.response is not None else None
+        return status is not None and (status >= 500 or status in TRANSIENT_STATUS_CODES)
+    if isinstance(err, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+        return True
+    if isinstance(err, (requests.RequestException, DecompressionError)):
+        return False
+    return err.errno is None  # incomplete or corrupted transfer (not a local error such as a full disk)
+
+def _from_element_to_list(element):
+    """Return the `dp_id` input as a list of strings."""
+    if isinstance(element, (str, bytes)):
+        element = [element]
+    return [x.decode("utf-8") if isinstance(x, bytes) else str(x) for x in element]
+
+def _ids_and_sizes(products, sizes=None, size_column=None, size_unit=1):
+    """Return the `dp_id` list and the sizes of `products`, read from its metadata if it is a table."""
+    if isinstance(products, Table):
+        if sizes is None:
+            sizes = _sizes_from_table(products, size_column, size_unit)
+        products = products["dp_id"]
+    return _from_element_to_list(products), sizes
+
+def _get_filename(response, dp_id):
+    """Extract the filename from the Content-Disposition header (or fall back to the dp_id)."""
+    content_disposition = response.headers.get("Content-Disposition")
+    if content_disposition:
+        msg = Message()
+        msg["content-disposition"] = content_disposition
+        filename = msg.get_filename()
+        if filename:
+            return os.path.basename(filename)
+    return f"{dp_id}.fits"
+
+def _create_temporary_file(directory, filename):
+    """Create a new hidden temporary file with the usual permissions (0o666 minus the umask); return (fd, path)."""
+    while True:
+        tmp_path = os.path.join(directory, f".{filename}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            return os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+def _find_local_product(dp_id, destination):
+    """Return the path of a product already present in `destination`, if any."""
+    matches = sorted(glob.glob(os.path.join(glob.escape(destination), glob.escape(dp_id) + ".*")))
+    return matches[0] if matches else None
+
+def _remaining_size(name, destination, size):
+    """Return the number of bytes still to download, given the part file of a previous attempt."""
+    if not size:
+        return size
+    part_path = os.path.join(destination, f".{name}.part")
+    return max(size - os.path.getsize(part_path), 0) if os.path.exists(part_path) else size
+
+def _reserved_size(name, destination, size, decompress):
+    """Return the disk space to reserve for a transfer (the decompressed size with `decompress`)."""
+    remaining = _remaining_size(name, destination, size)
+    return int(remaining * DECOMPRESSION_FACTOR) if remaining and decompress else remaining
+
+def _get_expected_size(response, offset):
+    """Return the full size of the file from Content-Range (206) or Content-Length (200), if known."""
+    content_range = response.headers.get("Content-Range", "")
+    if response.status_code == 206 and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    content_length = response.headers.get("Content-Length")
+    return offset + int(content_length) if content_length and content_length.isdigit() else None
+
+def _get_range_start(response):
+    """Return the first byte position of a Content-Range header (or None)."""
+    content_range = response.headers.get("Content-Range", "")
+    try:
+        return int(content_range.split()[1].split("-")[0])
+    except (IndexError, ValueError):
+        return None
+
+def _feed_file(verifier, file_path, chunk_size=CHUNK_SIZE):
+    """Feed the content of a file already on disk to a checksum verifier."""
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            verifier.update(chunk)
+
+def _read_journal(journal_path):
+    """Read a partial-download journal (or None if missing or unreadable)."""
+    try:
+        with open(journal_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_journal(journal_path, journal):
+    """Atomically write a partial-download journal."""
+    tmp_path = f"{journal_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(journal, f)
+    os.replace(tmp_path, journal_path)
+
+def _remove_partial_download(name, destination):
+    """Remove the part file and journal of a transfer, if present."""
+    part_path = os.path.join(destination, f".{name}.part")
+    for path in (part_path, part_path + ".json"):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _sizes_from_table(table, size_column=None, size_unit=1):
+    """Return the product sizes in bytes from the metadata columns of a result table (None where unknown)."""
+    candidates = [(size_column, size_unit)] if size_column else SIZE_COLUMNS
+    for column, unit in candidates:
+        if column in table.colnames:
+            values = np.ma.masked_invalid(np.ma.asarray(table[column], dtype=float))
+            return [None if np.ma.is_masked(v) else int(v * unit) for v in values]
+    return None
+
+def _probe_sizes(dp_ids, base_url, max_workers):
+    """Return {dp_id: size} from the Content-Length of HEAD requests (failed requests are left out)."""
+    session = requests.Session()
+
+    def head(dp_id):
+        try:
+            response = session.head(f"{base_url}{dp_id}", allow_redirects=True, timeout=TIMEOUT)
+            response.raise_for_status()
+            length = response.headers.get("Content-Length")
+            return dp_id, int(length) if length and length.isdigit() else None
+        except requests.RequestException:
+            return dp_id, None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return {dp_id: size for dp_id, size in executor.map(head, dp_ids) if size is not None}
+    finally:
+        session.close()
+
+def _existing_parent(path):
+    """Return `path` or its closest existing parent directory."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
+
+def _print_plan(meta, destination, min_free_space):
+    """Print the summary of a download plan."""
+    gb = 1024. ** 3
+    unknown = f", {meta['n_unknown_size']} of unknown size" if meta["n_unknown_size"] else ""
+    print(f"Plan for {destination}: {meta['n_files']} products, {meta['n_to_download']} to download "
+          f"({meta['bytes_to_download'] / gb:.2f} GB{unknown}), "
+          f"{meta['n_files'] - meta['n_to_download']} already available")
+    print(f"Free space: {meta['free_space'] / gb:.2f} GB (minimum kept free: {min_free_space / gb:.2f} GB)"
+          + ("" if meta["fits_on_disk"] else " -- NOT ENOUGH SPACE"))
+    if meta["estimated_seconds"] is not None:
+        print(f"Estimated transfer time: {meta['estimated_seconds'] / 60.:.1f} min")
+
+def _results_to_table(results):
+    """Convert the list of result dictionaries to a table."""
+    names = ["dp_id", "path", "status", "size", "seconds", "error", "checksum"]
+    if not results:
+        return Table(names=names, dtype=[str, str, str, np.int64, float, str, str])
+    return Table(rows=[[r[n] for n in names] for r in results], names=names)
+
+def _print_result(result):
+    """Print a one-line summary of a download."""
+    if result["status"] == "failed":
+        print(f"Failed: {result['dp_id']} ({result['error']})")
+    elif result["status"] == "local":
+        print(f"Already local: {result['dp_id']} -> {result['path']}")
+    else:
+        rate = result["size"] / result["seconds"] / 1024 ** 2 if result["seconds"] > 0 else 0.
+        print(f"Downloaded: {result['dp_id']} -> {result['path']} "
+              f"({result['size'] / 1024 ** 2:.1f} MB in {result['seconds']:.1f} s, {rate:.1f} MB/s)")
@@ -0,0 +1,255 @@
+import html
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from astropy.table import MaskedColumn, Table
+from requests.adapters import HTTPAdapter
+
+from common import default_path, parse_card_value, promote_type, sqlite_connection
+
+# =============================================================================
+# Constants
+# =============================================================================
+ESO_HEADER_URL = "https://archive.eso.org/hdr?DpId="
+DEFAULT_CACHE_PATH = default_path("ESO_HEADER_CACHE", ".eso_headers.sqlite")
+CHUNK_SIZE = 200
+MAX_WORKERS = 8
+TIMEOUT = 60.
+_PRE_RE = re.compile(r"<pre[^>]*>(.*?)</pre>", re.IGNORECASE | re.DOTALL)
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class HeaderCache:
+    """
+    Local cache of parsed ESO product headers, keyed by `dp_id`.
+
+    Header keywords are stored in a SQLite table clustered on (keyword,
+    dp_id), so the values of one keyword for many products are stored
+    together and read with a single index range scan (`column`). This keeps
+    metadata lookups over thousands of products cheap, without rebuilding
+    a full table.
+
+    Args:
+        path (str): Path of the SQLite database (default: `$ESO_HEADER_CACHE` or `~/.eso_headers.sqlite`).
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS products (dp_id TEXT PRIMARY KEY, fetched REAL NOT NULL)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cards (
+                    keyword TEXT NOT NULL,
+                    dp_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    value,
+                    is_bool INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (keyword, dp_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS cards_dp_id ON cards (dp_id)")
+
+    def __contains__(self, dp_id):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM products WHERE dp_id = ?", (dp_id,)).fetchone() is not None
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def missing(self, dp_ids):
+        """Return the `dp_ids` whose header is not cached, in input order."""
+        dp_ids = list(dict.fromkeys(dp_ids))
+        with self._connect() as conn:
+            cached = {row[0] for chunk in _chunks(dp_ids, 900) for row in conn.execute(
+                f"SELECT dp_id FROM products WHERE dp_id IN ({', '.join('?' * len(chunk))})", chunk)}
+        return [dp_id for dp_id in dp_ids if dp_id not in cached]
+
+    def put(self, headers):
+        """
+        Store parsed headers (replacing previous versions).
+
+        Args:
+            headers (dict): {dp_id: {keyword: value}} in card order.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            for dp_id, header in headers.items():
+                conn.execute("DELETE FROM cards WHERE dp_id = ?", (dp_id,))
+                conn.executemany("INSERT INTO cards (keyword, dp_id, position, value, is_bool) "
+                                 "VALUES (?, ?, ?, ?, ?)",
+                                 [(key, dp_id, position, value, isinstance(value, bool))
+                                  for position, (key, value) in enumerate(header.items())])
+                conn.execute("INSERT OR REPLACE INTO products (dp_id, fetched) VALUES (?, ?)", (dp_id, now))
+
+    def get(self, dp_id):
+        """Return the cached header of a product as a {keyword: value} dictionary (None if not cached)."""
+        return self.get_many([dp_id]).get(dp_id)
+
+    def get_many(self, dp_ids):
+        """Return the cached headers of several products as {dp_id: {keyword: value}} (one query per 900)."""
+        headers = {}
+        with self._connect() as conn:
+            for chunk in _chunks(list(dict.fromkeys(dp_ids)), 900):
+                marks = ", ".join("?" * len(chunk))
+                for (dp_id,) in conn.execute(f"SELECT dp_id FROM products WHERE dp_id IN ({marks})", chunk):
+                    headers[dp_id] = {}
+                for dp_id, key, value, is_bool in conn.execute(
+                        f"SELECT dp_id, keyword, value, is_bool FROM cards INDEXED BY cards_dp_id "
+                        f"WHERE dp_id IN ({marks}) ORDER BY dp_id, position", chunk):
+                    headers[dp_id][key] = bool(value) if is_bool else value
+        return headers
+
+    def column(self, keyword, dp_ids=None):
+        """
+        Return the values of one keyword.
+
+        Args:
+            keyword (str): Header keyword (e.g. 'MJD-OBS' or 'HIERARCH ESO OBS PROG ID').
+            dp_ids (list): Products to return, in this order (default: all cached products).
+
+        Returns:
+            dict: {dp_id: value} for the products having the keyword.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT dp_id, value, is_bool FROM cards WHERE keyword = ?", (keyword,)).fetchall()
+        values = {dp_id: bool(value) if is_bool else value for dp_id, value, is_bool in rows}
+        if dp_ids is None:
+            return values
+        return {dp_id: values[dp_id] for dp_id in dp_ids if dp_id in values}
+
+    def remove(self, dp_ids):
+        """Remove products from the cache."""
+        with self._connect() as conn:
+            for dp_id in dp_ids:
+                conn.execute("DELETE FROM cards WHERE dp_id = ?", (dp_id,))
+                conn.execute("DELETE FROM products WHERE dp_id = ?", (dp_id,))
+
+    def _connect(self):
+        return sqlite_connection(self.path)
+
+
+def get_headers(dp_ids, cache=None, keywords=None, refresh=False, base_url=ESO_HEADER_URL,
+                chunk_size=CHUNK_SIZE, max_workers=MAX_WORKERS, verbose=False):
+    """
+    Get the headers of ESO data products, fetching only those not cached yet.
+
+    This is a cached, parallel replacement of `astroquery.eso.Eso.get_headers`
+    and returns the same table, plus a `status` column. The headers missing from `cache` are fetched
+    in chunks of `chunk_size` products, downloaded concurrently over a shared
+    HTTP session. Each chunk is stored in the cache as soon as it is
+    complete, so an interrupted call keeps its progress. Repeated lookups
+    then cost no network access.
+
+    Args:
+        dp_ids (str or list): Data product identifier(s).
+        cache (HeaderCache or str): Header cache, or the path of its database (default: `DEFAULT_CACHE_PATH`).
+        keywords (list): If set, only return these keywords (the full headers are still cached).
+        refresh (bool): If True, fetch the headers again even if they are cached.
+        base_url (str): URL prefix to which each `dp_id` is appended.
+        chunk_size (int): Number of headers fetched (and cached) per chunk.
+        max_workers (int): Maximum number of concurrent requests.
+        verbose (bool): If True, print the progress of the chunks.
+
+    Returns:
+        astropy.table.Table: One row per `dp_id` (in input order) with a `DP.ID`
+            column, a `status` column ('ok', or 'failed' if the header could not
+            be fetched) and one masked column per header keyword (masked where a
+            header lacks the keyword, and in the rows of the failed fetches).
+    """
+    dp_ids = [dp_ids] if isinstance(dp_ids, str) else [str(dp_id) for dp_id in dp_ids]
+    cache = cache if isinstance(cache, HeaderCache) else HeaderCache(cache or DEFAULT_CACHE_PATH)
+    to_fetch = list(dict.fromkeys(dp_ids)) if refresh else cache.missing(dp_ids)
+    if to_fetch:
+        _fetch_headers(to_fetch, cache, base_url, chunk_size, max_workers, verbose)
+    cached = cache.get_many(dp_ids)
+    headers = [cached.get(dp_id) for dp_id in dp_ids]
+    return _headers_to_table(dp_ids, headers, keywords)
+
+
+def parse_header_page(text):
+    """
+    Parse the primary header shown on an ESO `hdr?DpId=` page.
+
+    Values are converted as in astroquery (`T`/`F` to bool, quoted strings,
+    floats and integers), but strings containing `/` are kept whole.
+
+    Returns:
+        dict: {keyword: value} in card order (COMMENT and HISTORY cards are dropped).
+    """
+    match = _PRE_RE.search(text)
+    block = html.unescape(match.group(1) if match else text)
+    header = {}
+    for line in block.splitlines():
+        if line.startswith("END") and not line[3:].strip():
+            break
+        if "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        key = key.strip()
+        if key.startswith(("COMMENT", "HISTORY")) or not key:
+            continue
+        header[key] = parse_card_value(value)
+    return header
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+def _fetch_headers(dp_ids, cache, base_url, chunk_size, max_workers, verbose):
+    """Fetch headers chunk by chunk (requests in parallel) and store each chunk in the cache."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def fetch(dp_id):
+        try:
+            response = session.get(f"{base_url}{dp_id}", timeout=TIMEOUT)
+            response.raise_for_status()
+            return dp_id, parse_header_page(response.text)
+        except (requests.RequestException, ValueError) as err:
+            print(f"Could not get the header of {dp_id}: {err}")
+            return dp_id, None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for n_chunk, chunk in enumerate(_chunks(dp_ids, chunk_size)):
+                fetched = {dp_id: header for dp_id, header in executor.map(fetch, chunk) if header is not None}
+                cache.put(fetched)
+                if verbose:
+                    print(f"Headers: chunk {n_chunk + 1}, {len(fetched)} of {len(chunk)} fetched")
+    finally:
+        session.close()
+
+# -----------------------------------------------------------------------------
+# Internal helper functions
+# -----------------------------------------------------------------------------
+
+def _chunks(items, size):
+    """Split a list into consecutive chunks of at most `size` items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _headers_to_table(dp_ids, headers, keywords=None):
+    """Build the astroquery-like table of headers (a `status` column, masked values where missing)."""
+    columns = {}
+    for header in headers:
+        for key, value in (header or {}).items():
+            if keywords is None or key in keywords:
+                columns[key] = promote_type(columns[key], type(value)) if key in columns else type(value)
+    if keywords is not None:
+        columns = {key: columns[key] for key in keywords if key in columns}
+    table = Table()
+    table["DP.ID"] = MaskedColumn(list(dp_ids), dtype=str)
+    table["status"] = MaskedColumn(["failed" if header is None else "ok" for header in headers], dtype=str)
+    for key, kind in columns.items():
+        values = [header.get(key) if header else None for header in headers]
+        table[key] = MaskedColumn([kind() if value is None else kind(value) for value in values],
+                                  mask=[value is None for value in values], dtype=kind)
+    return table
@@ -0,0 +1,173 @@
+import glob
+import os
+import threading
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# =============================================================================
+# Constants
+# =============================================================================
+CHUNK_SIZE = 64 * 1024
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class LocalArchive:
+    """
+    Local HTTP stand-in for the ESO data portal, serving a directory on localhost in a background thread.
+
+    The files are served under `<base_url><dp_id>`, with Content-Disposition,
+    Content-Length, ETag, HEAD and HTTP Range support. The server can drop
+    connections half-way to test interrupted and resumed downloads.
+
+    Example:
+        >>> with LocalArchive("./fake_archive", fail_after=1024 ** 2, n_failures=2) as archive:
+        ...     download_products(["ADP.2020-02-26T15:36:25.254"], base_url=archive.base_url)
+
+    Args:
+        root (str): Directory containing the files. A request for `/<dp_id>` is
+            answered with the file `<dp_id>` or `<dp_id>.*`.
+        fail_after (int): If set, close the connection after sending this many
+            bytes of the body.
+        n_failures (int): Number of requests on which `fail_after` is applied
+            (after that the files are served completely).
+        port (int): Port to listen on (0 picks a free one).
+    """
+    def __init__(self, root, fail_after=None, n_failures=1, port=0):
+        self.root = root
+        self.fail_after = fail_after
+        self.n_failures = n_failures
+        self.requests = []
+        self._lock = threading.Lock()
+        handler = partial(_ArchiveRequestHandler, self)
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        """URL prefix to which each `dp_id` is appended."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        """Start serving in the background."""
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _should_fail(self):
+        """Return True if the current response has to be interrupted."""
+        with self._lock:
+            if self.fail_after is None or self.n_failures <= 0:
+                return False
+            self.n_failures -= 1
+            return True
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+class _ArchiveRequestHandler(BaseHTTPRequestHandler):
+    """Request handler for `LocalArchive`."""
+    def __init__(self, archive, *args, **kwargs):
+        self.archive = archive
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._serve()
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def _serve(self, head=False):
+        """Answer a GET (or HEAD, without the body) request."""
+        name = os.path.basename(self.path.split("?")[0])
+        file_path = self._find_file(name)
+        self.archive.requests.append((name, "HEAD" if head else self.headers.get("Range")))
+        if file_path is None:
+            self.send_error(404, "File not found")
+            return
+
+        size = os.path.getsize(file_path)
+        etag = f'"{size}-{int(os.path.getmtime(file_path))}"'
+        start, end = self._requested_range(size, etag)
+        if start is not None and start >= size:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if start is None:
+            start, end = 0, size - 1
+            self.send_response(200)
+        else:
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Disposition", f"attachment; filename={os.path.basename(file_path)}")
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if head:
+            return
+
+        limit = self.archive.fail_after if self.archive._should_fail() else None
+        self._send_body(file_path, start, end - start + 1, limit)
+
+    def _find_file(self, name):
+        """Return the path of the file served for `name`, if any."""
+        exact = os.path.join(self.archive.root, name)
+        if name and os.path.isfile(exact):
+            return exact
+        matches = sorted(glob.glob(os.path.join(glob.escape(self.archive.root), glob.escape(name) + ".*")))
+        return matches[0] if name and matches else None
+
+    def _requested_range(self, size, etag):
+        """Parse the Range (and If-Range) headers; return (start, end) or (None, None)."""
+        range_header = self.headers.get("Range")
+        if not range_header or not range_header.startswith("bytes="):
+            return None, None
+        if_range = self.headers.get("If-Range")
+        if if_range is not None and if_range != etag:
+            return None, None
+        first, _, last = range_header[len("bytes="):].partition("-")
+        start = int(first) if first else 0
+        end = min(int(last), size - 1) if last else size - 1
+        return start, end
+
+    def _send_body(self, file_path, start, length, limit):
+        """Send `length` bytes of the file from `start`, closing early after `limit` bytes."""
+        sent = 0
+        with open(file_path, "rb") as f:
+            f.seek(start)
+            while sent < length:
+                n = min(CHUNK_SIZE, length - sent)
+                if limit is not None:
+                    n = min(n, limit - sent)
+                    if n <= 0:
+                        self.close_connection = True
+                        self.wfile.flush()
+                        self.connection.shutdown(2)
+                        return
+                chunk = f.read(n)
+                if not chunk:
+                    return
+                self.wfile.write(chunk)
+                sent += len(chunk)
@@ -0,0 +1,217 @@
+import os
+import time
+
+import numpy as np
+from astropy.table import Table
+
+from common import default_path, dp_id_from_filename, sqlite_connection
+from downloads import download_products
+from headers import HeaderCache, get_headers
+
+# =============================================================================
+# Constants
+# =============================================================================
+DEFAULT_GRAPH_PATH = default_path("ESO_PROVENANCE_GRAPH", ".eso_provenance.sqlite")
+MAX_DEPTH = 5
+RECURSE_PREFIXES = ("ADP.",)
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class ProvenanceGraph:
+    """
+    On-disk cache of the provenance graph of ESO products.
+
+    Each resolved product is recorded with the products listed in its
+    `PROV1`, `PROV2`, ... keywords (its children). Once a product is
+    resolved, its provenance is never fetched again.
+
+    Args:
+        path (str): Path of the SQLite database (default: `$ESO_PROVENANCE_GRAPH` or `~/.eso_provenance.sqlite`).
+    """
+    def __init__(self, path=DEFAULT_GRAPH_PATH):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS resolved (dp_id TEXT PRIMARY KEY, resolved REAL NOT NULL)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS edges (
+                    parent TEXT NOT NULL,
+                    child TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    PRIMARY KEY (parent, child)
+                ) WITHOUT ROWID
+            """)
+
+    def add(self, provenance):
+        """
+        Record resolved products.
+
+        Args:
+            provenance (dict): {dp_id: [child dp_id, ...]} (an empty list for products without PROV keywords).
+        """
+        now = time.time()
+        with self._connect() as conn:
+            for parent, children in provenance.items():
+                conn.execute("DELETE FROM edges WHERE parent = ?", (parent,))
+                conn.executemany("INSERT OR IGNORE INTO edges (parent, child, position) VALUES (?, ?, ?)",
+                                 [(parent, child, i) for i, child in enumerate(children)])
+                conn.execute("INSERT OR REPLACE INTO resolved (dp_id, resolved) VALUES (?, ?)", (parent, now))
+
+    def children(self, dp_ids):
+        """Return {dp_id: [children]} for the resolved products among `dp_ids`."""
+        dp_ids = list(dict.fromkeys(dp_ids))
+        result = {}
+        with self._connect() as conn:
+            for i in range(0, len(dp_ids), 900):
+                chunk = dp_ids[i:i + 900]
+                marks = ", ".join("?" * len(chunk))
+                for (dp_id,) in conn.execute(f"SELECT dp_id FROM resolved WHERE dp_id IN ({marks})", chunk):
+                    result[dp_id] = []
+                for parent, child in conn.execute(f"SELECT parent, child FROM edges WHERE parent IN ({marks}) "
+                                                  f"ORDER BY parent, position", chunk):
+                    result[parent].append(child)
+        return result
+
+    def to_table(self):
+        """Return all the edges of the graph as a (parent, child) table."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT parent, child FROM edges ORDER BY parent, position").fetchall()
+        if not rows:
+            return Table(names=["parent", "child"], dtype=[str, str])
+        return Table(rows=rows, names=["parent", "child"])
+
+    def _connect(self):
+        return sqlite_connection(self.path)
+
+
+def resolve_provenance(dp_ids, graph=None, header_cache=None, max_depth=MAX_DEPTH,
+                       recurse_prefixes=RECURSE_PREFIXES, verbose=False, **header_kwargs):
+    """
+    Resolve reduced products down to the raw frames they were made from.
+
+    The `PROV*` keywords are walked breadth first: all the products of one
+    level are resolved with a single batched `headers.get_headers` call
+    (cached, parallel chunks), then the next level is resolved. Only the
+    products whose `dp_id` starts with one of `recurse_prefixes` (by default,
+    archive products `ADP.`) are resolved further; other entries are raw
+    frames and are never fetched. Resolved products are stored in `graph`, so
+    later calls only fetch what is new.
+
+    Args:
+        dp_ids (str or list): Reduced data product identifiers (e.g. the `dp_id` column of a query result).
+        graph (ProvenanceGraph or str): Provenance cache, or the path of its database.
+        header_cache (headers.HeaderCache or str): Header cache used for the fetches.
+        max_depth (int): Maximum number of PROV levels followed.
+        recurse_prefixes (tuple): Prefixes of the `dp_id`s whose provenance is resolved further.
+        verbose (bool): If True, print the size of each level.
+        **header_kwargs: Other arguments of `headers.get_headers` (e.g. `max_workers`).
+
+    Returns:
+        astropy.table.Table: One row per (`dp_id`, `raw_id`) pair, with the input products in input order.
+            The `raw_id`s are the products reached without further provenance. Their
+            `status` is 'raw' for raw frames, or 'unresolved' for products of
+            `recurse_prefixes` whose provenance is not known (header fetch failed,
+            `max_depth` reached or no PROV keywords); these are not raw frames. An
+            input product whose header could not be fetched or has no PROV keywords is
+            its own `raw_id`.
+    """
+    dp_ids = [dp_ids] if isinstance(dp_ids, str) else [str(dp_id) for dp_id in dp_ids]
+    graph = graph if isinstance(graph, ProvenanceGraph) else ProvenanceGraph(graph or DEFAULT_GRAPH_PATH)
+    header_cache = header_cache if isinstance(header_cache, HeaderCache) else HeaderCache(
+        **({"path": header_cache} if header_cache else {}))
+
+    known = {}
+    frontier = list(dict.fromkeys(dp_ids))
+    for depth in range(max_depth + 1):
+        if not frontier:
+            break
+        known.update(graph.children(frontier))
+        missing = [dp_id for dp_id in frontier if dp_id not in known]
+        if missing:
+            headers = get_headers(missing, cache=header_cache, **header_kwargs)
+            # Failed fetches are not recorded in the graph: they are retried on the next call
+            fetched = {row["DP.ID"]: _prov_entries(row) for row in headers if row["status"] == "ok"}
+            graph.add(fetched)
+            known.update(fetched)
+        if verbose:
+            print(f"Provenance level {depth}: {len(frontier)} products ({len(missing)} fetched)")
+        if depth == max_depth:
+            break
+        children = {child for dp_id in frontier for child in known.get(dp_id, [])}
+        frontier = [child for child in sorted(children)
+                    if child not in known and child.startswith(tuple(recurse_prefixes))]
+
+    prefixes = tuple(recurse_prefixes)
+    rows = []
+    for dp_id in dp_ids:
+        rows.extend([dp_id, leaf, "unresolved" if leaf.startswith(prefixes) else "raw"]
+                    for leaf in _leaves(dp_id, known))
+    n_unresolved = sum(row[2] == "unresolved" for row in rows)
+    if n_unresolved:
+        print(f"Warning: the provenance of {n_unresolved} product(s) could not be resolved "
+              f"(see the rows with status 'unresolved')")
+    if not rows:
+        return Table(names=["dp_id", "raw_id", "status"], dtype=[str, str, str])
+    return Table(rows=rows, names=["dp_id", "raw_id", "status"])
+
+
+def download_raw_products(dp_ids, destination="./data/", graph=None, header_cache=None, max_depth=MAX_DEPTH,
+                          header_kwargs=None, verbose=False, **download_kwargs):
+    """
+    Resolve the raw frames of reduced products and download each unique frame once.
+
+    Raw frames shared by several reduced products are downloaded only once,
+    in parallel through `downloads.download_products`. Products whose
+    provenance could not be resolved (status 'unresolved' in the provenance
+    table) are reported, not downloaded.
+
+    Args:
+        dp_ids (str or list): Reduced data product identifiers.
+        destination (str): Directory where the raw files are saved.
+        graph (ProvenanceGraph or str): Provenance cache, or the path of its database.
+        header_cache (headers.HeaderCache or str): Header cache used for the fetches.
+        max_depth (int): Maximum number of PROV levels followed.
+        header_kwargs (dict): Other arguments of `headers.get_headers` (e.g. `base_url`, `max_workers`).
+        verbose (bool): If True, print the provenance levels and one line per downloaded file.
+        **download_kwargs: Other arguments of `downloads.download_products`.
+
+    Returns:
+        tuple: (provenance table of `resolve_provenance`, download table of `download_products`).
+    """
+    provenance = resolve_provenance(dp_ids, graph=graph, header_cache=header_cache, max_depth=max_depth,
+                                    verbose=verbose, **(header_kwargs or {}))
+    raw = provenance[provenance["status"] == "raw"]
+    raw_ids = list(dict.fromkeys(raw["raw_id"]))
+    print(f"{len(raw_ids)} unique raw frames for {len(set(raw['dp_id']))} products ({len(raw)} references)")
+    return provenance, download_products(raw_ids, destination=destination, verbose=verbose, **download_kwargs)
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+def _prov_entries(row):
+    """Return the product identifiers listed in the PROV keywords of a header row, in keyword order."""
+    keys = sorted((key for key in row.colnames if key.startswith("PROV") and key[4:].isdigit()),
+                  key=lambda key: int(key[4:]))
+    entries = [dp_id_from_filename(str(row[key])) for key in keys if not np.ma.is_masked(row[key])]
+    return list(dict.fromkeys(entry for entry in entries if entry))
+
+def _leaves(dp_id, known):
+    """Return the products without further provenance reachable from `dp_id` (depth first, in PROV order)."""
+    if not known.get(dp_id):  # not fetched, or without PROV keywords
+        return [dp_id]
+    leaves, seen, stack = [], set(), list(reversed(known[dp_id]))
+    while stack:
+        node = stack.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+        children = known.get(node)
+        if children:
+            stack.extend(reversed(children))
+        else:
+            leaves.append(node)
+    return leaves
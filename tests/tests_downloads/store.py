@@ -0,0 +1,184 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+from astropy.table import Table
+
+from common import default_path, sqlite_connection
+
+# =============================================================================
+# Constants
+# =============================================================================
+DEFAULT_STORE_DIR = default_path("ESO_PRODUCT_STORE", ".eso_products")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class ProductStore:
+    """
+    Content-addressed local store of downloaded ESO data products.
+
+    Every product is recorded by `dp_id` in a SQLite index together with its
+    filename, SHA-256 checksum and size. The data live once under
+    `<root>/objects/<sha256[:2]>/<sha256>` and are hard-linked into the
+    destination directories, so repeated downloads across notebooks, users
+    and jobs sharing a filesystem become index lookups, and identical files
+    are stored only once.
+
+    Hard-linked files share their content (inode) with the store: writing
+    to a linked copy would change the stored object and every other copy.
+    The stored objects, and so the linked files, are therefore made
+    read-only; copy a file (e.g. with `shutil.copy`) before modifying it.
+
+    Args:
+        root (str): Directory of the store (default: `$ESO_PRODUCT_STORE` or `~/.eso_products`).
+    """
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = os.path.abspath(root)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.index_path = os.path.join(self.root, "index.sqlite")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS products (
+                    dp_id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    added REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS products_sha256 ON products (sha256)")
+
+    def __contains__(self, dp_id):
+        return self.lookup(dp_id) is not None
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def lookup(self, dp_id):
+        """
+        Return the index entry of a product, or None if it is not (or no longer) in the store.
+
+        Returns:
+            dict: `dp_id`, `filename`, `sha256`, `size`, `added` and the `path` of the stored object.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT dp_id, filename, sha256, size, added FROM products WHERE dp_id = ?",
+                               (dp_id,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(["dp_id", "filename", "sha256", "size", "added"], row))
+        entry["path"] = self._object_path(entry["sha256"])
+        if not os.path.exists(entry["path"]) or os.path.getsize(entry["path"]) != entry["size"]:
+            return None
+        return entry
+
+    def add(self, dp_id, file_path, sha256=None):
+        """
+        Record a downloaded file in the store.
+
+        The file is hard-linked into the store (copied if the store is on another
+        filesystem) and made read-only. If a file with the same content is already
+        stored, `file_path` is replaced by a link to it.
+
+        Args:
+            dp_id (str): Data product identifier.
+            file_path (str): Path of the downloaded file.
+            sha256 (str): SHA-256 of the file, if already known (computed otherwise).
+
+        Returns:
+            dict: The index entry of the product.
+        """
+        sha256 = sha256 or file_sha256(file_path)
+        size = os.path.getsize(file_path)
+        object_path = self._object_path(sha256)
+        if os.path.exists(object_path):
+            if not os.path.samefile(object_path, file_path):
+                _link_or_copy(object_path, file_path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            _link_or_copy(file_path, object_path)
+        _make_read_only(object_path)
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO products (dp_id, filename, sha256, size, added) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (dp_id, os.path.basename(file_path), sha256, size, time.time()))
+        return self.lookup(dp_id)
+
+    def link(self, dp_id, destination):
+        """
+        Make a stored product available in `destination` (hard link, or copy across filesystems).
+
+        Returns:
+            str: Path of the product in `destination`, or None if it is not in the store.
+        """
+        entry = self.lookup(dp_id)
+        if entry is None:
+            return None
+        os.makedirs(destination, exist_ok=True)
+        file_path = os.path.join(destination, entry["filename"])
+        if not (os.path.exists(file_path) and os.path.samefile(entry["path"], file_path)):
+            _link_or_copy(entry["path"], file_path)
+        return file_path
+
+    def remove(self, dp_id):
+        """Remove a product from the index (the object is deleted once no product refers to it)."""
+        entry = self.lookup(dp_id)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM products WHERE dp_id = ?", (dp_id,))
+            shared = entry and conn.execute("SELECT COUNT(*) FROM products WHERE sha256 = ?",
+                                            (entry["sha256"],)).fetchone()[0]
+        if entry and not shared and os.path.exists(entry["path"]):
+            os.remove(entry["path"])
+
+    def to_table(self):
+        """Return the content of the index as a table."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT dp_id, filename, sha256, size, added FROM products "
+                                "ORDER BY dp_id").fetchall()
+        names = ["dp_id", "filename", "sha256", "size", "added"]
+        if not rows:
+            return Table(names=names, dtype=[str, str, str, int, float])
+        return Table(rows=rows, names=names)
+
+    def _connect(self):
+        return sqlite_connection(self.index_path)
+
+    def _object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+
+def file_sha256(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """Return the SHA-256 checksum of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+def _link_or_copy(source, target):
+    """Atomically replace `target` with a hard link to `source` (or a copy across filesystems)."""
+    directory, filename = os.path.split(target)
+    tmp_path = os.path.join(directory, f".{filename}.{os.getpid()}.{threading.get_ident()}.link.tmp")
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, target)
+
+def _make_read_only(path):
+    """Remove the write permissions of a file (shared by all its hard links)."""
+    mode = os.stat(path).st_mode
+    if mode & 0o222:
+        os.chmod(path, mode & ~0o222)
@@ -0,0 +1,64 @@
+import hashlib
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from checksums import ChecksumError, StreamingVerifier, verify_file
+from downloads import download_products
+from local_server import LocalArchive
+
+
+def _fits_bytes(tmp_path, checksum=True):
+    rng = np.random.default_rng(0)
+    primary = fits.PrimaryHDU(rng.normal(size=(50, 70)).astype(np.float32))
+    table = fits.BinTableHDU.from_columns([
+        fits.Column(name="WAVE", format="PD()", array=[rng.normal(size=n) for n in (3, 400, 17)]),
+        fits.Column(name="FLAG", format="J", array=[1, 2, 3])])
+    path = tmp_path / "spectrum.fits"
+    fits.HDUList([primary, table]).writeto(path, checksum=checksum)
+    return path.read_bytes()
+
+
+def _feed(data, chunk_size):
+    verifier = StreamingVerifier()
+    for i in range(0, len(data), chunk_size):
+        verifier.update(data[i:i + chunk_size])
+    return verifier, verifier.finish()
+
+
+@pytest.mark.parametrize("chunk_size", [1000, 2880, 1024 ** 2])
+def test_valid_checksums_in_any_chunk_size(tmp_path, chunk_size):
+    data = _fits_bytes(tmp_path)
+    verifier, status = _feed(data, chunk_size)
+    assert status == "valid"
+    assert len(verifier.hdus) == 2
+    assert verifier.sha256 == hashlib.sha256(data).hexdigest()
+
+
+def test_corrupted_data_raises(tmp_path):
+    data = bytearray(_fits_bytes(tmp_path))
+    data[2880 * 2 + 100] ^= 0xFF
+    with pytest.raises(ChecksumError):
+        _feed(bytes(data), 4096)
+
+
+def test_truncated_file_raises(tmp_path):
+    data = _fits_bytes(tmp_path)
+    with pytest.raises(ChecksumError):
+        _feed(data[:-2880], 4096)
+
+
+def test_absent_and_not_fits(tmp_path):
+    assert _feed(_fits_bytes(tmp_path, checksum=False), 4096)[1] == "absent"
+    assert _feed(b"\x1f\x9d\x90" + bytes(5000), 4096)[1] == "not FITS"
+
+
+def test_verify_file_and_download(tmp_path):
+    root = tmp_path / "archive"
+    root.mkdir()
+    (root / "ADP.1.fits").write_bytes(_fits_bytes(tmp_path))
+    assert verify_file(str(root / "ADP.1.fits"))[0] == "valid"
+    with LocalArchive(str(root)) as archive:
+        table = download_products(["ADP.1"], destination=str(tmp_path / "data"), base_url=archive.base_url)
+    assert table["checksum"][0] == "valid"
@@ -0,0 +1,35 @@
+import pytest
+
+from common import dp_id_from_filename, hdu_data_size, padded_size, parse_card_value, promote_type
+
+
+@pytest.mark.parametrize("field, expected", [
+    ("'HARPS   '           / instrument", "HARPS"),
+    ("'it''s'", "it's"),
+    ("                   T", True),
+    ("                  42 / count", 42),
+    ("             1.5E+01", 15.),
+    ("             1.5D+01", 15.),
+    ("   ABC", "ABC"),
+])
+def test_parse_card_value(field, expected):
+    value = parse_card_value(field)
+    assert value == expected and type(value) is type(expected)
+
+
+def test_promote_type():
+    assert promote_type(bool, int) is int
+    assert promote_type(float, int) is float
+    assert promote_type(int, str) is str
+
+
+@pytest.mark.parametrize("name", ["ADP.1.fits", "ADP.1.fits.gz", "ADP.1.fits.Z", "/data/ADP.1.fits.fz", "ADP.1"])
+def test_dp_id_from_filename(name):
+    assert dp_id_from_filename(name) == "ADP.1"
+
+
+def test_hdu_data_size():
+    cards = {"BITPIX": -32, "NAXIS": 2, "NAXIS1": 100, "NAXIS2": 3}
+    assert hdu_data_size(cards) == 1200
+    assert padded_size(hdu_data_size(cards)) == 2880
+    assert hdu_data_size({"NAXIS": 0}) == 0
@@ -0,0 +1,83 @@
+import gzip
+import os
+
+import pytest
+
+import decompress
+from decompress import DecompressionError, decompress_file, get_decompressor
+
+PAYLOAD = decompress._synthetic_payload(3 * 1024 ** 2 + 17, seed=1)
+LZW_DATA = decompress._lzw_compress(PAYLOAD)
+
+
+def _stream(decompressor, data, chunk_size=100_000):
+    out = [decompressor.decompress(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size)]
+    return b"".join(out) + decompressor.flush()
+
+
+@pytest.mark.parametrize("decompressor", [get_decompressor("file.fits.Z"), decompress._LZWDecompressor()],
+                         ids=["pipe", "python"])
+def test_lzw_stream_roundtrip(decompressor):
+    assert _stream(decompressor, LZW_DATA) == PAYLOAD
+
+
+def test_lzw_uses_gzip_subprocess():
+    assert isinstance(get_decompressor("file.fits.Z"), decompress._PipeDecompressor)
+
+
+def test_gzip_stream_roundtrip_multi_member():
+    data = gzip.compress(PAYLOAD[:1000]) + gzip.compress(PAYLOAD[1000:])
+    assert _stream(get_decompressor("file.fits.gz"), data) == PAYLOAD
+
+
+def test_corrupt_lzw_stream_raises():
+    data = bytearray(LZW_DATA)
+    data[1000:1200] = b"\xff" * 200
+    decompressor = get_decompressor("file.fits.Z")
+    with pytest.raises(DecompressionError):
+        _stream(decompressor, bytes(data))
+    assert decompressor._process.poll() is not None
+
+
+def test_close_stops_subprocess():
+    decompressor = get_decompressor("file.fits.Z")
+    decompressor.decompress(LZW_DATA[:50_000])
+    decompressor.close()
+    assert decompressor._process.poll() is not None
+
+
+def test_decompress_file(tmp_path):
+    file_path = tmp_path / "file.fits.Z"
+    file_path.write_bytes(LZW_DATA)
+    output_path = decompress_file(str(file_path))
+    assert output_path == str(tmp_path / "file.fits")
+    assert (tmp_path / "file.fits").read_bytes() == PAYLOAD
+    assert not file_path.exists()
+
+
+GZIP_DATA = gzip.compress(PAYLOAD)
+
+
+@pytest.mark.parametrize("data", [GZIP_DATA[:200] + b"\xff" * 5000, GZIP_DATA[:len(GZIP_DATA) // 2]],
+                         ids=["corrupt", "truncated"])
+def test_bad_gzip_stream_raises(data):
+    with pytest.raises(DecompressionError):
+        _stream(get_decompressor("file.fits.gz"), data, chunk_size=1000)
+
+
+def test_corrupt_download_fails_without_leftovers(tmp_path):
+    from downloads import download_products
+    from local_server import LocalArchive
+
+    root = tmp_path / "archive"
+    root.mkdir()
+    (root / "ADP.good.fits.gz").write_bytes(gzip.compress(PAYLOAD[:10_000]))
+    (root / "ADP.bad.fits.gz").write_bytes(gzip.compress(PAYLOAD[:10_000])[:200] + b"\xff" * 5000)
+    destination = tmp_path / "data"
+    with LocalArchive(str(root)) as archive:
+        table = download_products(["ADP.good", "ADP.bad"], destination=str(destination),
+                                  base_url=archive.base_url, decompress=True, retries=3)
+    assert list(table["status"]) == ["downloaded", "failed"]
+    assert "gzip" in table["error"][1]
+    assert [name for name, _ in archive.requests].count("ADP.bad") == 1
+    assert sorted(os.listdir(destination)) == ["ADP.good.fits"]
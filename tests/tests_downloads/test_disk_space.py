@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+from astropy.table import Table
+
+import disk_space
+import downloads
+from disk_space import DiskSpaceScheduler
+from downloads import download_products
+from local_server import LocalArchive
+
+MB = 1024 ** 2
+_Usage = namedtuple("_Usage", ["total", "used", "free"])
+
+
+@pytest.fixture
+def free_space(monkeypatch):
+    """Pretend that the filesystems have 100 MB free."""
+    usage = _Usage(1000 * MB, 900 * MB, 100 * MB)
+    monkeypatch.setattr(disk_space.shutil, "disk_usage", lambda path: usage)
+    return usage.free
+
+
+def test_unknown_size_is_never_refused(tmp_path, free_space):
+    scheduler = DiskSpaceScheduler(min_free_space=10 * free_space)
+    for size in (None, 0):
+        with scheduler.reserve(str(tmp_path), size):
+            assert scheduler.reserved(str(tmp_path)) == 0
+
+
+def test_file_larger_than_free_space_fails(tmp_path, free_space):
+    scheduler = DiskSpaceScheduler(min_free_space=10 * MB)
+    with pytest.raises(OSError):
+        with scheduler.reserve(str(tmp_path), free_space - 5 * MB):
+            pass
+    with scheduler.reserve(str(tmp_path), free_space - 10 * MB):
+        assert scheduler.reserved(str(tmp_path)) == free_space - 10 * MB
+
+
+def test_transfer_waits_for_release(tmp_path, free_space):
+    scheduler = DiskSpaceScheduler(poll_interval=0.05)
+    order = []
+
+    def second():
+        with scheduler.reserve(str(tmp_path), 60 * MB):
+            order.append("second")
+
+    with scheduler.reserve(str(tmp_path), 60 * MB):
+        thread = threading.Thread(target=second)
+        thread.start()
+        time.sleep(0.2)
+        order.append("first released")
+    thread.join(5.)
+    assert order == ["first released", "second"]
+    assert scheduler.reserved(str(tmp_path)) == 0
+
+
+def test_default_scheduler_does_not_block_small_downloads(tmp_path, free_space):
+    root = tmp_path / "archive"
+    root.mkdir()
+    (root / "ADP.1.fits").write_bytes(os.urandom(1000))
+    with LocalArchive(str(root)) as archive:
+        table = download_products(["ADP.1"], destination=str(tmp_path / "data"), base_url=archive.base_url)
+    assert table["status"][0] == "downloaded"
+
+
+def test_decompress_reserves_decompressed_size(tmp_path, monkeypatch):
+    root = tmp_path / "archive"
+    root.mkdir()
+    (root / "ADP.1.fits").write_bytes(os.urandom(1000))
+    reserved = []
+
+    class RecordingScheduler(DiskSpaceScheduler):
+        def reserve(self, destination, size):
+            reserved.append(size)
+            return super().reserve(destination, size)
+
+    with LocalArchive(str(root)) as archive:
+        for decompress in (False, True):
+            download_products(["ADP.1"], destination=str(tmp_path / f"data_{decompress}"),
+                              base_url=archive.base_url, sizes=[1000], decompress=decompress,
+                              disk_scheduler=RecordingScheduler())
+    assert reserved == [1000, int(1000 * downloads.DECOMPRESSION_FACTOR)]
+
+
+def test_query_result_sizes_are_reserved(tmp_path):
+    root = tmp_path / "archive"
+    root.mkdir()
+    for name in ("ADP.1", "ADP.2"):
+        (root / f"{name}.fits").write_bytes(os.urandom(1000))
+    reserved = []
+
+    class RecordingScheduler(DiskSpaceScheduler):
+        def reserve(self, destination, size):
+            reserved.append(size)
+            return super().reserve(destination, size)
+
+    products = Table({"dp_id": ["ADP.1", "ADP.2"], "access_estsize": [1, 2]})
+    with LocalArchive(str(root)) as archive:
+        table = download_products(products, destination=str(tmp_path / "data"), base_url=archive.base_url,
+                                  max_workers=1, disk_scheduler=RecordingScheduler())
+    assert list(table["dp_id"]) == ["ADP.1", "ADP.2"]
+    assert reserved == [1 * disk_space.ESTSIZE_UNIT, 2 * disk_space.ESTSIZE_UNIT]
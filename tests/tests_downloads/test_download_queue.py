@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+import download_queue
+from download_queue import DownloadQueue, run_worker
+from local_server import LocalArchive
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return DownloadQueue(str(tmp_path / "queue.sqlite"), max_attempts=2)
+
+
+def test_claim_is_exclusive_and_idempotent(queue, tmp_path):
+    assert queue.add(["ADP.1", "ADP.2", "ADP.3"], destination=str(tmp_path)) == 3
+    assert queue.add(["ADP.1"], destination=str(tmp_path)) == 0
+    first = queue.claim("a", n=2)
+    second = queue.claim("b", n=2)
+    assert {t["dp_id"] for t in first} | {t["dp_id"] for t in second} == {"ADP.1", "ADP.2", "ADP.3"}
+    assert len(second) == 1
+    assert queue.claim("c") == []
+
+
+def test_expired_lease_is_reclaimed_until_max_attempts(queue, tmp_path):
+    queue.add(["ADP.1"], destination=str(tmp_path))
+    assert queue.claim("dead-1", lease=-1.)[0]["attempts"] == 0
+    assert queue.claim("dead-2", lease=-1.)[0]["attempts"] == 1
+    assert queue.claim("worker") == []
+    assert queue.counts()["failed"] == 1
+    assert "Lease expired" in queue.to_table()["error"][0]
+
+
+def test_fail_and_complete(queue, tmp_path):
+    queue.add(["ADP.1", "ADP.2"], destination=str(tmp_path))
+    for _ in range(2):
+        for transfer in queue.claim("w", n=2):
+            if transfer["dp_id"] == "ADP.1":
+                queue.complete("ADP.1", "w", "/path")
+            else:
+                queue.fail("ADP.2", "w", "boom")
+    assert queue.counts() == {"pending": 0, "in_progress": 0, "done": 1, "failed": 1}
+    assert queue.retry_failed() == 1
+
+
+@pytest.mark.parametrize("kwargs", [{"destination": "./other/"}, {"sizes": [1]}, {"not_an_argument": 1}])
+def test_run_worker_rejects_bad_kwargs_before_claiming(queue, tmp_path, kwargs):
+    queue.add(["ADP.1"], destination=str(tmp_path))
+    with pytest.raises(TypeError):
+        run_worker(queue, base_url="http://127.0.0.1:9/", **kwargs)
+    assert queue.counts()["pending"] == 1
+
+
+def test_run_worker_downloads_queue(queue, tmp_path):
+    root = tmp_path / "archive"
+    root.mkdir()
+    data = {f"ADP.{i}": os.urandom(2000) for i in range(3)}
+    for dp_id, content in data.items():
+        (root / f"{dp_id}.fits").write_bytes(content)
+    destination = tmp_path / "data"
+    queue.add(list(data) + ["ADP.missing"], destination=str(destination))
+    with LocalArchive(str(root)) as archive:
+        counts = run_worker(queue, worker="w", batch_size=2, base_url=archive.base_url)
+    assert counts == {"pending": 0, "in_progress": 0, "done": 3, "failed": 1}
+    for dp_id, content in data.items():
+        assert (destination / f"{dp_id}.fits").read_bytes() == content
+
+
+def test_run_worker_fails_batch_on_unexpected_error(queue, tmp_path, monkeypatch):
+    def broken_download(*args, **kwargs):
+        raise ValueError("boom")
+
+    monkeypatch.setattr(download_queue, "download_products", broken_download)
+    queue.add(["ADP.1", "ADP.2"], destination=str(tmp_path))
+    counts = run_worker(queue, worker="w", batch_size=2, base_url="http://127.0.0.1:9/")
+    assert counts == {"pending": 0, "in_progress": 0, "done": 0, "failed": 2}
+    assert all("ValueError: boom" in error for error in queue.to_table()["error"])
@@ -0,0 +1,151 @@
+import os
+
+import numpy as np
+import pytest
+import requests
+from astropy.table import Table
+
+import downloads
+from downloads import download_products, plan_downloads, resumable_download
+from local_server import LocalArchive
+from store import ProductStore
+
+DP_ID = "ADP.2020-02-26T15:36:25.254"
+CHUNK_SIZE = 64 * 1024
+
+
+@pytest.fixture
+def archive_root(tmp_path):
+    root = tmp_path / "archive"
+    root.mkdir()
+    data = os.urandom(10 * CHUNK_SIZE + 123)
+    (root / f"{DP_ID}.fits").write_bytes(data)
+    return root, data
+
+
+def test_resumable_download_continues_from_part_file(archive_root, tmp_path):
+    root, data = archive_root
+    destination = tmp_path / "data"
+    destination.mkdir()
+    with LocalArchive(str(root), fail_after=3 * CHUNK_SIZE + 1000, n_failures=1) as archive:
+        url = f"{archive.base_url}{DP_ID}"
+        with pytest.raises((requests.RequestException, OSError)):
+            resumable_download(url, str(destination), DP_ID, chunk_size=CHUNK_SIZE)
+        part_path = destination / f".{DP_ID}.part"
+        offset = part_path.stat().st_size
+        assert 0 < offset < len(data)
+        assert part_path.read_bytes() == data[:offset]
+
+        file_path, n_bytes = resumable_download(url, str(destination), DP_ID, chunk_size=CHUNK_SIZE)
+
+    assert archive.requests[-1] == (DP_ID, f"bytes={offset}-")
+    assert n_bytes == len(data)
+    assert open(file_path, "rb").read() == data
+    assert os.listdir(destination) == [f"{DP_ID}.fits"]
+
+
+def test_download_retries_interrupted_transfer(archive_root, tmp_path, monkeypatch):
+    root, data = archive_root
+    monkeypatch.setattr(downloads, "RETRY_BACKOFF", 0.)
+    with LocalArchive(str(root), fail_after=CHUNK_SIZE, n_failures=2) as archive:
+        table = download_products([DP_ID], destination=str(tmp_path / "data"), base_url=archive.base_url,
+                                  retries=3)
+    assert table["status"][0] == "downloaded"
+    assert len(archive.requests) == 3
+    assert open(table["path"][0], "rb").read() == data
+
+
+def test_download_does_not_retry_missing_product(archive_root, tmp_path):
+    root, _ = archive_root
+    with LocalArchive(str(root)) as archive:
+        table = download_products(["ADP.missing"], destination=str(tmp_path / "data"), base_url=archive.base_url,
+                                  retries=3)
+    assert table["status"][0] == "failed"
+    assert "404" in table["error"][0]
+    assert len(archive.requests) == 1
+
+
+@pytest.fixture
+def many_products(tmp_path):
+    root = tmp_path / "many"
+    root.mkdir()
+    data = {f"ADP.{i:02d}": os.urandom(1000 * (12 - i) + i) for i in range(12)}
+    for dp_id, content in data.items():
+        (root / f"{dp_id}.fits").write_bytes(content)
+    return root, data
+
+
+def test_download_products_keeps_input_order(many_products, tmp_path):
+    root, data = many_products
+    dp_ids = list(reversed(data)) + ["ADP.missing", "ADP.03"]
+    with LocalArchive(str(root)) as archive:
+        table = download_products(dp_ids, destination=str(tmp_path / "data"), base_url=archive.base_url,
+                                  max_workers=4, max_connections_per_host=2, verify=False)
+    assert list(table["dp_id"]) == dp_ids
+    assert sorted(name for name, _ in archive.requests) == sorted(list(data) + ["ADP.missing"])
+    assert list(table["status"]) == ["downloaded"] * 12 + ["failed", "downloaded"]
+    for row in table[:12]:
+        assert open(row["path"], "rb").read() == data[row["dp_id"]]
+        assert row["size"] == len(data[row["dp_id"]])
+
+
+def test_iter_downloads_yields_each_product_once(many_products, tmp_path):
+    root, data = many_products
+    destination = str(tmp_path / "data")
+    with LocalArchive(str(root)) as archive:
+        first = list(downloads.iter_downloads(list(data) * 2, destination=destination, base_url=archive.base_url,
+                                              max_workers=4))
+        n_requests = len(archive.requests)
+        second = list(downloads.iter_downloads(list(data), destination=destination, base_url=archive.base_url))
+    assert sorted(result["dp_id"] for result in first) == sorted(data)
+    assert {result["status"] for result in first} == {"downloaded"}
+    assert n_requests == len(data) == len(archive.requests)
+    assert {result["status"] for result in second} == {"local"}
+
+
+@pytest.fixture
+def planned(many_products, tmp_path):
+    """ADP.00 is in the destination, ADP.01 in the store, ADP.02 half downloaded; the others are remote."""
+    root, data = many_products
+    destination = tmp_path / "data"
+    destination.mkdir()
+    (destination / "ADP.00.fits").write_bytes(data["ADP.00"])
+    (tmp_path / "ADP.01.fits").write_bytes(data["ADP.01"])
+    store = ProductStore(str(tmp_path / "store"))
+    store.add("ADP.01", str(tmp_path / "ADP.01.fits"))
+    (destination / ".ADP.02.part").write_bytes(data["ADP.02"][:500])
+    # ObsCore sizes in kbyte, unknown for ADP.11; ADP.03 is listed twice
+    products = Table({"dp_id": list(data) + ["ADP.03"],
+                      "access_estsize": [len(content) // 1024 + 1 for content in data.values()] + [4]})
+    products["access_estsize"] = np.ma.masked_array(products["access_estsize"], mask=[False] * 11 + [True, False])
+    return root, data, str(destination), store, products
+
+
+def test_plan_downloads_statuses_and_sizes(planned):
+    root, data, destination, store, products = planned
+    plan = plan_downloads(products, destination=destination, store=store, throughput=1000., verbose=False)
+    assert list(plan["dp_id"]) == list(data)
+    assert list(plan["action"][:4]) == ["local", "store", "partial", "download"]
+    assert set(plan["action"][3:]) == {"download"}
+    assert plan["size"][0] == len(data["ADP.00"]) and plan["size"][1] == len(data["ADP.01"])
+    assert plan["path"][0] == os.path.join(destination, "ADP.00.fits")
+    assert plan["size"][2] == products["access_estsize"][2] * 1024
+    assert plan["size"][11] == -1
+    expected = sum(int(size) for size in plan["size"][2:11]) - 500
+    assert plan.meta["n_files"] == 12 and plan.meta["n_to_download"] == 10
+    assert plan.meta["n_unknown_size"] == 1
+    assert plan.meta["bytes_to_download"] == expected
+    assert plan.meta["estimated_seconds"] == expected / 1000.
+    assert plan.meta["fits_on_disk"]
+
+
+def test_plan_downloads_probes_unknown_sizes(planned):
+    root, data, destination, store, products = planned
+    with LocalArchive(str(root)) as archive:
+        plan = plan_downloads(list(products["dp_id"]), destination=destination, store=store, probe=True,
+                              base_url=archive.base_url, verbose=False)
+    # Only the products to download are probed, with HEAD requests
+    assert sorted(archive.requests) == sorted((dp_id, "HEAD") for dp_id in list(data)[2:])
+    assert [int(size) for size in plan["size"][2:]] == [len(content) for content in list(data.values())[2:]]
+    assert plan.meta["n_unknown_size"] == 0
+    assert plan.meta["bytes_to_download"] == sum(len(content) for content in list(data.values())[2:]) - 500
@@ -0,0 +1,33 @@
+import numpy as np
+
+from headers import HeaderCache, get_headers
+from local_server import LocalArchive
+
+PAGE = """<html><pre>
+SIMPLE  =                    T / Standard FITS
+OBJECT  = '1234    '           / Target
+MJD-OBS =       58000.12345678 / Start of observation
+EXPTIME =                  300 / Exposure time
+HIERARCH ESO OBS PROG ID = '0102.C-0001(A)' / Programme
+END
+</pre></html>"""
+
+
+def test_missing_keywords_and_failed_fetches_are_masked(tmp_path):
+    root = tmp_path / "archive"
+    root.mkdir()
+    (root / "ADP.1").write_text(PAGE)
+    (root / "ADP.2").write_text(PAGE.replace("EXPTIME =                  300 / Exposure time\n", ""))
+    cache = HeaderCache(str(tmp_path / "headers.sqlite"))
+    with LocalArchive(str(root)) as archive:
+        table = get_headers(["ADP.1", "ADP.2", "ADP.missing"], cache=cache, base_url=archive.base_url)
+
+    assert list(table["DP.ID"]) == ["ADP.1", "ADP.2", "ADP.missing"]
+    assert list(table["status"]) == ["ok", "ok", "failed"]
+    assert table["OBJECT"][0] == "1234"
+    assert table["SIMPLE"].dtype == bool
+    assert list(table["EXPTIME"].mask) == [False, True, True]
+    assert table["EXPTIME"][0] == 300
+    assert np.all(table["MJD-OBS"].mask == [False, False, True])
+    assert table["HIERARCH ESO OBS PROG ID"][1] == "0102.C-0001(A)"
+    assert cache.missing(["ADP.1", "ADP.2", "ADP.missing"]) == ["ADP.missing"]
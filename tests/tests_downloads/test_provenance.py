@@ -0,0 +1,43 @@
+from headers import HeaderCache
+from local_server import LocalArchive
+from provenance import ProvenanceGraph, download_raw_products, resolve_provenance
+
+
+def _page(*prov):
+    cards = [f"PROV{i + 1:<4}= '{entry}'" for i, entry in enumerate(prov)]
+    return "<pre>\n" + "\n".join(["SIMPLE  =                    T"] + cards + ["END"]) + "\n</pre>"
+
+
+def test_failed_header_fetch_is_unresolved_not_raw(tmp_path):
+    root = tmp_path / "archive"
+    root.mkdir()
+    (root / "ADP.1").write_text(_page("ADP.2", "ADP.3", "FORS2.1.fits"))
+    (root / "ADP.2").write_text(_page("FORS2.2.fits"))
+    graph = ProvenanceGraph(str(tmp_path / "graph.sqlite"))
+    cache = HeaderCache(str(tmp_path / "headers.sqlite"))
+    with LocalArchive(str(root)) as archive:
+        table = resolve_provenance(["ADP.1", "ADP.missing"], graph=graph, header_cache=cache,
+                                   base_url=archive.base_url)
+
+    assert [tuple(row) for row in table] == [("ADP.1", "FORS2.2", "raw"),
+                                             ("ADP.1", "ADP.3", "unresolved"),
+                                             ("ADP.1", "FORS2.1", "raw"),
+                                             ("ADP.missing", "ADP.missing", "unresolved")]
+    assert "ADP.3" not in graph.children(["ADP.3"])
+
+
+def test_input_without_provenance_is_its_own_leaf(tmp_path):
+    root = tmp_path / "archive"
+    root.mkdir()
+    (root / "ADP.1").write_text(_page())
+    (root / "ADP.2").write_text(_page("HARPS.2.fits"))
+    (root / "HARPS.2.fits").write_bytes(b"raw")
+    with LocalArchive(str(root)) as archive:
+        provenance, downloaded = download_raw_products(
+            ["ADP.1", "ADP.2"], destination=str(tmp_path / "raw"), graph=str(tmp_path / "graph.sqlite"),
+            header_cache=str(tmp_path / "headers.sqlite"), header_kwargs={"base_url": archive.base_url},
+            base_url=archive.base_url, verify=False)
+
+    assert [tuple(row) for row in provenance] == [("ADP.1", "ADP.1", "unresolved"), ("ADP.2", "HARPS.2", "raw")]
+    assert list(downloaded["dp_id"]) == ["HARPS.2"]
+    assert list(downloaded["status"]) == ["downloaded"]
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+import downloads
+import store as store_module
+from downloads import download_products
+from local_server import LocalArchive
+from store import ProductStore, file_sha256
+
+
+@pytest.fixture
+def product_store(tmp_path):
+    return ProductStore(str(tmp_path / "store"))
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_add_and_link_share_read_only_object(product_store, tmp_path):
+    file_path = _write(tmp_path / "a" / "ADP.1.fits", b"spectrum 1")
+    entry = product_store.add("ADP.1", file_path)
+    assert entry["sha256"] == file_sha256(file_path)
+    assert os.path.samefile(entry["path"], file_path)
+
+    linked = product_store.link("ADP.1", str(tmp_path / "b"))
+    assert os.path.samefile(linked, entry["path"])
+    assert not os.stat(linked).st_mode & 0o222
+    if os.geteuid() != 0:  # root ignores the permissions
+        with pytest.raises(PermissionError):
+            open(linked, "r+b")
+
+
+def test_identical_content_is_stored_once(product_store, tmp_path):
+    first = _write(tmp_path / "a" / "ADP.1.fits", b"same data")
+    second = _write(tmp_path / "b" / "ADP.2.fits", b"same data")
+    product_store.add("ADP.1", first)
+    product_store.add("ADP.2", second)
+    assert os.path.samefile(first, second)
+    assert len(product_store) == 2
+    product_store.remove("ADP.1")
+    assert "ADP.2" in product_store
+    product_store.remove("ADP.2")
+    assert not os.path.exists(product_store._object_path(file_sha256(first)))
+
+
+def test_link_temporary_files_are_hidden(product_store, tmp_path, monkeypatch):
+    file_path = _write(tmp_path / "a" / "ADP.1.fits", b"spectrum 1")
+    product_store.add("ADP.1", file_path)
+    replaced = []
+    real_replace = os.replace
+    monkeypatch.setattr(store_module.os, "replace", lambda src, dst: replaced.append(src) or real_replace(src, dst))
+    product_store.link("ADP.1", str(tmp_path / "b"))
+    assert replaced and all(os.path.basename(path).startswith(".") for path in replaced)
+    assert downloads._find_local_product("ADP.1", str(tmp_path / "b")) == str(tmp_path / "b" / "ADP.1.fits")
+
+
+def test_download_survives_store_errors(product_store, tmp_path, monkeypatch):
+    root = tmp_path / "archive"
+    for i in range(3):
+        _write(root / f"ADP.{i}.fits", os.urandom(1000))
+
+    def failing_add(dp_id, file_path, sha256=None):
+        raise OSError("store unavailable")
+
+    monkeypatch.setattr(product_store, "add", failing_add)
+    with LocalArchive(str(root)) as archive:
+        table = download_products([f"ADP.{i}" for i in range(3)], destination=str(tmp_path / "data"),
+                                  base_url=archive.base_url, store=product_store)
+    assert list(table["status"]) == ["downloaded"] * 3
+    assert all("store unavailable" in error for error in table["error"])
+
+
+def test_download_adds_to_store_with_streamed_hash(product_store, tmp_path):
+    root = tmp_path / "archive"
+    _write(root / "ADP.1.fits", os.urandom(5000))
+    with LocalArchive(str(root)) as archive:
+        table = download_products(["ADP.1"], destination=str(tmp_path / "data"), base_url=archive.base_url,
+                                  store=product_store)
+        again = download_products(["ADP.1"], destination=str(tmp_path / "other"), base_url=archive.base_url,
+                                  store=product_store)
+    assert product_store.lookup("ADP.1")["sha256"] == file_sha256(table["path"][0])
+    assert again["status"][0] == "store"
+    assert len(archive.requests) == 1
@@ -0,0 +1,161 @@
+import os
+
+import astropy.units as u
+import numpy as np
+from astropy.coordinates import EarthLocation, SkyCoord
+from astropy.time import Time
+
+# Shared helpers of ../tests_downloads: add that directory to sys.path before importing this module
+from common import default_path, sqlite_connection
+
+# =============================================================================
+# Constants
+# =============================================================================
+DEFAULT_CACHE_PATH = default_path("ESO_BARYCORR_CACHE", ".eso_barycorr.sqlite")
+# Geodetic (longitude, latitude in degrees, height in m) of the ESO observatories
+SITES = {"paranal": (-70.4045, -24.6272, 2635.),
+         "lasilla": (-70.7375, -29.2567, 2400.),
+         "apex": (-67.7592, -23.0058, 5105.)}
+DEFAULT_SITE = "paranal"
+GET_CHUNK_SIZE = 200  # keys per SELECT (4 parameters each, below the SQLite limit of 999)
+# TELESCOP of the FITS headers (ESO-3P6), or `telescope_name` of ObsCore query results (ESO-3.6)
+_TELESCOPE_SITES = {"ESO-VLT": "paranal", "ESO-VISTA": "paranal", "ESO-VST": "paranal",
+                    "ESO-3P6": "lasilla", "ESO-3.6": "lasilla", "ESO-NTT": "lasilla", "MPI-2.2": "lasilla",
+                    "APEX": "apex"}
+_INSTRUMENT_SITES = {"HARPS": "lasilla", "FEROS": "lasilla", "EFOSC": "lasilla", "SOFI": "lasilla"}
+# Keys are rounded to ~4 mas and ~1 ms: far below any change of the correction
+_KEY_DECIMALS = {"ra": 6, "dec": 6, "mjd": 8}
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class BarycentricCache:
+    """
+    On-disk cache of barycentric corrections, keyed by (site, RA, Dec, MJD).
+
+    Args:
+        path (str): Path of the SQLite database (default: `$ESO_BARYCORR_CACHE` or `~/.eso_barycorr.sqlite`).
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS corrections (
+                    site TEXT NOT NULL,
+                    ra REAL NOT NULL,
+                    dec REAL NOT NULL,
+                    mjd REAL NOT NULL,
+                    barycorr REAL NOT NULL,
+                    PRIMARY KEY (site, ra, dec, mjd)
+                ) WITHOUT ROWID
+            """)
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM corrections").fetchone()[0]
+
+    def get(self, keys):
+        """Return {key: barycorr} for the cached keys among `keys` ((site, ra, dec, mjd) tuples)."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), GET_CHUNK_SIZE):
+                chunk = keys[start:start + GET_CHUNK_SIZE]
+                values = ", ".join(["(?, ?, ?, ?)"] * len(chunk))
+                rows = conn.execute(f"SELECT site, ra, dec, mjd, barycorr FROM corrections "
+                                    f"WHERE (site, ra, dec, mjd) IN (VALUES {values})",
+                                    [value for key in chunk for value in key]).fetchall()
+                found.update((tuple(row[:4]), row[4]) for row in rows)
+        return found
+
+    def put(self, corrections):
+        """Store corrections given as {(site, ra, dec, mjd): barycorr}."""
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO corrections (site, ra, dec, mjd, barycorr) "
+                             "VALUES (?, ?, ?, ?, ?)",
+                             [(*key, float(value)) for key, value in corrections.items()])
+
+    def _connect(self):
+        return sqlite_connection(self.path)
+
+
+def barycentric_corrections(ra, dec, mjd, site=DEFAULT_SITE, cache=None):
+    """
+    Compute the barycentric velocity corrections of many observations at once.
+
+    All the observations of one site are computed with a single vectorized
+    `SkyCoord.radial_velocity_correction` call (instead of one PyAstronomy
+    call per spectrum). With a `cache`, corrections already computed for
+    the same (site, RA, Dec, MJD) are read back instead, so reprocessing the
+    same spectra costs no computation.
+
+    Example:
+        >>> barycorr = barycentric_corrections(table["RA"], table["DEC"], table["MJD-OBS"], site="lasilla")
+        >>> wave_bary = wave * (1. + barycorr / 299792.458)
+
+    Args:
+        ra (float or array): Right ascension(s) in degrees.
+        dec (float or array): Declination(s) in degrees.
+        mjd (float or array): Modified Julian date(s) of the observations (UTC).
+        site (str or array): Site name(s) in `SITES`, one for all or one per observation.
+        cache (BarycentricCache, str or None): Cache, or the path of its database (default: no cache).
+
+    Returns:
+        numpy.ndarray or float: Corrections in km/s (same shape as the inputs), to be added to
+            the measured radial velocities.
+    """
+    ra, dec, mjd, site = np.broadcast_arrays(np.asarray(ra, dtype=float), np.asarray(dec, dtype=float),
+                                             np.asarray(mjd, dtype=float), np.asarray(site, dtype=str))
+    scalar = ra.ndim == 0
+    ra, dec, mjd, site = (np.atleast_1d(values).ravel() for values in (ra, dec, mjd, site))
+    unknown = set(site) - set(SITES)
+    if unknown:
+        raise ValueError(f"Unknown site(s) {sorted(unknown)}; known sites: {sorted(SITES)}")
+    if isinstance(cache, str):
+        cache = BarycentricCache(cache)
+
+    keys = list(zip(site.tolist(), np.round(ra, _KEY_DECIMALS["ra"]).tolist(),
+                    np.round(dec, _KEY_DECIMALS["dec"]).tolist(), np.round(mjd, _KEY_DECIMALS["mjd"]).tolist()))
+    known = cache.get(keys) if cache is not None else {}
+    todo = np.array([key not in known for key in keys], dtype=bool)
+    result = np.array([known.get(key, np.nan) for key in keys], dtype=float)
+    for name in np.unique(site[todo]):
+        selection = todo & (site == name)
+        result[selection] = _radial_velocity_corrections(ra[selection], dec[selection], mjd[selection], name)
+    if cache is not None and todo.any():
+        cache.put({key: value for key, value, new in zip(keys, result, todo) if new})
+    return float(result[0]) if scalar else result.reshape(np.shape(ra))
+
+
+def observatory_site(header):
+    """
+    Guess the observatory of a product from its header.
+
+    The site is taken from `TELESCOP`, then from `INSTRUME`; products of
+    other instruments are assumed to come from `DEFAULT_SITE` (Paranal).
+
+    Returns:
+        str: Site name in `SITES`.
+    """
+    telescope = str(header.get("TELESCOP", "")).strip().upper()
+    for prefix, name in _TELESCOPE_SITES.items():
+        if telescope.startswith(prefix):
+            return name
+    instrument = str(header.get("INSTRUME", "")).strip().upper()
+    return _INSTRUMENT_SITES.get(instrument, DEFAULT_SITE)
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+def _radial_velocity_corrections(ra, dec, mjd, site):
+    """Compute the barycentric corrections (km/s) of observations at one site with astropy."""
+    lon, lat, height = SITES[site]
+    location = EarthLocation.from_geodetic(lon * u.deg, lat * u.deg, height * u.m)
+    coords = SkyCoord(ra * u.deg, dec * u.deg)
+    correction = coords.radial_velocity_correction(kind="barycentric", obstime=Time(mjd, format="mjd"),
+                                                   location=location)
+    return correction.to_value(u.km / u.s)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# pipeline (and monitoring) need the download layer of ../tests_downloads (see pipeline.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests_downloads"))
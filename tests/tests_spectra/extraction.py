@@ -0,0 +1,278 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from astropy import constants as const
+from astropy.table import Table
+
+from barycentric import barycentric_corrections, observatory_site
+# Shared helpers of ../tests_downloads (see barycentric.py)
+from common import FITS_SUFFIXES, dp_id_from_filename
+from header_index import read_primary_header
+from reader import SpectrumFile, wave_unit_factor
+
+# =============================================================================
+# Constants
+# =============================================================================
+SPEED_OF_LIGHT = const.c.to("km/s").value
+MAX_PROCESSES = os.cpu_count() or 1
+MAX_CHUNKSIZE = 64
+BARYCENTRIC_KEYWORDS = ("HIERARCH ESO QC VRAD BARYCOR", "HELICORR")  # km/s, in order of preference
+FLUX_FACTORS = {"UVES": 1e-16, "MUSE": 1., "XSHOOTER": 1.}  # to erg s-1 cm-2 Angstrom-1
+COLUMNS = ("WAVE", "FLUX", "ERR")
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class SpectraBatch:
+    """
+    Spectra of a batch extraction, stored column by column.
+
+    The spectra are concatenated into single flat float64 arrays (`wave`,
+    `flux`, `err`); spectrum `i` spans `offsets[i]:offsets[i + 1]`. The
+    per-file metadata (path, instrument, corrections, status, ...) is the
+    astropy table `table`, in the order of the input files.
+
+    Example:
+        >>> batch = extract_spectra("./data/")
+        >>> spectrum = batch[0]  # {"wave": ..., "flux": ..., "err": ...} as views
+
+    Args:
+        table (astropy.table.Table): One row per file.
+        offsets (numpy.ndarray): Start of each spectrum in the flat arrays (with the total length last).
+        arrays (dict): {column name: flat array}.
+    """
+    def __init__(self, table, offsets, arrays):
+        self.table = table
+        self.offsets = offsets
+        self.arrays = arrays
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, index):
+        selection = slice(self.offsets[index], self.offsets[index + 1])
+        return {name: values[selection] for name, values in self.arrays.items()}
+
+    def __getattr__(self, name):
+        arrays = self.__dict__.get("arrays", {})
+        if name in arrays:
+            return arrays[name]
+        raise AttributeError(name)
+
+    @property
+    def lengths(self):
+        """Number of points of each spectrum."""
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        """Size in bytes of the flat arrays."""
+        return sum(values.nbytes for values in self.arrays.values())
+
+
+def spectrum_corrections(header, wave_unit="", instrument=None, computed_barycorr=None, barycorr_cache=None):
+    """
+    Compute the wavelength and flux factors of a spectrum from its headers.
+
+    These are the corrections of `extract_spectrum` in
+    `ESO_WorkingExample_Spectra.ipynb`: wavelength unit (`TUNIT1`) to
+    Angstrom, barycentric correction from `HIERARCH ESO QC VRAD BARYCOR` (or
+    `HELICORR`, or computed from RA/DEC/MJD-OBS with
+    `barycentric.barycentric_corrections` when the spectrum is topocentric
+    without either keyword), shift to the rest frame for
+    `SPECSYS = SOURCE` (from `REST_VAL`) and flux scaling of the instrument.
+
+    Args:
+        header (astropy.io.fits.Header or dict): Primary header.
+        wave_unit (str): Unit of the wavelength column (`TUNIT1`, one of `reader.WAVE_UNITS`; empty for Angstrom).
+        instrument (str): Instrument name (default: the `INSTRUME` keyword).
+        computed_barycorr (float): Precomputed barycentric correction (km/s) used if it must be computed.
+        barycorr_cache (barycentric.BarycentricCache or str): Cache of the computed corrections.
+
+    Returns:
+        dict: `wave_factor`, `flux_factor`, `instrument`, `specsys`, `barycorr` (km/s, NaN if not
+            applied), `barycorr_source` (keyword used, 'computed' or '') and `sourcecorr` (km/s).
+
+    Raises:
+        ValueError: If the wavelength unit is unknown.
+    """
+    instrument = str(instrument or header.get("INSTRUME", "")).strip().upper()
+    specsys = str(header.get("SPECSYS", "")).strip().upper()
+    wave_factor = wave_unit_factor(wave_unit)
+
+    barycorr, barycorr_source = np.nan, ""
+    for keyword in BARYCENTRIC_KEYWORDS:
+        if keyword in header:
+            barycorr, barycorr_source = float(header[keyword]), keyword
+            break
+    if not barycorr_source and specsys == "TOPOCENT":
+        if computed_barycorr is None:
+            computed_barycorr = barycentric_corrections(header["RA"], header["DEC"], header["MJD-OBS"],
+                                                        observatory_site(header), cache=barycorr_cache)
+        barycorr, barycorr_source = float(computed_barycorr), "computed"
+    if barycorr_source:
+        wave_factor *= 1. + barycorr / SPEED_OF_LIGHT
+
+    sourcecorr = 0.
+    if specsys == "SOURCE":
+        sourcecorr = float(header["REST_VAL"])
+        wave_factor *= 1. + sourcecorr / SPEED_OF_LIGHT
+
+    return {"wave_factor": wave_factor, "flux_factor": FLUX_FACTORS.get(instrument, 1.),
+            "instrument": instrument, "specsys": specsys, "barycorr": barycorr,
+            "barycorr_source": barycorr_source, "sourcecorr": sourcecorr}
+
+
+def read_corrected_spectrum(file_path, instrument=None, wave_range=None, columns=COLUMNS, barycorr=None,
+                            barycorr_cache=None):
+    """
+    Read a 1D spectrum with the corrections of `spectrum_corrections` applied.
+
+    The file is read through `reader.SpectrumFile`, so only the rows in
+    `wave_range` are read; zero fluxes and errors become NaN.
+
+    Args:
+        file_path (str): Path of the FITS file.
+        instrument (str): Instrument name (default: the `INSTRUME` keyword).
+        wave_range (tuple): (min, max) corrected wavelength in Angstrom (default: everything).
+        columns (tuple): Columns to read; the first one is the wavelength.
+        barycorr (float): Precomputed barycentric correction (km/s), see `spectrum_corrections`.
+        barycorr_cache (barycentric.BarycentricCache or str): Cache of the computed corrections.
+
+    Returns:
+        dict: One float64 array per column (lower-case names), `mjd` and the `corrections`.
+    """
+    with SpectrumFile(file_path) as spectrum:
+        corrections = spectrum_corrections(spectrum.header, spectrum.unit(columns[0]), instrument, barycorr,
+                                           barycorr_cache)
+        result = spectrum.read(columns, wave_range=wave_range, wave_factor=corrections["wave_factor"],
+                               flux_factor=corrections["flux_factor"])
+        result["mjd"] = float(spectrum.header.get("MJD-OBS", np.nan))
+    result["corrections"] = corrections
+    return result
+
+
+def extract_spectra(files, instrument=None, wave_range=None, columns=COLUMNS, max_processes=MAX_PROCESSES,
+                    chunksize=None, barycorr_cache=None, verbose=True):
+    """
+    Extract many spectra in parallel over all the CPU cores.
+
+    Each file is read and corrected by `read_corrected_spectrum` in a
+    process pool; files are sent to the workers in chunks to keep the
+    scheduling overhead low. The barycentric corrections that must be
+    computed (topocentric spectra without a correction keyword) are first
+    found from the primary headers and computed for all files in one
+    vectorized call. The spectra are gathered into the flat arrays
+    of a `SpectraBatch`, with one metadata row per file. A file that cannot
+    be read is marked 'failed' with its error and has no points; it does not
+    stop the batch.
+
+    Args:
+        files (str or list): Directory (all its FITS files, sorted by name) or list of file paths.
+        instrument (str): Instrument name for all files (default: the `INSTRUME` keyword of each file).
+        wave_range (tuple): (min, max) corrected wavelength in Angstrom to keep (default: everything).
+            Restricting the range keeps the result small for large batches.
+        columns (tuple): Columns to read; the first one is the wavelength.
+        max_processes (int): Number of worker processes (1 to run in this process).
+        chunksize (int): Number of files sent to a worker at once (default: based on the number of files).
+        barycorr_cache (barycentric.BarycentricCache or str): Cache of the computed barycentric corrections.
+        verbose (bool): If True, print a summary.
+
+    Returns:
+        SpectraBatch: The spectra and their metadata table (`path`, `dp_id`, `instrument`,
+            `specsys`, `mjd`, `barycorr`, `barycorr_source`, `sourcecorr`, `wave_factor`,
+            `flux_factor`, `n_points`, `status`, `error`).
+    """
+    paths = _list_files(files)
+    if chunksize is None:
+        chunksize = min(MAX_CHUNKSIZE, max(1, len(paths) // (4 * max_processes)))
+    if max_processes == 1 or len(paths) <= 1:
+        barycorrs = _computed_barycorrs(list(map(_barycorr_inputs, paths)), barycorr_cache)
+        args = [(path, instrument, wave_range, tuple(columns), bc) for path, bc in zip(paths, barycorrs)]
+        results = [_extract_one(arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=max_processes) as executor:
+            inputs = list(executor.map(_barycorr_inputs, paths, chunksize=chunksize))
+            barycorrs = _computed_barycorrs(inputs, barycorr_cache)
+            args = [(path, instrument, wave_range, tuple(columns), bc) for path, bc in zip(paths, barycorrs)]
+            results = list(executor.map(_extract_one, args, chunksize=chunksize))
+    batch = _gather(paths, results, columns)
+    if verbose:
+        n_failed = int(np.sum(batch.table["status"] == "failed"))
+        print(f"Extracted {len(batch) - n_failed} of {len(batch)} spectra "
+              f"({batch.offsets[-1]} points, {batch.nbytes / 2**20:.1f} MiB)")
+    return batch
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+def _extract_one(args):
+    """Extract one spectrum in a worker process; errors are returned instead of raised."""
+    path, instrument, wave_range, columns, barycorr = args
+    try:
+        return read_corrected_spectrum(path, instrument=instrument, wave_range=wave_range, columns=columns,
+                                       barycorr=barycorr), ""
+    except Exception as err:
+        return None, f"{type(err).__name__}: {err}"
+
+def _computed_barycorrs(inputs, cache):
+    """Compute in one call the barycentric corrections of the files that need one (None for the others)."""
+    needed = [i for i, item in enumerate(inputs) if item is not None]
+    barycorrs = [None] * len(inputs)
+    if needed:
+        ra, dec, mjd, site = zip(*(inputs[i] for i in needed))
+        for i, value in zip(needed, barycentric_corrections(ra, dec, mjd, site, cache=cache)):
+            barycorrs[i] = float(value)
+    return barycorrs
+
+def _gather(paths, results, columns):
+    """Concatenate the extracted spectra into a SpectraBatch."""
+    names = [name.lower() for name in columns]
+    lengths = np.array([len(result[names[0]]) if result else 0 for result, _ in results], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    arrays = {name: np.empty(offsets[-1], dtype=np.float64) for name in names}
+    rows = []
+    for i, (path, (result, error)) in enumerate(zip(paths, results)):
+        if result is None:
+            rows.append((path, dp_id_from_filename(path), "", "", np.nan, np.nan, "", 0., np.nan, np.nan, 0,
+                         "failed", error))
+            continue
+        for name in names:
+            arrays[name][offsets[i]:offsets[i + 1]] = result[name]
+        c = result["corrections"]
+        rows.append((path, dp_id_from_filename(path), c["instrument"], c["specsys"], result["mjd"], c["barycorr"],
+                     c["barycorr_source"], c["sourcecorr"], c["wave_factor"], c["flux_factor"], lengths[i],
+                     "ok", ""))
+    table = Table(rows=rows or None, names=["path", "dp_id", "instrument", "specsys", "mjd", "barycorr",
+                                            "barycorr_source", "sourcecorr", "wave_factor", "flux_factor",
+                                            "n_points", "status", "error"],
+                  dtype=[str, str, str, str, float, float, str, float, float, float, np.int64, str, str])
+    return SpectraBatch(table, offsets, arrays)
+
+# -----------------------------------------------------------------------------
+# Internal helper functions
+# -----------------------------------------------------------------------------
+
+def _list_files(files):
+    """Return the FITS files of a directory (sorted) or the given list of paths."""
+    if isinstance(files, (str, os.PathLike)) and os.path.isdir(files):
+        return sorted(entry.path for entry in os.scandir(files)
+                      if entry.is_file() and entry.name.endswith(FITS_SUFFIXES))
+    if isinstance(files, (str, os.PathLike)):
+        return [os.fspath(files)]
+    return [os.fspath(path) for path in files]
+
+def _barycorr_inputs(path):
+    """Return (ra, dec, mjd, site) if the barycentric correction of a file must be computed, else None."""
+    try:
+        header = read_primary_header(path, ("SPECSYS", "RA", "DEC", "MJD-OBS", "TELESCOP", "INSTRUME")
+                                     + BARYCENTRIC_KEYWORDS)
+        if (str(header.get("SPECSYS", "")).strip().upper() != "TOPOCENT"
+                or any(keyword in header for keyword in BARYCENTRIC_KEYWORDS)):
+            return None
+        return float(header["RA"]), float(header["DEC"]), float(header["MJD-OBS"]), observatory_site(header)
+    except Exception:
+        return None  # reported by the extraction itself
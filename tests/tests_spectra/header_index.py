@@ -0,0 +1,296 @@
+import gzip
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from astropy.io import fits
+from astropy.table import MaskedColumn, Table
+
+# Shared helpers of ../tests_downloads: add that directory to sys.path before importing this module
+from common import (BLOCK_SIZE, CARD_SIZE, FITS_SUFFIXES, default_path, parse_card_value, promote_type,
+                    sqlite_connection)
+
+# =============================================================================
+# Constants
+# =============================================================================
+DEFAULT_INDEX_PATH = default_path("ESO_HEADER_INDEX", ".eso_header_index.sqlite")
+DEFAULT_KEYWORDS = ("MJD-OBS", "DATE-OBS", "OBJECT", "RA", "DEC", "INSTRUME", "TELESCOP", "SPECSYS",
+                    "HIERARCH ESO QC VRAD BARYCOR", "HELICORR", "REST_VAL", "EXPTIME", "SNR")
+MAX_WORKERS = 16
+CHUNK_SIZE = 1000
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class HeaderIndex:
+    """
+    Persistent index of selected primary header keywords of local FITS files.
+
+    Each file is stored with its size and modification time; `scan` only
+    reads the files that are new or have changed since they were indexed
+    (or were indexed without some of the requested keywords). Headers are
+    read with `read_primary_header`, which reads only the 2880-byte header
+    blocks, never the data.
+
+    Example:
+        >>> index = HeaderIndex()
+        >>> table = index.scan("./data/")
+        >>> table.sort("MJD-OBS")
+
+    Args:
+        path (str): Path of the SQLite database (default: `$ESO_HEADER_INDEX` or `~/.eso_header_index.sqlite`).
+        keywords (tuple): Keywords extracted from each header.
+    """
+    def __init__(self, path=DEFAULT_INDEX_PATH, keywords=DEFAULT_KEYWORDS):
+        self.path = os.path.abspath(path)
+        self.keywords = tuple(_normalize_keyword(keyword) for keyword in keywords)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    keywords TEXT NOT NULL,
+                    cards TEXT NOT NULL,
+                    scanned REAL NOT NULL
+                )
+            """)
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def scan(self, files, recursive=True, max_workers=MAX_WORKERS, verbose=True):
+        """
+        Index FITS files and return their keywords.
+
+        The headers of new or modified files are read in parallel threads
+        and stored by chunks of `CHUNK_SIZE` files, so an interrupted scan
+        keeps its progress.
+
+        Args:
+            files (str or list): Directory (its FITS files) or list of file paths.
+            recursive (bool): If True, also index the files of the subdirectories of a directory.
+            max_workers (int): Maximum number of files read concurrently.
+            verbose (bool): If True, print the number of files read.
+
+        Returns:
+            astropy.table.Table: One row per file (`path`, `size`, `mtime` and one column per keyword),
+                in the order of `files` (sorted by path for a directory).
+        """
+        stats = _stat_files(files, recursive)
+        known = self._stamps([path for path, _, _ in stats])
+        wanted = set(self.keywords)
+        stale = [(path, size, mtime_ns) for path, size, mtime_ns in stats
+                 if known.get(path, (None, None, set()))[:2] != (size, mtime_ns)
+                 or not wanted <= known[path][2]]
+        start = time.perf_counter()
+        n_failed = 0
+        if stale:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for i in range(0, len(stale), CHUNK_SIZE):
+                    chunk = stale[i:i + CHUNK_SIZE]
+                    cards = list(executor.map(self._read, (path for path, _, _ in chunk)))
+                    n_failed += sum(card is None for card in cards)
+                    self._put([(*item, card) for item, card in zip(chunk, cards) if card is not None])
+        if verbose:
+            print(f"Indexed {len(stats)} files: {len(stale) - n_failed} headers read, "
+                  f"{len(stats) - len(stale)} up to date, {n_failed} failed "
+                  f"({time.perf_counter() - start:.1f} s)")
+        return self.to_table([path for path, _, _ in stats])
+
+    def to_table(self, paths=None):
+        """
+        Return the indexed keywords as a table.
+
+        Args:
+            paths (list): Files to return, in this order (default: all the indexed files, sorted by path).
+
+        Returns:
+            astropy.table.Table: `path`, `size`, `mtime` and one masked column per keyword (masked
+                where a file lacks the keyword). Each column is typed from the values of its keyword:
+                bool, int or float, and str as soon as one value is a string, so text values such as
+                OBJECT = '1234' are never converted to numbers.
+        """
+        with self._connect() as conn:
+            if paths is None:
+                rows = conn.execute("SELECT path, size, mtime_ns, cards FROM files ORDER BY path").fetchall()
+            else:
+                found = {}
+                for i in range(0, len(paths), 900):
+                    chunk = [os.path.abspath(path) for path in paths[i:i + 900]]
+                    found.update((row[0], row) for row in conn.execute(
+                        f"SELECT path, size, mtime_ns, cards FROM files "
+                        f"WHERE path IN ({', '.join('?' * len(chunk))})", chunk))
+                rows = [found[os.path.abspath(path)] for path in paths if os.path.abspath(path) in found]
+        headers = [json.loads(row[3]) for row in rows]
+        table = Table()
+        table["path"] = np.array([row[0] for row in rows], dtype=str)
+        table["size"] = np.array([row[1] for row in rows], dtype=np.int64)
+        table["mtime"] = np.array([row[2] / 1e9 for row in rows], dtype=float)
+        for keyword in self.keywords:
+            table[keyword] = _keyword_column([header.get(keyword) for header in headers])
+        return table
+
+    def remove(self, paths):
+        """Remove files from the index."""
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM files WHERE path = ?", [(os.path.abspath(path),) for path in paths])
+
+    def prune(self):
+        """Remove the files that no longer exist from the index and return their number."""
+        with self._connect() as conn:
+            paths = [row[0] for row in conn.execute("SELECT path FROM files")]
+        gone = [path for path in paths if not os.path.exists(path)]
+        self.remove(gone)
+        return len(gone)
+
+    def _read(self, path):
+        try:
+            return read_primary_header(path, self.keywords)
+        except (OSError, ValueError) as err:
+            print(f"Could not read the header of {path}: {err}")
+            return None
+
+    def _stamps(self, paths):
+        """Return {path: (size, mtime_ns, indexed keywords)} for the indexed files among `paths`."""
+        stamps = {}
+        with self._connect() as conn:
+            for i in range(0, len(paths), 900):
+                chunk = paths[i:i + 900]
+                for path, size, mtime_ns, keywords in conn.execute(
+                        f"SELECT path, size, mtime_ns, keywords FROM files "
+                        f"WHERE path IN ({', '.join('?' * len(chunk))})", chunk):
+                    stamps[path] = (size, mtime_ns, set(json.loads(keywords)))
+        return stamps
+
+    def _put(self, rows):
+        now = time.time()
+        keywords = json.dumps(self.keywords)
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO files (path, size, mtime_ns, keywords, cards, scanned) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             [(path, size, mtime_ns, keywords, json.dumps(cards), now)
+                              for path, size, mtime_ns, cards in rows])
+
+    def _connect(self):
+        return sqlite_connection(self.path)
+
+
+def read_primary_header(file_path, keywords=None):
+    """
+    Read keywords of the primary header of a FITS file without reading its data.
+
+    Only the 2880-byte header blocks are read, and reading stops as soon as
+    all the requested keywords are found. Gzip-compressed files are
+    decompressed only up to the end of the header; other compressed formats
+    are read with `astropy.io.fits`.
+
+    Args:
+        file_path (str): Path of the FITS file.
+        keywords (list): Keywords to extract (default: all the cards). `ESO ...` is read as
+            `HIERARCH ESO ...`.
+
+    Returns:
+        dict: {keyword: value} in card order (COMMENT, HISTORY and blank cards are dropped). Long
+            strings continued on CONTINUE cards are joined.
+    """
+    wanted = None if keywords is None else {_normalize_keyword(keyword) for keyword in keywords}
+    with open(file_path, "rb") as f:
+        signature = f.read(9)
+    if signature[:2] == b"\x1f\x8b":
+        opener = gzip.open
+    elif signature == b"SIMPLE  =":
+        opener = open
+    else:
+        header = fits.getheader(file_path, 0)
+        return {key: value for key, value in ((_normalize_keyword(key), value) for key, value in header.items())
+                if key not in ("COMMENT", "HISTORY", "") and (wanted is None or key in wanted)}
+    cards = {}
+    continued = None  # keyword of a long string whose value goes on in the next CONTINUE card
+    with opener(file_path, "rb") as f:
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if len(block) < BLOCK_SIZE:
+                raise ValueError(f"{file_path}: truncated header")
+            for i in range(0, BLOCK_SIZE, CARD_SIZE):
+                card = block[i:i + CARD_SIZE].decode("ascii", "replace")
+                if card[:8].rstrip() == "END":
+                    return cards
+                if card[:8] == "CONTINUE":
+                    if continued is not None:
+                        cards[continued] = cards[continued][:-1] + str(parse_card_value(card[8:]))
+                        continued = continued if cards[continued].endswith("&") else None
+                    continue
+                key, value = _split_card(card)
+                continued = None
+                if key is not None and (wanted is None or key in wanted):
+                    cards[key] = parse_card_value(value)
+                    if value.lstrip().startswith("'") and cards[key].endswith("&"):
+                        continued = key
+            if wanted is not None and len(cards) == len(wanted) and continued is None:
+                return cards
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+def _stat_files(files, recursive):
+    """Return (absolute path, size, mtime_ns) of the FITS files of a directory or of a list of paths."""
+    if isinstance(files, (str, os.PathLike)) and os.path.isdir(files):
+        stats = []
+        directories = [os.fspath(files)]
+        while directories:
+            with os.scandir(directories.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir() and recursive:
+                        directories.append(entry.path)
+                    elif entry.is_file() and entry.name.endswith(FITS_SUFFIXES):
+                        stat = entry.stat()
+                        stats.append((os.path.abspath(entry.path), stat.st_size, stat.st_mtime_ns))
+        return sorted(stats)
+    paths = [files] if isinstance(files, (str, os.PathLike)) else files
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError as err:
+            print(f"Skipping {path}: {err}")
+            continue
+        stats.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    return stats
+
+# -----------------------------------------------------------------------------
+# Internal helper functions
+# -----------------------------------------------------------------------------
+
+def _normalize_keyword(keyword):
+    """Return the keyword as written in the header cards (`ESO X Y` becomes `HIERARCH ESO X Y`)."""
+    keyword = " ".join(str(keyword).upper().split())
+    return f"HIERARCH {keyword}" if keyword.startswith("ESO ") else keyword
+
+def _split_card(card):
+    """Split a header card into (keyword, value field); the keyword is None for cards without a value."""
+    if card.startswith("HIERARCH"):
+        if "=" not in card:
+            return None, ""
+        key, value = card.split("=", 1)
+        return " ".join(key.split()), value
+    if card[8:10] != "= ":
+        return None, ""
+    return card[:8].rstrip(), card[10:]
+
+def _keyword_column(values):
+    """Build a masked table column from the values of one keyword (None where missing)."""
+    kind = None
+    for value in values:
+        if value is not None:
+            kind = type(value) if kind is None else promote_type(kind, type(value))
+    kind = kind or str
+    return MaskedColumn([kind() if value is None else kind(value) for value in values],
+                        mask=[value is None for value in values], dtype=kind)
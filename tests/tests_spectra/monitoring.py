@@ -0,0 +1,223 @@
+import json
+import os
+import time
+
+import astropy.units as u
+import numpy as np
+from astropy.table import Table
+from astropy.time import Time
+
+# pipeline needs ../tests_downloads on sys.path (see pipeline.py)
+from pipeline import process_spectra
+from reducers import SpectrumStatistics
+from spectra import CAII_K_AIR, wavelength_grid
+from timeseries import INDEX_FILE, SpectralTimeSeries
+
+# =============================================================================
+# Constants
+# =============================================================================
+SERIES_DIR = "series"
+GRID_FILE = "grid.npz"
+STATISTICS_FILE = "statistics.npz"
+STATE_FILE = "state.json"
+RELEASE_OVERLAP = 1.  # days queried again before the last release date seen
+MAX_ATTEMPTS = 3
+STATISTICS_BLOCK = 256  # spectra per block when the statistics are rebuilt from the series
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class TimeSeriesMonitor:
+    """
+    Incrementally updated time series of processed spectra of a target.
+
+    The monitor keeps in `state_dir` the processed spectra (a memory-mapped
+    `timeseries.SpectralTimeSeries`), their running statistics
+    (`reducers.SpectrumStatistics`), the wavelength grid, the most recent
+    `obs_release_date` seen and the products that failed. Each `update`
+    only queries the products released since the last update, and only
+    downloads and processes the `dp_id`s not in the series yet (plus the
+    previous failures, up to `max_attempts` times each), so a daily job
+    costs as much as the new epochs.
+
+    The stored series is only appended to: its rows are in processing
+    order (use `np.argsort(monitor.series.mjd)` for time order), so the rows
+    of the saved index are never rewritten. The index, the statistics and
+    the state file are each written to a temporary file and renamed. If the
+    job stops between these writes, the statistics are rebuilt from the
+    series when the state is loaded, and the spectra missing from the index
+    are processed again.
+
+    Example:
+        >>> monitor = TimeSeriesMonitor("./beta_pic/")
+        >>> monitor.update(lambda filters: eso.query_surveys(column_filters=filters, cone_ra=ra,
+        ...                                                  cone_dec=dec, cone_radius=radius),
+        ...                column_filters={"instrument_name": "HARPS", "dataproduct_type": "spectrum"})
+        >>> velocity, flux = monitor.series.velocity_window(-200, 200)
+        >>> flux = flux[np.argsort(monitor.series.mjd)]
+
+    Args:
+        state_dir (str): Directory of the persisted state (created if needed).
+        grid (tuple): (wl, dwl, lammin, lammax) of `spectra.wavelength_grid` (default: the stored
+            grid, or the CaII K grid of the notebook for a new state). A grid differing from the
+            stored one raises a ValueError.
+        ref (float): Reference wavelength of the velocity scale of a new series.
+        max_attempts (int): Number of failed updates after which a product is no longer retried
+            (see `retry_failed`).
+    """
+    def __init__(self, state_dir, grid=None, ref=CAII_K_AIR, max_attempts=MAX_ATTEMPTS):
+        self.state_dir = state_dir
+        self.max_attempts = max_attempts
+        os.makedirs(state_dir, exist_ok=True)
+        if os.path.exists(os.path.join(state_dir, STATE_FILE)):
+            with np.load(os.path.join(state_dir, GRID_FILE)) as stored:
+                stored_grid = (stored["wl"], stored["dwl"], float(stored["lammin"]), float(stored["lammax"]))
+            if grid is not None and not _same_grid(grid, stored_grid):
+                raise ValueError(f"The grid differs from the one of the time series in {state_dir}")
+            self.grid = stored_grid
+            self.series = SpectralTimeSeries.load(os.path.join(state_dir, SERIES_DIR))
+            self.statistics = SpectrumStatistics.load(os.path.join(state_dir, STATISTICS_FILE))
+            if self.statistics.n_spectra != len(self.series):
+                print(f"Rebuilding the statistics of {state_dir} from the series "
+                      f"({self.statistics.n_spectra} spectra, {len(self.series)} in the series)")
+                self.statistics = _series_statistics(self.series)
+            with open(os.path.join(state_dir, STATE_FILE)) as f:
+                state = json.load(f)
+        else:
+            self.grid = tuple(grid) if grid is not None else wavelength_grid()
+            wl, dwl, lammin, lammax = self.grid
+            np.savez(os.path.join(state_dir, GRID_FILE), wl=wl, dwl=dwl, lammin=lammin, lammax=lammax)
+            series_dir = os.path.join(state_dir, SERIES_DIR)
+            if os.path.exists(os.path.join(series_dir, INDEX_FILE)):
+                # Interrupted before the first state was written: keep the spectra already saved
+                self.series = SpectralTimeSeries.load(series_dir)
+                self.statistics = _series_statistics(self.series)
+            else:
+                self.series = SpectralTimeSeries(wl, ref=ref, path=series_dir)
+                self.statistics = SpectrumStatistics(len(wl))
+            state = {}
+        self.last_release = state.get("last_release")
+        # {dp_id: {"error", "attempts"}}; older states stored only the error of one attempt
+        self.failed = {dp_id: failure if isinstance(failure, dict) else {"error": failure, "attempts": 1}
+                       for dp_id, failure in state.get("failed", {}).items()}
+        if not state:
+            self.save()  # the state file is written last: it marks a complete state
+
+    def __len__(self):
+        return len(self.series)
+
+    def retry_failed(self):
+        """Retry all the failed products at the next update, with a fresh attempt count, and return their number."""
+        for failure in self.failed.values():
+            failure["attempts"] = 0
+        return len(self.failed)
+
+    def new_products(self, table):
+        """Return the `dp_id`s of a query result not processed yet, in table order."""
+        return [str(dp_id) for dp_id in dict.fromkeys(table["dp_id"]) if str(dp_id) not in self.series]
+
+    def release_filters(self, column_filters=None):
+        """
+        Add the lower bound on `obs_release_date` of the next update to query filters.
+
+        The bound is the last release date seen minus `RELEASE_OVERLAP` days
+        (products already processed are skipped by `dp_id` anyway).
+
+        Returns:
+            dict: The filters, for `astroquery.eso.Eso.query_surveys(column_filters=...)`.
+        """
+        filters = dict(column_filters or {})
+        if self.last_release is not None:
+            since = Time(self.last_release, format="isot", scale="utc") - RELEASE_OVERLAP * u.day
+            filters["obs_release_date"] = f"> '{since.isot}'"
+        return filters
+
+    def update(self, query, column_filters=None, destination="./data/", **process_kwargs):
+        """
+        Query the newly released products, then process and append the new spectra.
+
+        Args:
+            query (callable): Function of the column filters returning the query result table
+                (with `dp_id` and `obs_release_date` columns), e.g. a call of
+                `Eso.query_surveys(column_filters=filters, ...)`.
+            column_filters (dict): Filters of the query (the `obs_release_date` filter is set here).
+            destination (str): Directory where the files are downloaded.
+            **process_kwargs: Other arguments of `pipeline.process_spectra` (e.g. `max_processes`, `base_url`).
+
+        Returns:
+            astropy.table.Table: One row per product processed in this update (`dp_id`, `mjd`,
+                `status`, `error`), in completion order.
+        """
+        start = time.perf_counter()
+        table = _public_products(query(self.release_filters(column_filters)))
+        todo = [dp_id for dp_id in dict.fromkeys(self.new_products(table) + list(self.failed))
+                if self.failed.get(dp_id, {}).get("attempts", 0) < self.max_attempts]
+        rows = []
+        if todo:
+            for result in process_spectra(todo, destination=destination, grid=self.grid, **process_kwargs):
+                dp_id = result["dp_id"]
+                if result["status"] == "ok":
+                    self.series.append(dp_id, result["mjd"], result["flux"])
+                    self.statistics.update(result["flux"])
+                    self.failed.pop(dp_id, None)
+                else:
+                    attempts = self.failed.get(dp_id, {}).get("attempts", 0) + 1
+                    self.failed[dp_id] = {"error": result["error"], "attempts": attempts}
+                rows.append((dp_id, result["mjd"] if result["mjd"] is not None else np.nan, result["status"],
+                             result["error"]))
+            # Products the pipeline never returned are retried like failures (`last_release` moves past them)
+            returned = {row[0] for row in rows}
+            for dp_id in todo:
+                if dp_id not in returned:
+                    attempts = self.failed.get(dp_id, {}).get("attempts", 0) + 1
+                    self.failed[dp_id] = {"error": "Not processed", "attempts": attempts}
+                    rows.append((dp_id, np.nan, "failed", "Not processed"))
+        if len(table):
+            latest = max(Time(_isot(date), format="isot", scale="utc") for date in table["obs_release_date"])
+            if self.last_release is None or latest > Time(self.last_release, format="isot", scale="utc"):
+                self.last_release = latest.isot
+        self.save()
+        n_ok = sum(row[2] == "ok" for row in rows)
+        n_given_up = sum(failure["attempts"] >= self.max_attempts for failure in self.failed.values())
+        print(f"{len(table)} products queried, {len(todo)} to process: {n_ok} added, {len(rows) - n_ok} failed; "
+              f"{len(self.series)} spectra in the series, {n_given_up} products no longer retried "
+              f"({time.perf_counter() - start:.1f} s)")
+        return Table(rows=rows or None, names=["dp_id", "mjd", "status", "error"], dtype=[str, float, str, str])
+
+    def save(self):
+        """Write the series, statistics and state to `state_dir` (the state file last)."""
+        self.series.save()
+        self.statistics.save(os.path.join(self.state_dir, STATISTICS_FILE))
+        path = os.path.join(self.state_dir, STATE_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"last_release": self.last_release, "failed": self.failed, "n_spectra": len(self.series),
+                       "updated": Time.now().isot}, f, indent=1)
+        os.replace(path + ".tmp", path)
+
+# =============================================================================
+# Internal helper functions
+# =============================================================================
+
+def _series_statistics(series):
+    """Compute the statistics of all the spectra of a series, by blocks of rows."""
+    statistics = SpectrumStatistics(len(series.wl))
+    for start in range(0, len(series), STATISTICS_BLOCK):
+        statistics.update(series.flux[start:start + STATISTICS_BLOCK])
+    return statistics
+
+def _isot(value):
+    """Return a release date of a query result as an ISO string accepted by astropy.time.Time."""
+    return str(value).strip().rstrip("Z").replace(" ", "T")
+
+def _public_products(table):
+    """Keep the products already released (the upper bound of the notebook query)."""
+    if len(table) == 0:
+        return table
+    released = Time([_isot(date) for date in table["obs_release_date"]], format="isot", scale="utc")
+    return table[released <= Time.now()]
+
+def _same_grid(grid, other):
+    """Return True if two (wl, dwl, lammin, lammax) grids are equal."""
+    return (len(grid[0]) == len(other[0]) and np.allclose(grid[0], other[0]) and np.allclose(grid[1], other[1])
+            and np.isclose(grid[2], other[2]) and np.isclose(grid[3], other[3]))
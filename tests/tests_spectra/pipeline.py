@@ -0,0 +1,145 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# The download layer is in ../tests_downloads: add that directory to sys.path before importing this module,
+# e.g. sys.path.append("../tests_downloads")
+from downloads import MAX_WORKERS, iter_downloads
+from spectra import extract_spectrum, wavelength_grid
+
+# =============================================================================
+# Constants
+# =============================================================================
+MAX_PROCESSES = os.cpu_count() or 1
+
+# =============================================================================
+# Public API Functions
+# =============================================================================
+
+def process_spectra(dp_ids, destination="./data/", grid=None, max_downloads=MAX_WORKERS,
+                    max_processes=MAX_PROCESSES, **download_kwargs):
+    """
+    Download and extract spectra with downloads and extraction overlapping.
+
+    Downloads run in a thread pool (`downloads.iter_downloads`); as soon as
+    a file is on disk, its extraction (`spectra.extract_spectrum`: open,
+    trim, normalise, down-bin) is submitted to a process pool, while the
+    next files are still downloading. Processed spectra are yielded as they
+    become ready, so the total time approaches the longer of the download
+    and compute times instead of their sum.
+
+    The download layer (`../tests_downloads`) must be on `sys.path`.
+
+    Example:
+        >>> sys.path.append("../tests_downloads")
+        >>> from pipeline import process_spectra
+        >>> spectra = {s["dp_id"]: s for s in process_spectra(table["dp_id"]) if s["status"] == "ok"}
+
+    Args:
+        dp_ids (list): Data product identifiers of the spectra.
+        destination (str): Directory where the files are saved.
+        grid (tuple): (wl, dwl, lammin, lammax) as returned by `spectra.wavelength_grid`
+            (default: the CaII K grid of the notebook).
+        max_downloads (int): Maximum number of concurrent downloads.
+        max_processes (int): Number of extraction processes.
+        **download_kwargs: Other arguments of `downloads.iter_downloads` (e.g. `base_url`, `store`).
+
+    Yields:
+        dict: `dp_id`, `path`, `status` ('ok' or 'failed'), `error`, `mjd`, down-binned
+            `flux`, and the `download_seconds` and `extract_seconds` spent on the file.
+    """
+    wl, dwl, lammin, lammax = grid if grid is not None else wavelength_grid()
+    dp_ids = _distinct_ids(dp_ids)
+    downloads = iter_downloads(dp_ids, destination=destination, max_workers=max_downloads, **download_kwargs)
+    # Spawned (not forked) workers: forking while the download threads hold locks can deadlock the children
+    executor = ProcessPoolExecutor(max_workers=max_processes, mp_context=multiprocessing.get_context("spawn"))
+    ready = queue.Queue()
+    stop = threading.Event()
+    feeder = threading.Thread(target=_submit_extractions,
+                              args=(downloads, dp_ids, executor, ready, stop, (wl, dwl, lammin, lammax)),
+                              daemon=True)
+    feeder.start()
+    try:
+        n_expected, n_yielded = None, 0
+        while n_expected is None or n_yielded < n_expected:
+            download, outcome = ready.get()
+            if download is None:
+                n_expected = outcome
+                continue
+            n_yielded += 1
+            if isinstance(outcome, str):
+                yield _spectrum_result(download, error=outcome)
+                continue
+            try:
+                spectrum, seconds = outcome.result()
+            except Exception as err:
+                yield _spectrum_result(download, error=f"Extraction failed: {err}")
+            else:
+                yield _spectrum_result(download, spectrum=spectrum, extract_seconds=seconds)
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        feeder.join()
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+def _submit_extractions(downloads, dp_ids, executor, ready, stop, grid):
+    """
+    Submit the extraction of each file as soon as it is downloaded (runs in a feeder thread).
+
+    Each finished extraction (or failed download) is put on the `ready`
+    queue as (download result, future or error message); the total number of
+    items is put last as (None, n). If the downloads stop on an error, each
+    of the `dp_ids` not downloaded yet is put as failed with that error.
+    """
+    n_items = 0
+    pending = dict.fromkeys(dp_ids)
+    try:
+        for download in downloads:
+            if stop.is_set():
+                break
+            n_items += 1
+            pending.pop(download["dp_id"], None)
+            if download["status"] == "failed":
+                ready.put((download, download["error"] or "Download failed"))
+                continue
+            try:
+                future = executor.submit(_timed_extract, download["path"], *grid)
+            except RuntimeError:  # executor shut down by the consumer
+                break
+            future.add_done_callback(lambda f, d=download: ready.put((d, f)))
+    except Exception as err:
+        for dp_id in pending:
+            n_items += 1
+            ready.put(({"dp_id": dp_id, "path": None, "seconds": 0.}, f"Download pipeline stopped: {err}"))
+    finally:
+        downloads.close()
+        ready.put((None, n_items))
+
+# -----------------------------------------------------------------------------
+# Internal helper functions
+# -----------------------------------------------------------------------------
+
+def _distinct_ids(dp_ids):
+    """Return the distinct `dp_id` values as a list of strings, in input order."""
+    if isinstance(dp_ids, (str, bytes)):
+        dp_ids = [dp_ids]
+    return list(dict.fromkeys(x.decode("utf-8") if isinstance(x, bytes) else str(x) for x in dp_ids))
+
+def _timed_extract(file_path, wl, dwl, lammin, lammax):
+    """Extract a spectrum in a worker process and return it with the time spent."""
+    start = time.perf_counter()
+    spectrum = extract_spectrum(file_path, wl, dwl, lammin, lammax)
+    return spectrum, time.perf_counter() - start
+
+def _spectrum_result(download, spectrum=None, extract_seconds=0., error=""):
+    """Combine a download result and an extracted spectrum into the dictionary yielded to the user."""
+    return {"dp_id": download["dp_id"], "path": download["path"], "status": "failed" if error else "ok",
+            "error": error, "mjd": spectrum["mjd"] if spectrum else None,
+            "flux": spectrum["flux"] if spectrum else None,
+            "download_seconds": download["seconds"], "extract_seconds": extract_seconds}
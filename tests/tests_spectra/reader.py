@@ -0,0 +1,227 @@
+import re
+
+import numpy as np
+from astropy.io import fits
+
+# Shared helpers of ../tests_downloads: add that directory to sys.path before importing this module
+from common import hdu_data_size, padded_size
+
+# =============================================================================
+# Constants
+# =============================================================================
+SEARCH_WINDOW = 4096
+WAVE_UNITS = {"angstrom": 1., "a": 1., "nm": 10., "um": 1e4, "micron": 1e4, "m": 1e10}
+_TFORM_RE = re.compile(r"^(\d*)([LXBIJKAEDCM])")
+_TFORM_DTYPES = {"L": "i1", "B": "u1", "I": ">i2", "J": ">i4", "K": ">i8", "A": "S1",
+                 "E": ">f4", "D": ">f8", "C": ">c8", "M": ">c16"}
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class SpectrumFile:
+    """
+    Memory-mapped access to a 1D spectrum stored as an ESO SDP binary table.
+
+    Only the headers are read when the file is opened. The binary table is
+    memory-mapped with a structured big-endian dtype, so `column()` returns a
+    view on the file without reading or copying anything. `read()` locates
+    the requested wavelength window by binary search on the (sorted) WAVE
+    column, which touches only a few pages, and reads only that slice of the
+    requested columns. Unit and flux corrections are applied while the slice
+    is converted to native floats, in a single pass and a single allocation
+    per column.
+
+    Compressed files (`.gz`, `.Z`, ...) cannot be memory-mapped: they are
+    read fully through `astropy.io.fits` instead. Tables with scaled
+    (TSCAL/TZERO) or variable-length columns raise a ValueError.
+
+    Example:
+        >>> with SpectrumFile("ADP.2019-03-15T10:55:41.581.fits") as spectrum:
+        ...     data = spectrum.read(wave_range=(6500, 6620))
+
+    Args:
+        file_path (str): Path of the FITS file.
+        extension (int): Index of the binary table HDU.
+    """
+    def __init__(self, file_path, extension=1):
+        self.file_path = file_path
+        self.extension = extension
+        with open(file_path, "rb") as f:
+            plain_fits = f.read(9) == b"SIMPLE  ="
+        if plain_fits:
+            self.header, self.table_header, self._table = _map_binary_table(file_path, extension)
+        else:
+            with fits.open(file_path) as hdul:
+                self.header = hdul[0].header
+                self.table_header = hdul[extension].header
+                self._table = np.array(hdul[extension].data)
+            self._table.dtype.names = _column_names(self.table_header)
+        self.columns = _column_names(self.table_header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Release the memory map."""
+        self._table = None
+
+    def column(self, name, row=0):
+        """Return a column of the table as a view on the file (raw values and units, no copy)."""
+        return self._table[name.upper()][row]
+
+    def unit(self, name):
+        """Return the TUNITn of a column ('' if not set)."""
+        index = self.columns.index(name.upper()) + 1
+        return str(self.table_header.get(f"TUNIT{index}", "")).strip()
+
+    def wave_factor(self, column="WAVE"):
+        """Return the factor converting the wavelength column to Angstrom (from its TUNIT)."""
+        try:
+            return wave_unit_factor(self.unit(column))
+        except ValueError as err:
+            raise ValueError(f"{err} in {self.file_path}") from None
+
+    def window(self, wave_min=None, wave_max=None, wave_factor=None, column="WAVE", row=0):
+        """
+        Return the slice of the rows whose corrected wavelength lies within [wave_min, wave_max].
+
+        The wavelength column must be monotonic; the bounds are located by
+        binary search on the memory map (see `_searchsorted`), so only a few
+        pages of the column are read and converted.
+        """
+        wave = self.column(column, row)
+        factor = self.wave_factor(column) if wave_factor is None else wave_factor
+        n = len(wave)
+        if n > 1 and wave[0] > wave[-1]:
+            # Decreasing wavelengths: search on the reversed view
+            reverse = wave[::-1]
+            lo = 0 if wave_max is None else n - _searchsorted(reverse, wave_max / factor, side="right")
+            hi = n if wave_min is None else n - _searchsorted(reverse, wave_min / factor, side="left")
+            return slice(lo, hi)
+        lo = 0 if wave_min is None else _searchsorted(wave, wave_min / factor, side="left")
+        hi = n if wave_max is None else _searchsorted(wave, wave_max / factor, side="right")
+        return slice(lo, hi)
+
+    def read(self, columns=("WAVE", "FLUX", "ERR"), wave_range=None, wave_factor=None, flux_factor=1.,
+             zero_to_nan=True, row=0):
+        """
+        Read (part of) the spectrum with the corrections applied.
+
+        Args:
+            columns (tuple): Columns to read; the first one is the wavelength.
+            wave_range (tuple): (min, max) corrected wavelength to keep (default: everything).
+            wave_factor (float): Factor applied to the wavelength (default: conversion from
+                TUNIT to Angstrom); include Doppler corrections here.
+            flux_factor (float): Factor applied to the other columns.
+            zero_to_nan (bool): If True, zeros in the other columns become NaN (as in the notebooks).
+            row (int): Row of the table holding the spectrum.
+
+        Returns:
+            dict: One float64 array per column (lower-case names).
+        """
+        wave_factor = self.wave_factor(columns[0]) if wave_factor is None else wave_factor
+        selection = self.window(*(wave_range or (None, None)), wave_factor=wave_factor, column=columns[0],
+                                row=row)
+        result = {}
+        for i, name in enumerate(columns):
+            data = self.column(name, row)[selection]
+            out = np.empty(data.shape, dtype=np.float64)
+            np.multiply(data, wave_factor if i == 0 else flux_factor, out=out)
+            if zero_to_nan and i > 0:
+                out[data == 0] = np.nan
+            result[name.lower()] = out
+        return result
+
+
+def read_spectrum(file_path, columns=("WAVE", "FLUX", "ERR"), wave_range=None, wave_factor=None,
+                  flux_factor=1., zero_to_nan=True):
+    """
+    Read a 1D spectrum (ESO SDP format) through a memory map; see `SpectrumFile.read`.
+
+    Returns:
+        dict: One array per column (lower-case names) and the primary `header`.
+    """
+    with SpectrumFile(file_path) as spectrum:
+        result = spectrum.read(columns, wave_range=wave_range, wave_factor=wave_factor, flux_factor=flux_factor,
+                               zero_to_nan=zero_to_nan)
+        result["header"] = spectrum.header
+    return result
+
+def wave_unit_factor(unit):
+    """Return the factor converting wavelengths in `unit` (a TUNIT value; empty for Angstrom) to Angstrom."""
+    unit = str(unit).strip().lower()
+    if unit and unit not in WAVE_UNITS:
+        raise ValueError(f"Unknown wavelength unit: {unit}")
+    return WAVE_UNITS.get(unit, 1.)
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+def _map_binary_table(file_path, extension):
+    """Parse the headers up to `extension` and memory-map its binary table (plain FITS files only)."""
+    headers = []
+    with open(file_path, "rb") as f:
+        for index in range(extension + 1):
+            header = fits.Header.fromfile(f, padding=True)
+            offset = f.tell()
+            headers.append(header)
+            if index < extension:
+                f.seek(offset + padded_size(hdu_data_size(header)))
+    table_header = headers[extension]
+    if table_header.get("XTENSION") != "BINTABLE":
+        raise ValueError(f"HDU {extension} of {file_path} is not a binary table")
+    table = np.memmap(file_path, dtype=_row_dtype(table_header), mode="r", offset=offset,
+                      shape=(table_header["NAXIS2"],))
+    return headers[0], table_header, table
+
+# -----------------------------------------------------------------------------
+# Internal helper functions
+# -----------------------------------------------------------------------------
+
+def _column_names(table_header):
+    """Return the upper-case names of the columns of a binary table."""
+    return [str(table_header.get(f"TTYPE{i}", f"COL{i}")).strip().upper()
+            for i in range(1, table_header["TFIELDS"] + 1)]
+
+def _row_dtype(table_header):
+    """Build the numpy dtype of a row of a binary table from its TFORMn keywords."""
+    fields = []
+    for i, name in enumerate(_column_names(table_header), start=1):
+        match = _TFORM_RE.match(str(table_header[f"TFORM{i}"]).strip())
+        if match is None or match.group(2) == "X":
+            raise ValueError(f"Unsupported TFORM{i}: {table_header[f'TFORM{i}']}")
+        if f"TSCAL{i}" in table_header or f"TZERO{i}" in table_header:
+            raise ValueError(f"Scaled column {name} is not supported by the memory map")
+        repeat = int(match.group(1) or 1)
+        code = match.group(2)
+        if code == "A":
+            fields.append((name, f"S{repeat}"))
+        else:
+            fields.append((name, _TFORM_DTYPES[code], (repeat,)))
+    dtype = np.dtype(fields)
+    if dtype.itemsize != table_header["NAXIS1"]:
+        raise ValueError("Row size does not match NAXIS1 (variable-length arrays are not supported)")
+    return dtype
+
+def _searchsorted(values, value, side="left"):
+    """
+    `np.searchsorted` on a sorted, possibly big-endian and memory-mapped, array.
+
+    `np.searchsorted` would convert the whole array to native byte order
+    first. Here the range is narrowed by bisection on single elements down to
+    `SEARCH_WINDOW` elements, and only that window is converted and searched.
+    """
+    lo, hi = 0, len(values)
+    while hi - lo > SEARCH_WINDOW:
+        mid = (lo + hi) // 2
+        if values[mid] < value or (side == "right" and values[mid] == value):
+            lo = mid + 1
+        else:
+            hi = mid
+    window = values[lo:hi].astype(values.dtype.newbyteorder("="))
+    return lo + int(np.searchsorted(window, value, side=side))
@@ -0,0 +1,258 @@
+import os
+
+import numpy as np
+
+# =============================================================================
+# Constants
+# =============================================================================
+MEDIAN_QUANTILE = 0.5
+_N_MARKERS = 5
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class SpectrumStatistics:
+    """
+    Streaming per-bin statistics of spectra on a common grid.
+
+    The spectra are added one at a time (or in blocks) and are not kept:
+    the memory used depends only on the number of bins. Available
+    reductions:
+
+    - `mean`, `variance`, `std`: Welford's algorithm (Chan's formula for
+      blocks and `merge`), numerically stable over many epochs;
+    - `median`: P-square estimate (Jain & Chlamtac 1985) from five markers
+      per bin; exact for up to five spectra;
+    - `coadd`, `coadd_err`: inverse-variance weighted mean, when the
+      errors (`ERR`) are given.
+
+    NaN values (and non-positive errors) are skipped bin by bin, so each
+    bin has its own `count`. The state can be saved and loaded to reuse the
+    reductions of spectra already processed.
+
+    Example:
+        >>> stats = SpectrumStatistics(len(wl))
+        >>> for s in process_spectra(table["dp_id"]):
+        ...     if s["status"] == "ok":
+        ...         stats.update(s["flux"])
+        >>> mean, std = stats.mean, stats.std
+
+    Args:
+        n_bins (int): Number of bins of the spectra.
+        median (bool): If True, also track the median estimate (P-square updates cost more than the mean).
+    """
+    def __init__(self, n_bins, median=True):
+        self.n_bins = n_bins
+        self.n_spectra = 0
+        self.count = np.zeros(n_bins, dtype=np.int64)
+        self._mean = np.zeros(n_bins)
+        self._m2 = np.zeros(n_bins)
+        self._sum_weights = np.zeros(n_bins)
+        self._sum_weighted = np.zeros(n_bins)
+        self.track_median = median
+        if median:
+            self._seen = np.zeros(n_bins, dtype=np.int64)
+            self._heights = np.full((_N_MARKERS, n_bins), np.nan)
+            self._positions = np.tile(np.arange(_N_MARKERS, dtype=float)[:, None], (1, n_bins))
+            self._desired = np.tile(_desired_positions(MEDIAN_QUANTILE)[:, None], (1, n_bins))
+
+    def update(self, flux, err=None):
+        """
+        Add one spectrum, or a block of spectra (one per row).
+
+        Args:
+            flux (numpy.ndarray): Flux, shape (n_bins,) or (n_spectra, n_bins).
+            err (numpy.ndarray): Flux errors with the same shape, for the weighted coadd.
+        """
+        flux = np.atleast_2d(np.asarray(flux, dtype=float))
+        if flux.shape[1] != self.n_bins:
+            raise ValueError(f"Spectra have {flux.shape[1]} bins, expected {self.n_bins}")
+        valid = np.isfinite(flux)
+        self._update_moments(flux, valid)
+        if err is not None:
+            err = np.atleast_2d(np.asarray(err, dtype=float))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                weights = np.where(valid & (err > 0), 1. / err ** 2, 0.)
+            weights[~np.isfinite(weights)] = 0.
+            self._sum_weights += weights.sum(axis=0)
+            self._sum_weighted += np.where(weights > 0, weights * flux, 0.).sum(axis=0)
+        if self.track_median:
+            for row, row_valid in zip(flux, valid):
+                self._update_median(row, row_valid)
+        self.n_spectra += len(flux)
+
+    def add_results(self, results):
+        """
+        Add the successful results of `pipeline.process_spectra` (dicts with a `flux`, and optionally `err`).
+
+        Returns:
+            int: Number of spectra added.
+        """
+        n_added = 0
+        for result in results:
+            if result.get("status", "ok") == "ok" and result.get("flux") is not None:
+                self.update(result["flux"], result.get("err"))
+                n_added += 1
+        return n_added
+
+    def merge(self, other):
+        """
+        Add the statistics of another accumulator (e.g. of another worker or of a previous run).
+
+        The median estimate cannot be merged: it is dropped unless `other` is empty.
+        """
+        if other.n_bins != self.n_bins:
+            raise ValueError(f"Cannot merge statistics of {other.n_bins} bins into {self.n_bins} bins")
+        self._combine(other.count, other._mean, other._m2)
+        self._sum_weights += other._sum_weights
+        self._sum_weighted += other._sum_weighted
+        if self.track_median and other.n_spectra:
+            self.track_median = False
+            del self._seen, self._heights, self._positions, self._desired
+        self.n_spectra += other.n_spectra
+
+    @property
+    def mean(self):
+        """Mean of each bin (NaN where no value)."""
+        return np.where(self.count > 0, self._mean, np.nan)
+
+    @property
+    def variance(self):
+        """Sample variance (ddof=1) of each bin (NaN where fewer than two values)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, self._m2 / (self.count - 1), np.nan)
+
+    @property
+    def std(self):
+        """Sample standard deviation of each bin."""
+        return np.sqrt(self.variance)
+
+    @property
+    def median(self):
+        """Median estimate of each bin (P-square; exact for up to five values, NaN where no value)."""
+        if not self.track_median:
+            raise ValueError("The median is not tracked (median=False, or the statistics were merged)")
+        small = self._seen < _N_MARKERS
+        result = self._heights[2].copy()
+        if small.any():
+            with np.errstate(all="ignore"):
+                heights = self._heights[:, small]
+                counts = self._seen[small]
+                sorted_heights = np.sort(heights, axis=0)  # NaN last
+                lower = sorted_heights[np.maximum((counts - 1) // 2, 0), np.arange(len(counts))]
+                upper = sorted_heights[np.maximum(counts // 2, 0), np.arange(len(counts))]
+                result[small] = np.where(counts > 0, 0.5 * (lower + upper), np.nan)
+        return result
+
+    @property
+    def coadd(self):
+        """Inverse-variance weighted mean of each bin (NaN where no error was given)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self._sum_weights > 0, self._sum_weighted / self._sum_weights, np.nan)
+
+    @property
+    def coadd_err(self):
+        """Error of the weighted mean of each bin."""
+        with np.errstate(divide="ignore"):
+            return np.where(self._sum_weights > 0, 1. / np.sqrt(self._sum_weights), np.nan)
+
+    def save(self, path):
+        """Save the state of the accumulator to a `.npz` file (written to a temporary file, then renamed)."""
+        state = {"n_spectra": self.n_spectra, "count": self.count, "mean": self._mean, "m2": self._m2,
+                 "sum_weights": self._sum_weights, "sum_weighted": self._sum_weighted}
+        if self.track_median:
+            state.update(seen=self._seen, heights=self._heights, positions=self._positions, desired=self._desired)
+        path = os.fspath(path)
+        path = path if path.endswith(".npz") else path + ".npz"  # as np.savez does
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **state)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        """Load an accumulator saved with `save`."""
+        with np.load(path) as state:
+            stats = cls(len(state["count"]), median="heights" in state)
+            stats.n_spectra = int(state["n_spectra"])
+            stats.count, stats._mean, stats._m2 = state["count"], state["mean"], state["m2"]
+            stats._sum_weights, stats._sum_weighted = state["sum_weights"], state["sum_weighted"]
+            if stats.track_median:
+                stats._seen, stats._heights, stats._positions = state["seen"], state["heights"], state["positions"]
+                stats._desired = state["desired"]
+        return stats
+
+    def _update_moments(self, flux, valid):
+        """Welford update of the count, mean and M2 (Chan's formula for a block of spectra)."""
+        if len(flux) == 1:
+            x, ok = flux[0], valid[0]
+            self.count += ok
+            delta = np.where(ok, x - self._mean, 0.)
+            self._mean += np.where(ok, delta / np.maximum(self.count, 1), 0.)
+            self._m2 += np.where(ok, delta * (x - self._mean), 0.)
+            return
+        count = valid.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, np.where(valid, flux, 0.).sum(axis=0) / count, 0.)
+        m2 = np.where(valid, (flux - mean) ** 2, 0.).sum(axis=0)
+        self._combine(count, mean, m2)
+
+    def _combine(self, count, mean, m2):
+        """Combine the moments of another set of values (Chan et al.)."""
+        total = self.count + count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = mean - self._mean
+            self._mean = np.where(total > 0, self._mean + delta * count / total, 0.)
+            self._m2 = np.where(total > 0, self._m2 + m2 + delta ** 2 * self.count * count / total, 0.)
+        self.count = total
+
+    def _update_median(self, x, valid):
+        """P-square update of the five markers of each bin with one spectrum."""
+        before = self._seen.copy()
+        self._seen += valid
+        # Bins still filling their first five values: store them, and start the markers at the fifth
+        filling = valid & (before < _N_MARKERS)
+        if filling.any():
+            bins = np.flatnonzero(filling)
+            self._heights[before[bins], bins] = x[bins]
+            ready = bins[before[bins] == _N_MARKERS - 1]
+            self._heights[:, ready] = np.sort(self._heights[:, ready], axis=0)
+        active = valid & (before >= _N_MARKERS)
+        if not active.any():
+            return
+        bins = np.flatnonzero(active)
+        q, n, desired, value = self._heights[:, bins], self._positions[:, bins], self._desired[:, bins], x[bins]
+        q[0] = np.minimum(q[0], value)
+        q[4] = np.maximum(q[4], value)
+        cell = (value >= q[1]).astype(int) + (value >= q[2]) + (value >= q[3])
+        n += np.arange(_N_MARKERS)[:, None] > cell[None, :]
+        desired += _desired_increments(MEDIAN_QUANTILE)[:, None]
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            move = ((d >= 1) & (n[i + 1] - n[i] > 1)) | ((d <= -1) & (n[i - 1] - n[i] < -1))
+            if not move.any():
+                continue
+            step = np.sign(d)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                parabolic = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                neighbour = np.where(step > 0, q[np.minimum(i + 1, 4)], q[i - 1])
+                neighbour_n = np.where(step > 0, n[np.minimum(i + 1, 4)], n[i - 1])
+                linear = q[i] + step * (neighbour - q[i]) / (neighbour_n - n[i])
+            inside = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(move, np.where(inside, parabolic, linear), q[i])
+            n[i] = np.where(move, n[i] + step, n[i])
+        self._heights[:, bins], self._positions[:, bins], self._desired[:, bins] = q, n, desired
+
+# =============================================================================
+# Internal helper functions
+# =============================================================================
+
+def _desired_positions(p):
+    """Initial desired marker positions of the P-square algorithm (0-based)."""
+    return np.array([0., 2. * p, 4. * p, 2. + 2. * p, 4.])
+
+def _desired_increments(p):
+    """Increments of the desired marker positions for each new value."""
+    return np.array([0., p / 2., p, (1. + p) / 2., 1.])
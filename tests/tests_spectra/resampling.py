@@ -0,0 +1,161 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+from spectra import downbin_spectrum
+
+# =============================================================================
+# Constants
+# =============================================================================
+METHODS = ("mean", "overlap")
+GRID_TOLERANCE = 1e-6  # Angstrom: native grids closer than this share a rebinning matrix
+MAX_CACHED = 32
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class SpectralResampler:
+    """
+    Resample spectra onto a common grid with precomputed sparse rebinning matrices.
+
+    The rebinning onto the output grid (`wl`, `dwl`) is linear in the flux,
+    so for a given native wavelength grid it is a sparse matrix. The matrix
+    is built once per native grid and kept in a cache keyed by a hash of the
+    grid; all the spectra sharing a grid are then resampled with one sparse
+    product on their stacked fluxes. Spectra whose grid is not shared fall
+    back to the direct per-spectrum rebinning.
+
+    Two methods are available:
+
+    - 'mean': average of the native points falling in each bin, exactly as
+      `spectra.downbin_spectrum` (and `coronagraph.downbin_spec`);
+    - 'overlap': flux-conserving average of the native pixels weighted by
+      their overlap with each bin (native pixel edges are the midpoints
+      between the wavelengths).
+
+    Bins without data are NaN; NaN fluxes propagate to the bins they fall in.
+
+    Example:
+        >>> wl, dwl, lammin, lammax = wavelength_grid()
+        >>> resampler = SpectralResampler(wl, dwl)
+        >>> binned = resampler.resample_many(fluxes, waves)  # (n_spectra, len(wl))
+
+    Args:
+        wl (numpy.ndarray): Centres of the output bins.
+        dwl (numpy.ndarray): Widths of the output bins.
+        method (str): 'mean' or 'overlap'.
+        tolerance (float): Native grids of the same length differing by less than this share a matrix.
+        max_cached (int): Maximum number of matrices kept in the cache.
+    """
+    def __init__(self, wl, dwl, method="mean", tolerance=GRID_TOLERANCE, max_cached=MAX_CACHED):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method!r}; use one of {METHODS}")
+        self.wl = np.asarray(wl, dtype=float)
+        self.dwl = np.asarray(dwl, dtype=float)
+        self.edges = np.append(self.wl - 0.5 * self.dwl, self.wl[-1] + 0.5 * self.dwl[-1])
+        self.method = method
+        self.tolerance = tolerance
+        self.max_cached = max_cached
+        self._matrices = OrderedDict()
+
+    def matrix(self, wave):
+        """
+        Return the rebinning matrix of a native grid (from the cache if possible).
+
+        Returns:
+            tuple: (scipy.sparse.csr_matrix of shape (len(wl), len(wave)), boolean mask of the empty bins).
+        """
+        key = self._grid_key(wave)
+        if key in self._matrices:
+            self._matrices.move_to_end(key)
+            return self._matrices[key]
+        wave = np.asarray(wave, dtype=float)
+        built = _mean_matrix(wave, self.edges) if self.method == "mean" else _overlap_matrix(wave, self.edges)
+        self._matrices[key] = built
+        if len(self._matrices) > self.max_cached:
+            self._matrices.popitem(last=False)
+        return built
+
+    def resample(self, flux, wave):
+        """
+        Resample spectra sharing one native grid.
+
+        Args:
+            flux (numpy.ndarray): Flux of one spectrum (1D), or of several stacked spectra (2D, one per row).
+            wave (numpy.ndarray): Native wavelength grid.
+
+        Returns:
+            numpy.ndarray: Resampled flux, shape (len(wl),) or (n_spectra, len(wl)).
+        """
+        matrix, empty = self.matrix(wave)
+        flux = np.asarray(flux, dtype=float)
+        result = np.asarray(matrix @ flux.T).T
+        result[..., empty] = np.nan
+        return result
+
+    def resample_many(self, fluxes, waves):
+        """
+        Resample many spectra, grouping those that share a native grid.
+
+        Args:
+            fluxes (list): Flux arrays of the spectra.
+            waves (list): Native wavelength grid of each spectrum (increasing).
+
+        Returns:
+            numpy.ndarray: Resampled fluxes, shape (n_spectra, len(wl)), in input order.
+        """
+        result = np.empty((len(fluxes), len(self.wl)))
+        groups = {}
+        for i, wave in enumerate(waves):
+            groups.setdefault(self._grid_key(wave), []).append(i)
+        for key, members in groups.items():
+            wave = waves[members[0]]
+            if len(members) == 1 and self.method == "mean" and key not in self._matrices:
+                result[members[0]] = downbin_spectrum(np.asarray(fluxes[members[0]], dtype=float),
+                                                      np.asarray(wave, dtype=float), self.wl, self.dwl)
+            else:
+                result[members] = self.resample(np.stack([fluxes[i] for i in members]), wave)
+        return result
+
+    def _grid_key(self, wave):
+        """Hash of a native grid quantized to the tolerance."""
+        wave = np.asarray(wave, dtype=float)
+        quantized = np.round(wave / self.tolerance).astype(np.int64) if len(wave) else wave
+        return len(wave), hashlib.sha1(np.ascontiguousarray(quantized).tobytes()).hexdigest()
+
+# =============================================================================
+# Internal Implementation (hidden from the user)
+# =============================================================================
+
+def _mean_matrix(wave, edges):
+    """Matrix averaging the native points falling in each bin (same bins as `downbin_spectrum`)."""
+    n_bins = len(edges) - 1
+    index = np.searchsorted(edges, wave, side="right") - 1
+    index[wave == edges[-1]] = n_bins - 1
+    columns = np.flatnonzero((index >= 0) & (index < n_bins))
+    rows = index[columns]
+    counts = np.bincount(rows, minlength=n_bins)
+    matrix = sparse.csr_matrix((1. / counts[rows], (rows, columns)), shape=(n_bins, len(wave)))
+    return matrix, counts == 0
+
+def _overlap_matrix(wave, edges):
+    """Matrix averaging the native pixels weighted by their overlap with each bin."""
+    n_bins, n_pix = len(edges) - 1, len(wave)
+    if n_pix < 2:
+        return _mean_matrix(wave, edges)
+    mid = 0.5 * (wave[1:] + wave[:-1])
+    pix_edges = np.concatenate([[wave[0] - (mid[0] - wave[0])], mid, [wave[-1] + (wave[-1] - mid[-1])]])
+    # Segments between all the edges belong to one native pixel and one bin
+    bounds = np.union1d(pix_edges, edges)
+    lo, hi = bounds[:-1], bounds[1:]
+    centre = 0.5 * (lo + hi)
+    pixel = np.searchsorted(pix_edges, centre, side="right") - 1
+    row = np.searchsorted(edges, centre, side="right") - 1
+    keep = (pixel >= 0) & (pixel < n_pix) & (row >= 0) & (row < n_bins) & (hi > lo)
+    pixel, row, length = pixel[keep], row[keep], (hi - lo)[keep]
+    covered = np.bincount(row, weights=length, minlength=n_bins)
+    matrix = sparse.csr_matrix((length / covered[row], (row, pixel)), shape=(n_bins, n_pix))
+    return matrix, covered == 0
@@ -0,0 +1,94 @@
+import numpy as np
+
+from reader import SpectrumFile
+
+# =============================================================================
+# Constants
+# =============================================================================
+CAII_K_AIR = 3933.7  # Angstrom
+RESOLVING_POWER = 115000
+HALF_WIDTH = 20.  # Angstrom
+NORM_PERCENTILE = 95
+
+# =============================================================================
+# Public API Functions
+# =============================================================================
+
+def wavelength_grid(ref=CAII_K_AIR, resolving_power=RESOLVING_POWER, half_width=HALF_WIDTH):
+    """
+    Build the constant resolving power wavelength grid of `Spectra_parameters` in the notebooks.
+
+    The grid is the one of `coronagraph.noise_routines.construct_lam(ref - half_width,
+    ref + half_width, resolving_power)`, computed without a Python loop.
+
+    Args:
+        ref (float): Reference wavelength (default: CaII K in the air, in Angstrom).
+        resolving_power (float): Resolving power lambda / delta-lambda of the grid.
+        half_width (float): Half width of the wavelength range around `ref`.
+
+    Returns:
+        tuple: (wl, dwl, lammin, lammax) with the bin centres and widths.
+    """
+    lammin, lammax = ref - half_width, ref + half_width
+    step = 1. + 1. / resolving_power
+    n = int(np.ceil(np.log((lammax + lammax / resolving_power) / lammin) / np.log(step))) + 1
+    lam = lammin * step ** np.arange(n)
+    dlam = np.empty(n)
+    dlam[1:-1] = 0.5 * (lam[2:] - lam[:-2])
+    dlam[0] = lammin / resolving_power
+    return lam[:-1], dlam[:-1], lammin, lammax
+
+
+def downbin_spectrum(flux, wave, wl, dwl):
+    """
+    Average a spectrum in the bins of a lower resolution grid (top-hat rebinning).
+
+    Equivalent to `coronagraph.downbin_spec` (`scipy.stats.binned_statistic`
+    with the mean); empty bins are NaN.
+
+    Args:
+        flux (numpy.ndarray): Flux of the spectrum.
+        wave (numpy.ndarray): Wavelength of each flux value.
+        wl (numpy.ndarray): Centres of the low resolution bins.
+        dwl (numpy.ndarray): Widths of the low resolution bins.
+
+    Returns:
+        numpy.ndarray: Mean flux in each bin.
+    """
+    edges = np.append(wl - 0.5 * dwl, wl[-1] + 0.5 * dwl[-1])
+    index = np.searchsorted(edges, wave, side="right") - 1
+    index[wave == edges[-1]] = len(wl) - 1
+    inside = (index >= 0) & (index < len(wl))
+    counts = np.bincount(index[inside], minlength=len(wl))
+    sums = np.bincount(index[inside], weights=flux[inside], minlength=len(wl))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+def extract_spectrum(file_path, wl, dwl, lammin, lammax, percentile=NORM_PERCENTILE):
+    """
+    Open a 1D spectrum (ESO SDP format) and trim, normalise and down-bin it.
+
+    These are the steps of the extraction loop of
+    `ESO_WorkingExample_Spectra_Time.ipynb`, for one file.
+
+    Args:
+        file_path (str): Path of the FITS file.
+        wl (numpy.ndarray): Centres of the output bins.
+        dwl (numpy.ndarray): Widths of the output bins.
+        lammin (float): Lower end of the wavelength range kept.
+        lammax (float): Upper end of the wavelength range kept.
+        percentile (float): Percentile of the flux in the range used for normalisation.
+
+    Returns:
+        dict: `path`, `mjd` (MJD-OBS of the primary header) and down-binned `flux`.
+    """
+    with SpectrumFile(file_path) as spectrum:
+        mjd = spectrum.header.get("MJD-OBS", np.nan)
+        # Only the rows around [lammin, lammax] of the first two columns are read
+        data = spectrum.read(spectrum.columns[:2], wave_range=(lammin, lammax), wave_factor=1., zero_to_nan=False)
+        wave, flux = data.values()
+    in_range = (wave > lammin) & (wave < lammax)
+    natwav = wave[in_range]
+    natf = flux[in_range] / np.percentile(flux[in_range], percentile)
+    return {"path": file_path, "mjd": mjd, "flux": downbin_spectrum(natf, natwav, wl, dwl)}
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+import barycentric
+from barycentric import BarycentricCache, barycentric_corrections, observatory_site
+
+
+@pytest.mark.parametrize("header, site", [
+    ({"TELESCOP": "ESO-3P6", "INSTRUME": "FEROS"}, "lasilla"),
+    ({"TELESCOP": "ESO-3.6"}, "lasilla"),
+    ({"TELESCOP": "ESO-NTT"}, "lasilla"),
+    ({"TELESCOP": "ESO-VLT-U2", "INSTRUME": "UVES"}, "paranal"),
+    ({"INSTRUME": "HARPS"}, "lasilla"),
+    ({}, "paranal"),
+])
+def test_observatory_site(header, site):
+    assert observatory_site(header) == site
+
+
+def test_cache_get_returns_only_cached_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(barycentric, "GET_CHUNK_SIZE", 3)
+    cache = BarycentricCache(str(tmp_path / "barycorr.sqlite"))
+    stored = {("lasilla", 10. + i, -20.5, 58000.123 + i): float(i) for i in range(7)}
+    cache.put(stored)
+    keys = list(stored) + [("paranal", 10., -20.5, 58000.123), ("lasilla", 10., -20.5, 1.)]
+    assert cache.get(keys + keys[:2]) == stored
+    assert cache.get([]) == {}
+
+
+def test_cached_corrections_are_reused(tmp_path, monkeypatch):
+    ra, dec, mjd = np.array([10., 200.]), np.array([-20., 30.]), np.array([58000.1, 58100.7])
+    path = str(tmp_path / "barycorr.sqlite")
+    computed = barycentric_corrections(ra, dec, mjd, site=["lasilla", "paranal"], cache=path)
+    assert computed.shape == (2,) and np.all(np.abs(computed) < 35.)
+
+    def fail(*args):
+        raise AssertionError("correction recomputed")
+
+    monkeypatch.setattr(barycentric, "_radial_velocity_corrections", fail)
+    assert np.array_equal(barycentric_corrections(ra, dec, mjd, site=["lasilla", "paranal"], cache=path), computed)
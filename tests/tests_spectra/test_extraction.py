@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from extraction import SPEED_OF_LIGHT, spectrum_corrections
+from reader import WAVE_UNITS, wave_unit_factor
+
+
+@pytest.mark.parametrize("unit", ["", "Angstrom", "nm", "NM ", "um", "micron", "m"])
+def test_wave_unit_factor(unit):
+    corrections = spectrum_corrections({"SPECSYS": "BARYCENT"}, wave_unit=unit)
+    assert corrections["wave_factor"] == wave_unit_factor(unit) == WAVE_UNITS.get(unit.strip().lower(), 1.)
+    assert np.isnan(corrections["barycorr"])
+
+
+def test_unknown_wave_unit_raises():
+    with pytest.raises(ValueError, match="parsec"):
+        spectrum_corrections({}, wave_unit="parsec")
+
+
+def test_barycentric_and_rest_frame_corrections():
+    header = {"INSTRUME": "UVES", "SPECSYS": "SOURCE", "HIERARCH ESO QC VRAD BARYCOR": 12.5, "HELICORR": 99.,
+              "REST_VAL": -30.}
+    corrections = spectrum_corrections(header, wave_unit="nm")
+    expected = 10. * (1. + 12.5 / SPEED_OF_LIGHT) * (1. - 30. / SPEED_OF_LIGHT)
+    assert corrections["wave_factor"] == pytest.approx(expected, rel=1e-15)
+    assert corrections["barycorr_source"] == "HIERARCH ESO QC VRAD BARYCOR"
+    assert corrections["sourcecorr"] == -30.
+    assert corrections["flux_factor"] == 1e-16
+
+
+def test_topocentric_spectrum_uses_computed_correction():
+    corrections = spectrum_corrections({"SPECSYS": "TOPOCENT"}, computed_barycorr=-5.)
+    assert corrections["barycorr_source"] == "computed"
+    assert corrections["wave_factor"] == pytest.approx(1. - 5. / SPEED_OF_LIGHT, rel=1e-15)
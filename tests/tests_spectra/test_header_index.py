@@ -0,0 +1,37 @@
+import gzip
+
+import numpy as np
+from astropy.io import fits
+
+from header_index import HeaderIndex, read_primary_header
+
+LONG_TEXT = "A long programme title " * 8
+
+
+def _write(path, **cards):
+    fits.PrimaryHDU(header=fits.Header(list(cards.items()))).writeto(path)
+
+
+def test_long_strings_are_joined(tmp_path):
+    path = tmp_path / "long.fits"
+    _write(path, OBJECT=LONG_TEXT.strip(), EXPTIME=10., INSTRUME="ESPRESSO")
+    assert b"CONTINUE" in path.read_bytes()
+    header = read_primary_header(str(path), ["OBJECT", "EXPTIME"])
+    assert header == {"OBJECT": LONG_TEXT.strip(), "EXPTIME": 10.}
+    with gzip.open(f"{path}.gz", "wb") as f:
+        f.write(path.read_bytes())
+    assert read_primary_header(f"{path}.gz")["OBJECT"] == LONG_TEXT.strip()
+
+
+def test_columns_are_typed_by_keyword_and_masked(tmp_path):
+    _write(tmp_path / "a.fits", OBJECT="1234", EXPTIME=300, SNR=12.5, HELICORR=True)
+    _write(tmp_path / "b.fits", OBJECT="HD 1", EXPTIME=60)
+    index = HeaderIndex(str(tmp_path / "index.sqlite"), keywords=("OBJECT", "EXPTIME", "SNR", "HELICORR"))
+    table = index.scan(str(tmp_path), verbose=False)
+
+    assert list(table["OBJECT"]) == ["1234", "HD 1"]
+    assert table["OBJECT"].dtype.kind == "U"
+    assert table["EXPTIME"].dtype == np.int64 and list(table["EXPTIME"]) == [300, 60]
+    assert table["SNR"][0] == 12.5 and list(table["SNR"].mask) == [False, True]
+    assert table["HELICORR"].dtype == bool and table["HELICORR"][0]
+    assert list(table["HELICORR"].mask) == [False, True]
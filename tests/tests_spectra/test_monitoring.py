@@ -0,0 +1,103 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from astropy.table import Table
+
+import monitoring
+from monitoring import TimeSeriesMonitor
+
+WL = np.linspace(3930., 3940., 50)
+GRID = (WL, np.full(WL.size, WL[1] - WL[0]), 3930., 3940.)
+MJDS = {"ADP.3": 58003., "ADP.1": 58001., "ADP.2": 58002.}
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Replace the pipeline: ADP.n gets a flux of n, BAD.* products fail; return the processed dp_ids."""
+    calls = []
+
+    def process_spectra(dp_ids, **kwargs):
+        for dp_id in dp_ids:
+            calls.append(dp_id)
+            if dp_id.startswith("BAD"):
+                yield {"dp_id": dp_id, "status": "failed", "error": "boom", "mjd": None, "flux": None}
+            else:
+                yield {"dp_id": dp_id, "status": "ok", "error": "", "mjd": MJDS[dp_id],
+                       "flux": np.full(WL.size, float(dp_id.split(".")[1]))}
+
+    monkeypatch.setattr(monitoring, "process_spectra", process_spectra)
+    return calls
+
+
+def _query(*dp_ids):
+    table = Table({"dp_id": list(dp_ids), "obs_release_date": ["2020-01-01T00:00:00"] * len(dp_ids)})
+    return lambda filters: table
+
+
+def test_rows_stay_in_processing_order_on_disk(tmp_path, processed):
+    monitor = TimeSeriesMonitor(str(tmp_path), grid=GRID)
+    monitor.update(_query("ADP.3", "ADP.1", "ADP.2"))
+    loaded = TimeSeriesMonitor(str(tmp_path))
+    assert list(loaded.series.dp_id) == ["ADP.3", "ADP.1", "ADP.2"]
+    assert np.array_equal(loaded.series.flux[:, 0], [3., 1., 2.])
+    assert list(loaded.series.dp_id[np.argsort(loaded.series.mjd)]) == ["ADP.1", "ADP.2", "ADP.3"]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_statistics_are_rebuilt_after_an_interrupted_save(tmp_path, processed, monkeypatch):
+    monitor = TimeSeriesMonitor(str(tmp_path), grid=GRID)
+    monitor.update(_query("ADP.1"))
+    # Stop after the series is written, before the statistics and the state
+    monkeypatch.setattr(monitor.statistics, "save", lambda path: None)
+    monitor.update(_query("ADP.1", "ADP.2", "ADP.3"))
+    loaded = TimeSeriesMonitor(str(tmp_path))
+    assert len(loaded.series) == 3
+    assert loaded.statistics.n_spectra == 3
+    assert np.allclose(loaded.statistics.mean, 2.)
+
+
+def test_failed_products_are_retried_up_to_max_attempts(tmp_path, processed):
+    monitor = TimeSeriesMonitor(str(tmp_path), grid=GRID, max_attempts=2)
+    for _ in range(3):
+        monitor.update(_query("BAD.1"))
+    assert processed == ["BAD.1", "BAD.1"]
+    assert monitor.failed == {"BAD.1": {"error": "boom", "attempts": 2}}
+    assert monitor.retry_failed() == 1
+    monitor.update(_query())
+    assert processed == ["BAD.1"] * 3
+
+
+def test_failures_of_older_states_are_retried(tmp_path, processed):
+    TimeSeriesMonitor(str(tmp_path), grid=GRID)
+    path = tmp_path / monitoring.STATE_FILE
+    state = json.loads(path.read_text())
+    state["failed"] = {"BAD.1": "boom"}
+    path.write_text(json.dumps(state))
+    monitor = TimeSeriesMonitor(str(tmp_path), max_attempts=2)
+    monitor.update(_query())
+    assert processed == ["BAD.1"]
+    assert monitor.failed["BAD.1"]["attempts"] == 2
+
+
+def test_products_not_returned_by_the_pipeline_are_retried(tmp_path, monkeypatch):
+    def process_spectra(dp_ids, **kwargs):
+        yield {"dp_id": "ADP.1", "status": "ok", "error": "", "mjd": MJDS["ADP.1"], "flux": np.ones(WL.size)}
+
+    monkeypatch.setattr(monitoring, "process_spectra", process_spectra)
+    monitor = TimeSeriesMonitor(str(tmp_path), grid=GRID)
+    rows = monitor.update(_query("ADP.1", "ADP.2"))
+    assert list(rows["status"]) == ["ok", "failed"]
+    loaded = TimeSeriesMonitor(str(tmp_path))
+    assert loaded.failed == {"ADP.2": {"error": "Not processed", "attempts": 1}}
+    assert loaded.last_release is not None
+
+
+def test_series_saved_before_the_first_state_is_kept(tmp_path, processed):
+    monitor = TimeSeriesMonitor(str(tmp_path), grid=GRID)
+    monitor.update(_query("ADP.1", "ADP.2"))
+    os.remove(os.path.join(str(tmp_path), monitoring.STATE_FILE))
+    loaded = TimeSeriesMonitor(str(tmp_path), grid=GRID)
+    assert list(loaded.series.dp_id) == ["ADP.1", "ADP.2"]
+    assert loaded.statistics.n_spectra == 2
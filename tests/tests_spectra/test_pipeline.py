@@ -0,0 +1,15 @@
+import pipeline
+from pipeline import process_spectra
+
+
+def test_stopped_downloads_fail_the_remaining_products(monkeypatch):
+    def iter_downloads(dp_ids, **kwargs):
+        yield {"dp_id": dp_ids[0], "path": None, "status": "failed", "error": "404", "seconds": 0.}
+        raise RuntimeError("connection pool broken")
+
+    monkeypatch.setattr(pipeline, "iter_downloads", iter_downloads)
+    results = list(process_spectra(["ADP.1", "ADP.2", b"ADP.3", "ADP.2"], max_processes=1))
+    assert [r["dp_id"] for r in results] == ["ADP.1", "ADP.2", "ADP.3"]
+    assert all(r["status"] == "failed" for r in results)
+    assert results[0]["error"] == "404"
+    assert all("connection pool broken" in r["error"] for r in results[1:])
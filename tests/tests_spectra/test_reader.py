@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from astropy.io import fits
+
+import reader
+from reader import SpectrumFile
+
+
+def _write_spectrum(path, wave):
+    table = fits.BinTableHDU.from_columns([
+        fits.Column(name="WAVE", format=f"{wave.size}D", unit="nm", array=[wave]),
+        fits.Column(name="FLUX", format=f"{wave.size}E", array=[np.ones(wave.size)])])
+    fits.HDUList([fits.PrimaryHDU(), table]).writeto(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("search_window", [1, 7, reader.SEARCH_WINDOW])
+def test_searchsorted_on_memory_map(tmp_path, monkeypatch, search_window):
+    monkeypatch.setattr(reader, "SEARCH_WINDOW", search_window)
+    wave = np.linspace(300., 1000., 20000)
+    wave[5000:5010] = wave[5000]
+    with SpectrumFile(_write_spectrum(tmp_path / "spectrum.fits", wave)) as spectrum:
+        column = spectrum.column("WAVE")
+        assert column.dtype.byteorder == ">"
+        for value in (wave[0] - 1., wave[5000], wave[12345] + 1e-9, wave[-1], wave[-1] + 1.):
+            for side in ("left", "right"):
+                assert reader._searchsorted(column, value, side=side) == np.searchsorted(wave, value, side=side)
+
+
+@pytest.mark.parametrize("decreasing", [False, True])
+def test_read_wave_range(tmp_path, decreasing):
+    wave = np.linspace(300., 1000., 20000)[::-1 if decreasing else 1]
+    path = _write_spectrum(tmp_path / "spectrum.fits", wave)
+    data = reader.read_spectrum(path, columns=("WAVE", "FLUX"), wave_range=(6500., 6620.))
+    expected = wave[(wave * 10 >= 6500.) & (wave * 10 <= 6620.)] * 10
+    assert np.array_equal(data["wave"], expected)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from reducers import SpectrumStatistics
+
+RNG = np.random.default_rng(7)
+
+
+def _spectra(n_spectra, n_bins=40, nan_fraction=0.1):
+    flux = RNG.normal(1., 0.2, (n_spectra, n_bins)) * np.linspace(0.5, 2., n_bins)
+    flux[RNG.random(flux.shape) < nan_fraction] = np.nan
+    return flux
+
+
+@pytest.mark.parametrize("block", [1, 7, 200])
+def test_mean_and_std_match_numpy(block):
+    flux = _spectra(200)
+    stats = SpectrumStatistics(flux.shape[1], median=False)
+    for start in range(0, len(flux), block):
+        stats.update(flux[start:start + block])
+    assert stats.n_spectra == 200
+    assert np.array_equal(stats.count, np.sum(np.isfinite(flux), axis=0))
+    assert np.allclose(stats.mean, np.nanmean(flux, axis=0), rtol=1e-12)
+    assert np.allclose(stats.std, np.nanstd(flux, axis=0, ddof=1), rtol=1e-10)
+
+
+def test_empty_and_single_value_bins():
+    stats = SpectrumStatistics(3)
+    stats.update([1., np.nan, np.nan])
+    stats.update([3., 2., np.nan])
+    assert np.allclose(stats.mean, [2., 2., np.nan], equal_nan=True)
+    assert np.allclose(stats.variance, [2., np.nan, np.nan], equal_nan=True)
+    assert np.allclose(stats.median, [2., 2., np.nan], equal_nan=True)
+
+
+@pytest.mark.parametrize("n_spectra", [1, 2, 3, 4, 5])
+def test_median_is_exact_for_few_spectra(n_spectra):
+    flux = _spectra(n_spectra, nan_fraction=0.)
+    stats = SpectrumStatistics(flux.shape[1])
+    for row in flux:
+        stats.update(row)
+    assert np.allclose(stats.median, np.median(flux, axis=0))
+
+
+def test_median_estimate_is_close_to_numpy():
+    flux = _spectra(2000)
+    stats = SpectrumStatistics(flux.shape[1])
+    stats.update(flux)
+    expected = np.nanmedian(flux, axis=0)
+    spread = np.nanstd(flux, axis=0)
+    assert np.all(np.abs(stats.median - expected) < 0.05 * spread)
+
+
+def test_merge_matches_single_accumulator():
+    flux = _spectra(60)
+    first, second = SpectrumStatistics(flux.shape[1]), SpectrumStatistics(flux.shape[1])
+    first.update(flux[:25])
+    second.update(flux[25:])
+    first.merge(second)
+    assert first.n_spectra == 60
+    assert np.allclose(first.mean, np.nanmean(flux, axis=0), rtol=1e-12)
+    assert np.allclose(first.std, np.nanstd(flux, axis=0, ddof=1), rtol=1e-10)
+    with pytest.raises(ValueError):
+        first.median
+
+
+def test_coadd_is_inverse_variance_weighted():
+    flux = _spectra(30, nan_fraction=0.)
+    err = RNG.uniform(0.05, 0.5, flux.shape)
+    err[0, 0] = 0.  # skipped
+    stats = SpectrumStatistics(flux.shape[1], median=False)
+    stats.update(flux, err)
+    weights = np.where(err > 0, 1. / np.where(err > 0, err, 1.) ** 2, 0.)
+    assert np.allclose(stats.coadd, np.sum(weights * flux, axis=0) / np.sum(weights, axis=0), rtol=1e-12)
+    assert np.allclose(stats.coadd_err, 1. / np.sqrt(np.sum(weights, axis=0)), rtol=1e-12)
+
+
+def test_save_load_round_trip(tmp_path):
+    flux = _spectra(12)
+    stats = SpectrumStatistics(flux.shape[1])
+    stats.update(flux[:8])
+    stats.save(tmp_path / "stats")
+    loaded = SpectrumStatistics.load(tmp_path / "stats.npz")
+    for accumulator in (stats, loaded):
+        accumulator.update(flux[8:])
+    assert loaded.n_spectra == 12
+    assert np.array_equal(loaded.mean, stats.mean, equal_nan=True)
+    assert np.array_equal(loaded.median, stats.median, equal_nan=True)
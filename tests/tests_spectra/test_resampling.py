@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from resampling import SpectralResampler
+from spectra import downbin_spectrum
+
+RNG = np.random.default_rng(3)
+WAVE = np.cumsum(RNG.uniform(0.008, 0.018, 5000)) + 3900.  # irregular native grid, ~3900-3965 A
+WL = np.arange(3910.25, 3950., 0.5)
+DWL = np.full(WL.size, 0.5)
+
+
+def _pixel_edges(wave):
+    mid = 0.5 * (wave[1:] + wave[:-1])
+    return np.concatenate([[2 * wave[0] - mid[0]], mid, [2 * wave[-1] - mid[-1]]])
+
+
+def test_overlap_conserves_flux():
+    flux = RNG.uniform(0.5, 2., WAVE.size)
+    binned = SpectralResampler(WL, DWL, method="overlap").resample(flux, WAVE)
+    edges = _pixel_edges(WAVE)
+    overlap = np.clip(np.minimum(edges[1:], WL[-1] + 0.25) - np.maximum(edges[:-1], WL[0] - 0.25), 0., None)
+    assert np.sum(binned * DWL) == pytest.approx(np.sum(flux * overlap), rel=1e-12)
+
+
+def test_overlap_keeps_a_constant_flux_and_leaves_empty_bins_nan():
+    wl = np.append(WL, 4000.)
+    binned = SpectralResampler(wl, np.append(DWL, 0.5), method="overlap").resample(np.full(WAVE.size, 3.), WAVE)
+    assert np.allclose(binned[:-1], 3.)
+    assert np.isnan(binned[-1])
+
+
+def test_mean_matches_downbin_spectrum():
+    flux = RNG.normal(1., 0.1, WAVE.size)
+    flux[100] = np.nan
+    wl = np.append(WL, 4000.)
+    dwl = np.append(DWL, 0.5)
+    expected = downbin_spectrum(flux, WAVE, wl, dwl)
+    resampled = SpectralResampler(wl, dwl).resample(flux, WAVE)
+    assert np.array_equal(np.isnan(resampled), np.isnan(expected))
+    assert np.allclose(resampled, expected, equal_nan=True)
+
+
+@pytest.mark.parametrize("method", ["mean", "overlap"])
+def test_resample_many_groups_shared_grids(method):
+    other = WAVE[::2] + 0.001
+    waves = [WAVE, other, WAVE.copy(), WAVE]
+    fluxes = [RNG.uniform(0.5, 2., wave.size) for wave in waves]
+    resampler = SpectralResampler(WL, DWL, method=method)
+    result = resampler.resample_many(fluxes, waves)
+    # One matrix for the shared grid ('mean' rebins a grid used once directly)
+    assert len(resampler._matrices) == (1 if method == "mean" else 2)
+    for flux, wave, row in zip(fluxes, waves, result):
+        assert np.allclose(row, resampler.resample(flux, wave))
+
+
+def test_unknown_method_raises():
+    with pytest.raises(ValueError):
+        SpectralResampler(WL, DWL, method="spline")
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from timeseries import SPEED_OF_LIGHT, SpectralTimeSeries
+
+REF = 3933.66
+WL = np.linspace(3930., 3937., 71)
+
+
+def _fill(series, n, start=0):
+    for i in range(start, start + n):
+        series.append(f"ADP.{i}", 58000. + (i * 7) % n, np.full(WL.size, float(i)))
+
+
+@pytest.mark.parametrize("on_disk", [False, True], ids=["memory", "mmap"])
+def test_append_grows_and_keeps_spectra(tmp_path, on_disk):
+    series = SpectralTimeSeries(WL, ref=REF, capacity=2, path=str(tmp_path / "series") if on_disk else None)
+    _fill(series, 9)
+    series.append("ADP.3", 1., np.full(WL.size, -1.))
+    assert len(series) == 9
+    assert list(series.dp_id) == [f"ADP.{i}" for i in range(9)]
+    assert np.array_equal(series.flux[:, 0], [0., 1., 2., -1., 4., 5., 6., 7., 8.])
+    assert np.array_equal(series["ADP.8"], np.full(WL.size, 8.))
+    assert "ADP.9" not in series
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load_round_trip(tmp_path, mmap):
+    path = str(tmp_path / "series")
+    series = SpectralTimeSeries(WL, ref=REF, capacity=4, path=path)
+    _fill(series, 6)
+    series.save()
+    loaded = SpectralTimeSeries.load(path, mmap=mmap)
+    assert loaded.ref == REF
+    assert np.array_equal(loaded.wl, WL)
+    assert list(loaded.dp_id) == list(series.dp_id)
+    assert np.array_equal(loaded.mjd, series.mjd)
+    assert np.array_equal(loaded.flux, series.flux)
+    # Appending to a loaded series grows it past the saved capacity
+    _fill(loaded, 5, start=6)
+    if mmap:
+        loaded.save()
+        loaded = SpectralTimeSeries.load(path)
+    assert len(loaded) == 11
+    assert np.array_equal(loaded.flux[:, 0], np.arange(11.))
+
+
+def test_existing_series_is_not_overwritten(tmp_path):
+    path = str(tmp_path / "series")
+    series = SpectralTimeSeries(WL, path=path)
+    _fill(series, 3)
+    series.save()
+    with pytest.raises(FileExistsError):
+        SpectralTimeSeries(WL, path=path)
+    assert len(SpectralTimeSeries.load(path)) == 3
+
+
+def test_sort_by_time():
+    series = SpectralTimeSeries(WL)
+    _fill(series, 5)
+    series.sort_by_time()
+    assert np.all(np.diff(series.mjd) >= 0)
+    for dp_id in series.dp_id:
+        assert series[dp_id][0] == float(dp_id.split(".")[1])
+
+
+def test_velocity_window():
+    series = SpectralTimeSeries(WL, ref=REF)
+    _fill(series, 3)
+    velocity, flux = series.velocity_window(-100., 100.)
+    expected = SPEED_OF_LIGHT * (WL - REF) / WL
+    assert np.array_equal(velocity, expected[(expected >= -100.) & (expected <= 100.)])
+    assert flux.shape == (3, velocity.size)
+    assert np.shares_memory(flux, series.flux)
+    velocity, flux = series.velocity_window(1e5, 2e5)
+    assert velocity.size == 0 and flux.shape == (3, 0)
@@ -0,0 +1,281 @@
+import os
+
+import numpy as np
+from astropy import constants as const
+
+from spectra import CAII_K_AIR
+
+# =============================================================================
+# Constants
+# =============================================================================
+SPEED_OF_LIGHT = const.c.to("km/s").value
+INITIAL_CAPACITY = 256
+FLUX_FILE = "flux.npy"
+INDEX_FILE = "index.npz"
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+class SpectralTimeSeries:
+    """
+    Time series of spectra on a common wavelength grid, stored in one 2D array.
+
+    The fluxes are rows of a preallocated float32 array (one row per
+    spectrum, one column per bin of `wl`), indexed by `dp_id` and `mjd`.
+    Appending fills the next row; when the array is full its capacity is
+    doubled, so building a series of n spectra costs O(n) copies instead of
+    the O(n^2) of growing a DataFrame column by column. With `path`, the
+    array is a memory-mapped `.npy` file in that directory and the series
+    can be larger than the memory.
+
+    Example:
+        >>> wl, dwl, lammin, lammax = wavelength_grid()
+        >>> series = SpectralTimeSeries(wl)
+        >>> for s in process_spectra(table["dp_id"]):
+        ...     series.append(s["dp_id"], s["mjd"], s["flux"])
+        >>> series.sort_by_time()
+        >>> velocity, flux = series.velocity_window(-200, 200)
+
+    Args:
+        wl (numpy.ndarray): Wavelength of the bins (e.g. from `spectra.wavelength_grid`).
+        ref (float): Reference wavelength of the velocity scale (default: CaII K in the air).
+        capacity (int): Initial number of rows allocated.
+        path (str): Directory of the memory-mapped storage (default: in memory). It must not hold
+            a saved series already (open that one with `load`).
+
+    Raises:
+        FileExistsError: If `path` holds a saved series.
+    """
+    def __init__(self, wl, ref=CAII_K_AIR, capacity=INITIAL_CAPACITY, path=None):
+        self.wl = np.asarray(wl, dtype=float)
+        self.ref = float(ref)
+        self.path = path
+        self._n = 0
+        self._mjd = np.full(capacity, np.nan)
+        self._dp_id = np.empty(capacity, dtype=object)
+        self._rows = {}
+        self._flux = self._allocate(max(capacity, 1))
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self, dp_id):
+        return dp_id in self._rows
+
+    def __getitem__(self, dp_id):
+        """Return the flux of a spectrum (a view) from its `dp_id`."""
+        return self._flux[self._rows[dp_id]]
+
+    @property
+    def flux(self):
+        """Fluxes as an (n_spectra, n_bins) view."""
+        return self._flux[:self._n]
+
+    @property
+    def mjd(self):
+        """MJD of each spectrum."""
+        return self._mjd[:self._n]
+
+    @property
+    def dp_id(self):
+        """Data product identifier of each spectrum."""
+        return self._dp_id[:self._n]
+
+    @property
+    def velocity(self):
+        """Velocity of each bin relative to `ref` (km/s), as in `Spectra_parameters` of the notebook."""
+        return SPEED_OF_LIGHT * (self.wl - self.ref) / self.wl
+
+    def append(self, dp_id, mjd, flux):
+        """
+        Add a spectrum (a spectrum already in the series is replaced).
+
+        Args:
+            dp_id (str): Data product identifier.
+            mjd (float): Time of the observation.
+            flux (numpy.ndarray): Flux on the grid `wl`.
+        """
+        flux = np.asarray(flux)
+        if flux.shape != self.wl.shape:
+            raise ValueError(f"Flux of {dp_id} has shape {flux.shape}, expected {self.wl.shape}")
+        row = self._rows.get(dp_id)
+        if row is None:
+            if self._n == len(self._flux):
+                self._grow(2 * len(self._flux))
+            row = self._n
+            self._n += 1
+            self._rows[dp_id] = row
+        self._flux[row] = flux
+        self._mjd[row] = mjd
+        self._dp_id[row] = dp_id
+
+    def extend(self, dp_ids, mjds, fluxes):
+        """Add several spectra (see `append`), growing the storage at most once."""
+        dp_ids = list(dp_ids)
+        if self._n + len(dp_ids) > len(self._flux):
+            self._grow(max(2 * len(self._flux), self._n + len(dp_ids)))
+        for dp_id, mjd, flux in zip(dp_ids, mjds, fluxes):
+            self.append(dp_id, mjd, flux)
+
+    def add_results(self, results):
+        """
+        Add the successful results of `pipeline.process_spectra` (or any dicts with `dp_id`, `mjd`, `flux`).
+
+        Returns:
+            int: Number of spectra added.
+        """
+        n_added = 0
+        for result in results:
+            if result.get("status", "ok") == "ok" and result.get("flux") is not None:
+                self.append(result["dp_id"], result["mjd"], result["flux"])
+                n_added += 1
+        return n_added
+
+    def sort_by_time(self):
+        """
+        Reorder the spectra by increasing MJD (stable, in place).
+
+        With a memory-mapped storage, the rows are permuted in the file and the
+        saved index matches them again only once `save` is called: to keep the
+        stored series consistent at every moment, index an appended series with
+        `np.argsort(series.mjd)` instead.
+        """
+        order = np.argsort(self.mjd, kind="stable")
+        self._flux[:self._n] = self._flux[:self._n][order]
+        self._mjd[:self._n] = self._mjd[:self._n][order]
+        self._dp_id[:self._n] = self._dp_id[:self._n][order]
+        self._rows = {dp_id: row for row, dp_id in enumerate(self.dp_id)}
+
+    def velocity_window(self, v_min, v_max):
+        """
+        Select the bins within a velocity window.
+
+        Returns:
+            tuple: (velocity of the bins, (n_spectra, n_selected) view of the fluxes).
+        """
+        velocity = self.velocity
+        selection = np.flatnonzero((velocity >= v_min) & (velocity <= v_max))
+        if len(selection) == 0:
+            return velocity[:0], self.flux[:, :0]
+        window = slice(selection[0], selection[-1] + 1)
+        return velocity[window], self.flux[:, window]
+
+    def save(self, path=None):
+        """
+        Write the series to a directory (`flux.npy` and `index.npz`), readable with `load`.
+
+        The index is written to a temporary file, then renamed over the previous one,
+        so a crash leaves the previous index (whose rows are still in `flux.npy`, as
+        appends only fill the rows after them).
+
+        Args:
+            path (str): Directory (default: the memory-mapped storage directory, which is then flushed).
+        """
+        path = path or self.path
+        if path is None:
+            raise ValueError("No directory given for an in-memory series")
+        os.makedirs(path, exist_ok=True)
+        if path == self.path:
+            self._flux.flush()
+        else:
+            np.save(os.path.join(path, FLUX_FILE), self.flux)
+        index_path = os.path.join(path, INDEX_FILE)
+        with open(index_path + ".tmp", "wb") as f:
+            np.savez(f, wl=self.wl, ref=self.ref, mjd=self.mjd, dp_id=np.array(self.dp_id, dtype=str), n=self._n)
+        os.replace(index_path + ".tmp", index_path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Read a series written by `save`.
+
+        Args:
+            path (str): Directory of the series.
+            mmap (bool): If True, the fluxes stay in the file (memory-mapped, writable, and
+                later appends grow the file); otherwise they are read into memory.
+
+        Returns:
+            SpectralTimeSeries: The series.
+        """
+        with np.load(os.path.join(path, INDEX_FILE)) as index:
+            wl, ref, mjd, dp_ids, n = index["wl"], float(index["ref"]), index["mjd"], index["dp_id"], int(index["n"])
+        series = cls.__new__(cls)
+        series.wl, series.ref, series._n = wl, ref, n
+        if mmap:
+            series.path = path
+            series._flux = np.load(os.path.join(path, FLUX_FILE), mmap_mode="r+")
+        else:
+            series.path = None
+            series._flux = np.load(os.path.join(path, FLUX_FILE))
+        capacity = max(len(series._flux), n, 1)
+        series._mjd = np.full(capacity, np.nan)
+        series._mjd[:n] = mjd
+        series._dp_id = np.empty(capacity, dtype=object)
+        series._dp_id[:n] = dp_ids.tolist()
+        series._rows = {dp_id: row for row, dp_id in enumerate(series.dp_id)}
+        if len(series._flux) < capacity:
+            series._grow(capacity)
+        return series
+
+    def to_hdf5(self, path, compression="gzip"):
+        """Export the series to an HDF5 file (datasets `flux`, `mjd`, `dp_id`, `wl`, `velocity`); needs h5py."""
+        import h5py
+
+        with h5py.File(path, "w") as f:
+            f.create_dataset("flux", data=self.flux, chunks=(1, len(self.wl)) if self._n else None,
+                             compression=compression)
+            f.create_dataset("mjd", data=self.mjd)
+            f.create_dataset("dp_id", data=np.array(self.dp_id, dtype=str).astype("S"))
+            f.create_dataset("wl", data=self.wl)
+            f.create_dataset("velocity", data=self.velocity)
+            f.attrs["ref"] = self.ref
+
+    def to_zarr(self, path):
+        """Export the series to a Zarr group (same arrays as `to_hdf5`); needs zarr 3."""
+        import zarr
+
+        group = zarr.open_group(path, mode="w")
+        group.create_array("flux", data=np.ascontiguousarray(self.flux), chunks=(1, len(self.wl)))
+        group.create_array("mjd", data=self.mjd)
+        group.create_array("dp_id", data=np.array(self.dp_id, dtype=str))
+        group.create_array("wl", data=self.wl)
+        group.create_array("velocity", data=self.velocity)
+        group.attrs["ref"] = self.ref
+
+    def _allocate(self, capacity):
+        """Allocate the flux storage (a memory-mapped .npy file if the series has a `path`)."""
+        if self.path is None:
+            return np.full((capacity, len(self.wl)), np.nan, dtype=np.float32)
+        if os.path.exists(os.path.join(self.path, INDEX_FILE)):
+            raise FileExistsError(f"{self.path} already holds a series: open it with SpectralTimeSeries.load")
+        os.makedirs(self.path, exist_ok=True)
+        flux = np.lib.format.open_memmap(os.path.join(self.path, FLUX_FILE), mode="w+", dtype=np.float32,
+                                         shape=(capacity, len(self.wl)))
+        flux[:] = np.nan
+        return flux
+
+    def _grow(self, capacity):
+        """Reallocate the storage with a larger capacity, keeping the spectra."""
+        old = self._flux
+        if self.path is None:
+            self._flux = np.full((capacity, len(self.wl)), np.nan, dtype=np.float32)
+            self._flux[:self._n] = old[:self._n]
+        else:
+            # Write the larger file next to the old one, then replace it
+            final = os.path.join(self.path, FLUX_FILE)
+            temporary = final + ".tmp"
+            flux = np.lib.format.open_memmap(temporary, mode="w+", dtype=np.float32,
+                                             shape=(capacity, len(self.wl)))
+            flux[:self._n] = old[:self._n]
+            flux[self._n:] = np.nan
+            flux.flush()
+            del old, flux
+            self._flux = None
+            os.replace(temporary, final)
+            self._flux = np.load(final, mmap_mode="r+")
+        mjd, dp_id = self._mjd, self._dp_id
+        self._mjd = np.full(capacity, np.nan)
+        self._mjd[:len(mjd)] = mjd
+        self._dp_id = np.empty(capacity, dtype=object)
+        self._dp_id[:len(dp_id)] = dp_id